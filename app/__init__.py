@@ -1,6 +1,5 @@
 import os
 import warnings
-import rollbar
 from flask import Flask, got_request_exception, Request
 
 def _base_app(config_name):
@@ -32,10 +31,11 @@ def create_app(config_name):
 
     app = _base_app(config_name=config_name)
     db_facade.init_app(app)
-    if config_name is not EnvironmentName.testing:
+    init_time_budget(app)
+    if config_name != EnvironmentName.testing:
         init_rollbar(app)
 
-    if config_name is not EnvironmentName.testing:
+    if config_name != EnvironmentName.testing:
         init_firebase(app)
 
     from .main import main as main_blueprint
@@ -53,6 +53,30 @@ def create_app(config_name):
     return app
 
 
+def init_time_budget(app):
+    """
+    each request gets a time budget - MAX_EXECUTION_TIME seconds, or what's left of the lambda invocation, if less.
+    the budget is available via flask.g.time_budget and app.helpers.time_budget.current_budget(). the db facade stops
+    paging and retrying once it's spent
+    """
+    from flask import g, request
+    from app.helpers.time_budget import TimeBudget, set_current_budget
+
+    @app.before_request
+    def start_time_budget():
+        # zappa passes the context of the lambda invocation in the WSGI environ
+        budget = TimeBudget(app.config['MAX_EXECUTION_TIME'])
+        lambda_context = request.environ.get('lambda.context')
+        if lambda_context is not None:
+            budget = min(budget, TimeBudget.from_lambda_context(lambda_context), key=TimeBudget.remaining)
+        g.time_budget = budget
+        set_current_budget(budget)
+
+    @app.teardown_request
+    def end_time_budget(exc):
+        set_current_budget(None)
+
+
 def init_rollbar(app):
     from config import EnvironmentName
 
@@ -66,21 +90,36 @@ def init_rollbar(app):
         else:
             raise Exception("ROLLBAR_CLIENT_TOKEN is required in stage %s" % stage)
 
-    rollbar.init(
-        # access token for the demo app: https://rollbar.com/demo
-        app.config[rollbar_token_env],
-        # environment name
-        stage,
-        # server root directory, makes tracebacks prettier
-        root=os.path.dirname(os.path.realpath(__file__)),
-        # flask already sets up logging
-        allow_logging_basic_config=False,
-        # play nice with aws lambda
-        handler='blocking')
+    def init_rollbar_client():
+        import rollbar
+        rollbar.init(
+            # access token for the demo app: https://rollbar.com/demo
+            app.config[rollbar_token_env],
+            # environment name
+            stage,
+            # server root directory, makes tracebacks prettier
+            root=os.path.dirname(os.path.realpath(__file__)),
+            # flask already sets up logging
+            allow_logging_basic_config=False,
+            # play nice with aws lambda
+            handler='blocking')
 
     # send exceptions from `app` to rollbar, using flask's signal system.
-    from rollbar.contrib.flask import report_exception
-    got_request_exception.connect(report_exception)
+    if app.config['LAZY_INIT']:
+        # rollbar is imported and initialised when the first exception is reported
+        def report_exception(sender, exception, **extra):
+            from rollbar.contrib.flask import report_exception as rollbar_report_exception
+            if not report_exception.rollbar_initialised:
+                init_rollbar_client()
+                report_exception.rollbar_initialised = True
+            rollbar_report_exception(sender, exception, **extra)
+
+        report_exception.rollbar_initialised = False
+        got_request_exception.connect(report_exception, weak=False)
+    else:
+        init_rollbar_client()
+        from rollbar.contrib.flask import report_exception
+        got_request_exception.connect(report_exception)
 
     class CustomRequest(Request):
         @property
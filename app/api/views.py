@@ -1,7 +1,6 @@
 from app.db_facade import db_facade
 from app.api_utils.response import make_json_response
 from . import api
-from requests import get
 import os
 
 
@@ -12,7 +11,17 @@ def ping():
 
 @api.route('/test')
 def test():
-    return db_facade.ping_db(db_facade.raw_db)
+    return make_json_response(db_facade.ping_db(db_facade.raw_db))
+
+
+@api.route('/health')
+def health():
+    """
+    status of the expenses table and the capacity units consumed by this instance. 503 if the table can't serve
+    requests. the table is described at most once per DB_HEALTH_CHECK_TTL seconds
+    """
+    result = db_facade.health()
+    return make_json_response(result, 200 if result['ready'] else 503)
 
 
 @api.route('/test-500')
@@ -27,6 +36,7 @@ def test_200():
 
 @api.route('/test-internet')
 def internet():
+    from requests import get
     resp = get("http://api.yomomma.info/")
     print(resp.text.capitalize())
     return resp.text.capitalize()
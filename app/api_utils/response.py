@@ -1,16 +1,53 @@
-import json
+import gzip
 
-from flask import Response
+from flask import Response, current_app, has_request_context, request
+
+from app.api_utils.serializer import dumps
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# fast levels - the responses are small and compressing them must not take longer than sending them
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
 
 
 def make_json_response(json_str, status_code=200, mimetype='application/json'):
+    """
+    :param json_str: dict | list - serialised via serializer.dumps(), or a str which is already json
+    :param status_code:
+    :param mimetype:
+    :return: flask Response. compressed, if COMPRESS_RESPONSES is on, the client accepts gzip/br and the body is at
+    least COMPRESS_MIN_SIZE bytes long
+    """
     if isinstance(json_str, (dict, list)):
-        json_str = json.dumps(json_str)
-    elif not isinstance(json_str, str):
+        body = dumps(json_str)
+    elif isinstance(json_str, str):
+        body = json_str.encode()
+    else:
         raise ValueError("only strings, dicts and lists are accepted")
 
-    return Response(json_str, status=status_code, mimetype=mimetype)
+    response = Response(body, status=status_code, mimetype=mimetype)
+    if has_request_context() and current_app.config.get('COMPRESS_RESPONSES'):
+        _compress(response, body, min_size=current_app.config['COMPRESS_MIN_SIZE'])
+    return response
 
 
 def make_error_response(msg, status_code=400):
     return make_json_response({'error': msg}, status_code=status_code)
+
+
+def _compress(response, body, min_size):
+    # caches must not serve the compressed body to clients which don't accept it
+    response.vary.add('Accept-Encoding')
+    if len(body) < min_size:
+        return
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        response.set_data(brotli.compress(body, quality=BROTLI_QUALITY))
+        response.headers['Content-Encoding'] = 'br'
+    elif accepted['gzip']:
+        response.set_data(gzip.compress(body, compresslevel=GZIP_LEVEL))
+        response.headers['Content-Encoding'] = 'gzip'
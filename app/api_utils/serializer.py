@@ -0,0 +1,40 @@
+import json
+from decimal import Decimal
+
+"""
+serialises the bodies of the json responses. dumps(obj) returns the utf-8 encoded json (bytes), produced by the
+fastest encoder which is installed - orjson, simplejson or the stdlib json, in this order.
+all of them serialise Decimals (the type in which dynamodb returns numbers) the same way
+ExpenseConverter.convertNumberFromDbFormat() converts them - to int if the number is whole, to float otherwise.
+"""
+
+
+def _default(obj):
+    if isinstance(obj, Decimal):
+        return int(obj) if obj % 1 == 0 else float(obj)
+    raise TypeError("Object of type %s is not JSON serializable" % type(obj).__name__)
+
+
+def _stdlib_dumps(obj):
+    return json.dumps(obj, default=_default, separators=(',', ':')).encode()
+
+
+try:
+    import orjson
+
+    backend = 'orjson'
+
+    def dumps(obj):
+        return orjson.dumps(obj, default=_default)
+except ImportError:
+    try:
+        import simplejson
+
+        backend = 'simplejson'
+
+        def dumps(obj):
+            # use_decimal would keep the exponent and trailing zeros of the Decimals, e.g. 1E+1
+            return simplejson.dumps(obj, default=_default, use_decimal=False, separators=(',', ':')).encode()
+    except ImportError:
+        backend = 'json'
+        dumps = _stdlib_dumps
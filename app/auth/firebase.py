@@ -1,14 +1,27 @@
 import json
+import time
 import warnings
 
 from flask import current_app
-from firebase_admin.credentials import Certificate
-from firebase_admin.auth import verify_id_token
-from firebase_admin import initialize_app as initialize_firebase_app
 from base64 import b64decode
+from app.auth.public_keys import PublicKeyCache, CertificatesUnavailable
+from app.auth.token_cache import VerifiedTokenCache
 from config import EnvironmentName
 
-firebase_app = None
+"""
+the firebase id tokens are verified locally, as described in
+https://firebase.google.com/docs/auth/admin/verify-id-tokens#verify_id_tokens_using_a_third-party_jwt_library
+against google's public keys, which are cached in-process (see PublicKeyCache). jwt is imported on first use - it's slow
+to import, which prolongs the cold start of a lambda
+"""
+
+ISSUER_PREFIX = "https://securetoken.google.com/"
+# tolerated difference between our clock and google's, in seconds
+CLOCK_SKEW = 60
+
+# set by init_firebase()
+token_verifier = None
+token_cache = None
 
 
 def can_short_circuit_firebase(app=current_app):
@@ -29,9 +42,10 @@ def can_short_circuit_firebase(app=current_app):
 def init_firebase(flask_app):
     """
     https://firebase.google.com/docs/admin/setup
+    the project id is read from the service account config. the public keys are fetched when the first token is verified
     """
 
-    global firebase_app
+    global token_verifier, token_cache
     firebase_config_env_var_name = "FIREBASE_CONFIG_JSON_BASE64"
     firebase_config = flask_app.config.get(firebase_config_env_var_name, "")
 
@@ -44,14 +58,69 @@ def init_firebase(flask_app):
     if not can_short_circuit_firebase(flask_app) and not firebase_config:
         raise Exception("%s is required" % firebase_config_env_var_name)
 
-    conf = flask_app.config.get(firebase_config_env_var_name, "")
-    conf = b64decode(conf).decode()
-    conf_json = json.loads(conf)
+    project_id = flask_app.config.get('FIREBASE_PROJECT_ID') or _project_id_of(firebase_config)
+    token_verifier = IdTokenVerifier(project_id, PublicKeyCache(url=flask_app.config['FIREBASE_CERTS_URL']))
+    if flask_app.config['ID_TOKEN_CACHE_SIZE']:
+        token_cache = VerifiedTokenCache(max_size=flask_app.config['ID_TOKEN_CACHE_SIZE'])
+
+
+def _project_id_of(firebase_config):
+    """
+    :param firebase_config: base64 encoded json of the service account
+    """
+    conf_json = json.loads(b64decode(firebase_config).decode())
+    return conf_json['project_id']
+
+
+class IdTokenVerifier(object):
+
+    def __init__(self, project_id, public_keys, clock=time.time):
+        """
+        :param project_id: the firebase project, for which the tokens must be issued
+        :param public_keys: PublicKeyCache
+        :param clock: function returning seconds
+        """
+        self.project_id = project_id
+        self.issuer = ISSUER_PREFIX + project_id
+        self.public_keys = public_keys
+        self._clock = clock
+
+    def verify(self, id_token):
+        """
+        :param id_token: str
+        :return: dict. the claims of the token
+        :raises ValueError - if the token is not a valid firebase id token of the project
+        :raises CertificatesUnavailable - if google's certificates can't be fetched
+        """
+        import jwt
 
-    conf_json['private_key'] = conf_json['private_key'].replace("\\n", '\n')
-    credentials = Certificate(conf_json)
+        if not isinstance(id_token, str) or not id_token:
+            raise ValueError("The id token must be a non-empty string")
+        try:
+            header = jwt.get_unverified_header(id_token)
+        except jwt.InvalidTokenError as err:
+            raise ValueError("Malformed id token: %s" % err)
+        if header.get('alg') != 'RS256':
+            raise ValueError("The id token must be signed with RS256")
+
+        key = self.public_keys.get(header.get('kid'))
+        if key is None:
+            raise ValueError("The id token is signed by an unknown key")
+
+        try:
+            claims = jwt.decode(id_token, key=key, algorithms=['RS256'], audience=self.project_id,
+                                issuer=self.issuer, leeway=CLOCK_SKEW,
+                                options={"require": ["exp", "iat", "aud", "iss", "sub"]})
+        except jwt.InvalidTokenError as err:
+            raise ValueError("Invalid id token: %s" % err)
 
-    firebase_app = initialize_firebase_app(credential=credentials)
+        subject = claims['sub']
+        if not isinstance(subject, str) or not subject or len(subject) > 128:
+            raise ValueError("The id token must have a non-empty `sub` of at most 128 characters")
+        if claims.get('auth_time', 0) > self._clock() + CLOCK_SKEW:
+            raise ValueError("The id token has `auth_time` in the future")
+        claims['uid'] = subject
+        return claims
 
 
 class FirebaseTokenValidator(object):
@@ -62,17 +131,27 @@ class FirebaseTokenValidator(object):
     def validate_id_token_and_get_uid(id_token):
         """
         verify that a given string is indeed a firebase auth token and then extract the
-        firebase user uid out of the token.
+        firebase user uid out of the token. a token which has already been verified and hasn't expired is looked up
+        in the token cache, without verifying it again.
         https://firebase.google.com/docs/auth/admin/verify-id-tokens
         https://firebase.google.com/docs/auth/admin/verify-id-tokens#retrieve_id_tokens_on_clients
 
         :param id_token [str]:
         :return: firebase uid : [str]
-        :raises FirebaseIdTokenValidationExc if the `id_token` paramater is not a valid firebase id token
+        :raises FirebaseIdTokenValidationExc if the `id_token` paramater is not a valid firebase id token, or it
+        can't be verified because the certificates can't be fetched
         """
+        if token_cache is not None:
+            uid = token_cache.get(id_token)
+            if uid is not None:
+                return uid
         try:
-            user = verify_id_token(id_token)
+            if token_verifier is None:
+                raise ValueError("Firebase hasn't been initialised")
+            user = token_verifier.verify(id_token)
+            if token_cache is not None:
+                token_cache.put(id_token, user['uid'], user['exp'])
             return user['uid']
-        except ValueError as err:
+        except (ValueError, CertificatesUnavailable) as err:
             current_app.logger.error(str(err))
             raise FirebaseTokenValidator.FirebaseIdTokenValidationExc()
@@ -0,0 +1,156 @@
+import json
+import re
+import time
+from threading import Lock, Thread
+from urllib.request import urlopen
+
+"""
+in-process cache of the public keys with which google signs the firebase id tokens.
+https://firebase.google.com/docs/auth/admin/verify-id-tokens#verify_id_tokens_using_a_third-party_jwt_library
+
+the keys are published as x509 certificates - {"<key id>": "<PEM certificate>", ...}. the response has a
+`Cache-Control: max-age=<seconds>` header, for which the certificates are valid. the certificates are parsed once per
+fetch, so verifying a token doesn't parse PEM. shortly before the max-age passes, the keys are refreshed in a background
+thread, while the current keys keep being used.
+"""
+
+GOOGLE_CERTS_URL = 'https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com'
+# used if the response doesn't have a max-age
+DEFAULT_MAX_AGE = 3600
+# refresh in the background when less than this fraction of the max-age is left
+REFRESH_AHEAD_FRACTION = 0.1
+# an unknown key id triggers a synchronous fetch at most once per this many seconds (keys are rotated, but a bogus
+# key id mustn't make each request fetch the certificates)
+MIN_FETCH_INTERVAL = 60
+# after a failed fetch, the expired certificates aren't fetched again for this many seconds - while the endpoint is
+# down, each request would wait for FETCH_TIMEOUT otherwise
+FAILED_FETCH_RETRY_INTERVAL = 10
+FETCH_TIMEOUT = 5
+
+_max_age_re = re.compile(r'max-age=(\d+)')
+
+
+def fetch_certificates(url, timeout=FETCH_TIMEOUT):
+    """
+    :return: tuple (dict. key id -> PEM certificate, the max-age of the response in seconds | None)
+    """
+    with urlopen(url, timeout=timeout) as response:
+        certificates = json.loads(response.read().decode())
+        match = _max_age_re.search(response.headers.get('Cache-Control', ''))
+    return certificates, int(match.group(1)) if match else None
+
+
+def prepare_keys(certificates):
+    """
+    :param certificates: dict. key id -> PEM certificate
+    :return: dict. key id -> cryptography RSAPublicKey, ready to be used by jwt.decode()
+    """
+    from cryptography.x509 import load_pem_x509_certificate
+    return {kid: load_pem_x509_certificate(pem.encode()).public_key() for kid, pem in certificates.items()}
+
+
+class PublicKeyCache(object):
+
+    def __init__(self, url=GOOGLE_CERTS_URL, fetch=fetch_certificates, clock=time.time):
+        """
+        :param url: where the certificates are published
+        :param fetch: function(url) -> (certificates, max-age | None). see fetch_certificates()
+        :param clock: function returning seconds
+        """
+        self.url = url
+        self._fetch = fetch
+        self._clock = clock
+        self._lock = Lock()
+        self._keys = {}
+        self._max_age = DEFAULT_MAX_AGE
+        self._expires_at = 0
+        self._last_fetch = None
+        self._last_failed_fetch = None
+        self._refreshing = None  # the background refresh Thread, while it runs
+
+    def get(self, kid):
+        """
+        :param kid: the `kid` header of a token
+        :return: the prepared public key | None - if there's no key with this id
+        :raises CertificatesUnavailable - if the certificates have to be fetched (they have expired, were never
+        fetched or don't have the key id) and can't be - or if they have expired and the last fetch failed less than
+        FAILED_FETCH_RETRY_INTERVAL seconds ago
+        """
+        now = self._clock()
+        try:
+            if now >= self._expires_at:
+                self._refresh_if_stale()
+            elif now >= self._expires_at - self._max_age * REFRESH_AHEAD_FRACTION and self._may_fetch(now):
+                self._refresh_in_background()
+
+            key = self._keys.get(kid)
+            if key is None and self._may_fetch(now):
+                # the keys might have been rotated before the max-age passed
+                self.refresh()
+                key = self._keys.get(kid)
+        except CertificatesUnavailable:
+            raise
+        except Exception as err:
+            raise CertificatesUnavailable("Can't fetch the certificates from %s: %s" % (self.url, err))
+        return key
+
+    def refresh(self):
+        """
+        fetches the certificates and replaces the cached keys
+        """
+        fetched_at = self._clock()
+        with self._lock:
+            self._last_fetch = fetched_at
+        try:
+            certificates, max_age = self._fetch(self.url)
+            keys = prepare_keys(certificates)
+        except Exception:
+            with self._lock:
+                self._last_failed_fetch = self._clock()
+            raise
+        with self._lock:
+            self._last_failed_fetch = None
+            self._keys = keys
+            self._max_age = max_age if max_age is not None else DEFAULT_MAX_AGE
+            self._expires_at = fetched_at + self._max_age
+
+    def wait_for_background_refresh(self, timeout=None):
+        refreshing = self._refreshing
+        if refreshing:
+            refreshing.join(timeout)
+
+    def _refresh_if_stale(self):
+        with self._lock:
+            now = self._clock()
+            stale = now >= self._expires_at
+            failed_at = self._last_failed_fetch
+        if not stale:
+            return
+        if failed_at is not None and now - failed_at < FAILED_FETCH_RETRY_INTERVAL:
+            raise CertificatesUnavailable("The certificates have expired and the last fetch from %s failed %.0f "
+                                          "seconds ago" % (self.url, now - failed_at))
+        self.refresh()
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing is not None:
+                return
+            self._refreshing = Thread(target=self._background_refresh, daemon=True)
+        self._refreshing.start()
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        except Exception:
+            pass  # the current keys are still valid. the next get() tries again
+        finally:
+            with self._lock:
+                self._refreshing = None
+
+    def _may_fetch(self, now):
+        return self._last_fetch is None or now - self._last_fetch >= MIN_FETCH_INTERVAL
+
+
+class CertificatesUnavailable(Exception):
+    def __init__(self, *args):
+        super(CertificatesUnavailable, self).__init__(*args)
@@ -0,0 +1,66 @@
+import hashlib
+import time
+from collections import OrderedDict
+from threading import Lock
+
+"""
+cache of verified id tokens. clients send the same id token until it expires (an hour), so a token which has been
+verified once doesn't need its signature verified again until then.
+the tokens are keyed by their SHA-256, so the cache doesn't hold usable tokens.
+"""
+
+
+class VerifiedTokenCache(object):
+
+    def __init__(self, max_size=10000, clock=time.time):
+        """
+        :param max_size: the least recently used tokens are evicted beyond this size
+        :param clock: function returning seconds since the epoch, as the `exp` claims
+        """
+        self.max_size = max_size
+        self._clock = clock
+        self._lock = Lock()
+        self._entries = OrderedDict()  # token hash -> (uid, exp)
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(id_token):
+        return hashlib.sha256(id_token.encode()).digest()
+
+    def get(self, id_token):
+        """
+        :return: the uid of the token, if the token has been verified and hasn't expired. None otherwise
+        """
+        key = self._key(id_token) if isinstance(id_token, str) else None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= self._clock():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, id_token, uid, exp):
+        """
+        :param id_token: a verified token
+        :param uid: its user uid
+        :param exp: its `exp` claim. the token is evicted at this time
+        """
+        key = self._key(id_token)
+        with self._lock:
+            self._entries[key] = (uid, exp)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        """
+        :return: dict. {"size": int, "hits": int, "misses": int}
+        """
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
@@ -1,2 +1,3 @@
 from .facade import db_facade
-from .table_schema import dynamodb_users_table_init_information
+from .table_schema import dynamodb_users_table_init_information, changelog_table_init_information, \
+    rollups_table_init_information
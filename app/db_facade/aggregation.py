@@ -0,0 +1,231 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+from app.db_facade.rollups import day_of
+
+"""
+single-pass aggregation of expense amounts per currency.
+the amounts are summed as Decimal (the type in which dynamodb returns numbers), so the totals are exact;
+they are rounded only when the result is produced.
+"""
+
+AGGREGATES = ('total', 'count', 'min', 'max', 'mean')
+# the aggregates which can be computed from pre-aggregated (total, count) pairs
+ADDITIVE_AGGREGATES = ('total', 'count', 'mean')
+# the UTC periods, per which BucketedAccumulator groups the amounts. weeks start on Monday
+BUCKETS = ('day', 'week', 'month')
+
+_TOTAL, _COUNT, _MIN, _MAX = range(4)
+
+
+def _shrt_num(x):
+    return float("%.2f" % x)
+
+
+def bucket_start(day, bucket):
+    """
+    :param day: 'YYYY-MM-DD'
+    :param bucket: one of BUCKETS
+    :return: the first day of the bucket, which contains the day. 'YYYY-MM-DD'
+    """
+    if bucket == 'day':
+        return day
+    if bucket == 'month':
+        return day[:8] + '01'
+    if bucket == 'week':
+        d = date(int(day[:4]), int(day[5:7]), int(day[8:10]))
+        return (d - timedelta(days=d.weekday())).isoformat()
+    raise ValueError("Unknown bucket: %s" % bucket)
+
+
+class CurrencyAccumulator(object):
+    """
+    acc = CurrencyAccumulator()
+    acc.add("EUR", Decimal("10")); acc.add("USD", Decimal("20")); acc.add("EUR", Decimal("10"))
+    acc.totals() ===> {"EUR": 20.0, "USD": 20.0}
+    """
+    __slots__ = ('_stats',)
+
+    def __init__(self):
+        # currency -> [total, count, min, max]
+        self._stats = {}
+
+    def add(self, currency, amount):
+        """
+        :param currency: str
+        :param amount: Decimal | int
+        """
+        stats = self._stats.get(currency)
+        if stats is None:
+            self._stats[currency] = [amount, 1, amount, amount]
+        else:
+            stats[_TOTAL] += amount
+            stats[_COUNT] += 1
+            if stats[_MIN] is None:
+                return  # unknown after add_total()
+            if amount < stats[_MIN]:
+                stats[_MIN] = amount
+            elif amount > stats[_MAX]:
+                stats[_MAX] = amount
+
+    def add_all(self, items):
+        """
+        :param items: iterable of dicts with `currency` and `amount` keys
+        :return: self
+        """
+        add = self.add
+        for item in items:
+            add(item['currency'], item['amount'])
+        return self
+
+    def add_total(self, currency, total, count):
+        """
+        adds the pre-aggregated amounts of `count` expenses. the min and max of the currency become unknown
+        """
+        self._merge_stats(currency, [total, count, None, None])
+
+    def add_rollups(self, rollups):
+        """
+        :param rollups: iterable of (day, currency, total, count) tuples. see StatisticsRollups.read()
+        """
+        for _, currency, total, count in rollups:
+            self.add_total(currency, total, count)
+
+    def merge(self, other):
+        """
+        adds the amounts accumulated by another accumulator, e.g. of another page or shard
+        :param other: CurrencyAccumulator
+        :return: self
+        """
+        for currency, stats in other._stats.items():
+            self._merge_stats(currency, stats)
+        return self
+
+    def _merge_stats(self, currency, other):
+        stats = self._stats.get(currency)
+        if stats is None:
+            self._stats[currency] = list(other)
+            return
+        stats[_TOTAL] += other[_TOTAL]
+        stats[_COUNT] += other[_COUNT]
+        if stats[_MIN] is None or other[_MIN] is None:
+            stats[_MIN] = stats[_MAX] = None
+        else:
+            stats[_MIN] = min(stats[_MIN], other[_MIN])
+            stats[_MAX] = max(stats[_MAX], other[_MAX])
+
+    def totals(self):
+        """
+        :return: dict. currency -> total, rounded to 2 decimal places
+        """
+        return {currency: _shrt_num(stats[_TOTAL]) for currency, stats in self._stats.items()}
+
+    def normalised_total(self, rate_table, home_currency):
+        """
+        :param rate_table: FxRateTable
+        :param home_currency: str
+        :return: dict. {"currency": home_currency, "total": the sum of all amounts in the home currency,
+        "fx_rates_version": str, "unconverted": [currencies without a rate, not included in the total]}
+        :raises NoFxRate - if there's no rate for the home currency
+        """
+        total, unconverted = rate_table.normalise({c: stats[_TOTAL] for c, stats in self._stats.items()},
+                                                  home_currency)
+        return {"currency": home_currency, "total": _shrt_num(total), "fx_rates_version": rate_table.version,
+                "unconverted": unconverted}
+
+    def summary(self, aggregates=AGGREGATES):
+        """
+        :param aggregates: iterable of the names of the aggregates to include. see AGGREGATES
+        :return: dict. currency -> {aggregate name: value}
+        """
+        result = {}
+        for currency, (total, count, minimum, maximum) in self._stats.items():
+            values = {
+                'total': lambda: _shrt_num(total),
+                'count': lambda: count,
+                'min': lambda: _shrt_num(minimum) if minimum is not None else None,
+                'max': lambda: _shrt_num(maximum) if maximum is not None else None,
+                'mean': lambda: _shrt_num(Decimal(total) / count),
+            }
+            result[currency] = {name: values[name]() for name in aggregates}
+        return result
+
+
+class BucketedAccumulator(object):
+    """
+    accumulates the amounts per bucket (day/week/month) and currency, in a single pass over expenses ordered
+    by `timestamp_utc`. only the current bucket is looked up for each expense.
+
+    acc = BucketedAccumulator('month')
+    acc.add_all([{"timestamp_utc": "2018-01-04T22:44:30.652Z", "currency": "EUR", "amount": Decimal("10")},
+                 {"timestamp_utc": "2018-02-01T08:00:00.000Z", "currency": "EUR", "amount": Decimal("5")}])
+    acc.series() ===> [{"start": "2018-01-01", "statistics": {"EUR": 10.0}},
+                       {"start": "2018-02-01", "statistics": {"EUR": 5.0}}]
+    """
+    __slots__ = ('bucket', '_buckets', '_last_day', '_current')
+
+    def __init__(self, bucket):
+        """
+        :param bucket: one of BUCKETS
+        """
+        if bucket not in BUCKETS:
+            raise ValueError("Unknown bucket: %s" % bucket)
+        self.bucket = bucket
+        # [(bucket start, CurrencyAccumulator)], ordered by the bucket start
+        self._buckets = []
+        self._last_day = None
+        self._current = None
+
+    def _accumulator_for(self, day):
+        if day == self._last_day:
+            return self._current
+        if self._last_day is not None and day < self._last_day:
+            raise ValueError("The amounts must be added in ascending order of their timestamps")
+        self._last_day = day
+
+        start = bucket_start(day, self.bucket)
+        if not self._buckets or self._buckets[-1][0] != start:
+            self._buckets.append((start, CurrencyAccumulator()))
+        self._current = self._buckets[-1][1]
+        return self._current
+
+    def add(self, timestamp, currency, amount):
+        """
+        :param timestamp: iso8601 str. must not be before the timestamp of the previously added amount
+        :param currency: str
+        :param amount: Decimal | int
+        """
+        self._accumulator_for(day_of(timestamp)).add(currency, amount)
+
+    def add_all(self, items):
+        """
+        :param items: iterable of dicts with `timestamp_utc`, `currency` and `amount` keys, ordered by `timestamp_utc`
+        :return: self
+        """
+        for item in items:
+            self._accumulator_for(day_of(item['timestamp_utc'])).add(item['currency'], item['amount'])
+        return self
+
+    def add_rollups(self, rollups):
+        """
+        :param rollups: iterable of (day, currency, total, count) tuples, ordered by day. see StatisticsRollups.read()
+        """
+        for day, currency, total, count in rollups:
+            self._accumulator_for(day).add_total(currency, total, count)
+
+    def series(self, aggregates=None, rate_table=None, home_currency=None):
+        """
+        :param aggregates: None or iterable of the names of the aggregates to include. see AGGREGATES
+        :param rate_table: FxRateTable. needed only if `home_currency` is set
+        :param home_currency: None or str. if set, each bucket has a "home_currency" key - see
+        CurrencyAccumulator.normalised_total()
+        :return: list of {"start": 'YYYY-MM-DD', "statistics": dict}, ordered by "start". "statistics" is
+        CurrencyAccumulator.totals() if `aggregates` is None, CurrencyAccumulator.summary(aggregates) otherwise
+        """
+        result = []
+        for start, acc in self._buckets:
+            bucket = {"start": start, "statistics": acc.totals() if aggregates is None else acc.summary(aggregates)}
+            if home_currency:
+                bucket['home_currency'] = acc.normalised_total(rate_table, home_currency)
+            result.append(bucket)
+        return result
@@ -0,0 +1,42 @@
+from collections import defaultdict
+from threading import Lock
+
+"""
+https://docs.aws.amazon.com/amazondynamodb/latest/developerguide/ProvisionedThroughput.html
+keeps track of the capacity units, reported by dynamodb as consumed by the requests made from this process.
+"""
+
+
+class ConsumedCapacityMeter(object):
+    def __init__(self):
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.requests = defaultdict(int)
+            self.capacity_units = defaultdict(float)
+
+    def record(self, consumed_capacity, target=None):
+        """
+        :param consumed_capacity: the `ConsumedCapacity` of a dynamodb response. could be None (e.g. if the
+                                  request wasn't made with ReturnConsumedCapacity)
+        :param target: str - used to group the consumed units. defaults to the name of the table
+        :return: the capacity units consumed by the request
+        """
+        if not consumed_capacity:
+            return 0.0
+        units = float(consumed_capacity.get('CapacityUnits', 0))
+        target = target or consumed_capacity.get('TableName')
+        with self._lock:
+            self.requests[target] += 1
+            self.capacity_units[target] += units
+        return units
+
+    def snapshot(self):
+        """
+        :return: dict. target -> {"requests": int, "capacity_units": float}
+        """
+        with self._lock:
+            return {target: {"requests": self.requests[target], "capacity_units": self.capacity_units[target]}
+                    for target in self.requests}
@@ -0,0 +1,117 @@
+import time
+from decimal import Decimal
+
+from boto3.dynamodb.conditions import Key
+
+from app.db_facade.dynamodb.batch import serialize_item
+
+"""
+append-only, per-user log of the changes made to the expenses of the user.
+each entry has a monotonically increasing (per user) sequence number. clients remember the largest sequence number
+they've seen (their high-water mark) and can ask only for the changes made after it.
+
+the sequence numbers are allocated via an atomic counter, kept in an item with sequence number 0. a writer allocates
+the sequence number of a change first and then writes the change and its entry (see put_operation()) in a single
+transaction. so an entry exists if and only if its change was made. the numbers of failed transactions remain gaps.
+"""
+
+COUNTER_SEQ = 0
+COUNTER_ATTR = 'last_seq'
+# an entry might be written after an entry with a larger sequence number (concurrent writers). if a gap
+# in the sequence is younger than this, the reading stops before the gap, so that the entry isn't skipped
+GAP_GRACE_SECONDS = 10
+# the reader is told to come back after this many seconds, if it has stopped before a gap
+GAP_RETRY_AFTER = 1
+
+
+class ChangeOperation:
+    persist = 'persist'
+    update = 'update'
+    remove = 'remove'
+
+
+class ChangeLog(object):
+    HASH_KEY = 'user_uid'
+    RANGE_KEY = 'seq'
+
+    def __init__(self, table):
+        """
+        :param table: boto3 Table resource of the change log table
+        """
+        self.table = table
+
+    def allocate(self, user_uid, count=1):
+        """
+        reserves `count` consecutive sequence numbers
+        :return: the first of them
+        """
+        return self._allocate(user_uid, count) - count + 1
+
+    def put_operation(self, user_uid, seq, operation, expense):
+        """
+        :param seq: a sequence number from allocate()
+        :param operation: a ChangeOperation
+        :param expense: the expense in db format (see ExpenseConverter.convertToDbFormat), as it is after the change.
+                        for removals, only the `id` and `timestamp_utc` are needed
+        :return: TransactItems entry (serialized), which writes the entry
+        """
+        entry = {
+            self.HASH_KEY: user_uid,
+            self.RANGE_KEY: seq,
+            'operation': operation,
+            'id': expense['id'],
+            'timestamp_utc': expense['timestamp_utc'],
+            'recorded_at': Decimal(str(time.time()))
+        }
+        if operation != ChangeOperation.remove:
+            entry['expense'] = {k: v for k, v in expense.items() if k != self.HASH_KEY}
+        return {"Put": {"TableName": self.table.name, "Item": serialize_item(entry),
+                        "ConditionExpression": "attribute_not_exists(%s)" % self.RANGE_KEY}}
+
+    def changes_since(self, user_uid, since_seq, max_changes, time_budget=None):
+        """
+        :param since_seq: int. the high-water mark of the client. only entries with larger sequence number are returned
+        :param max_changes: int. maximum number of entries to return
+        :param time_budget: TimeBudget | None. if set, no more pages are read once it's exhausted - the entries read
+        so far are returned, as if `max_changes` was reached
+        :return: tuple (list of entries ordered by sequence number, the new high-water mark, bool - are there
+                 more entries after the returned ones, None or seconds - set if the reading stopped before a recent gap.
+                 the entries after the gap are returned once it's filled or old enough - retry after that many seconds)
+        """
+        entries = []
+        high_water_mark = since_seq
+        query_kwargs = {
+            "KeyConditionExpression": Key(self.HASH_KEY).eq(user_uid) & Key(self.RANGE_KEY).gt(since_seq),
+            "ScanIndexForward": True,
+            "ConsistentRead": True,
+            "Limit": max_changes + 1,
+        }
+        while True:
+            response = self.table.query(**query_kwargs)
+            for entry in response['Items']:
+                seq = int(entry[self.RANGE_KEY])
+                if seq != high_water_mark + 1 and self._gap_is_recent(entry):
+                    return entries, high_water_mark, False, GAP_RETRY_AFTER
+                if len(entries) == max_changes:
+                    return entries, high_water_mark, True, None
+                entries.append(entry)
+                high_water_mark = seq
+
+            if 'LastEvaluatedKey' not in response:
+                return entries, high_water_mark, False, None
+            if time_budget is not None and time_budget.expired():
+                return entries, high_water_mark, True, None
+            query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    def _allocate(self, user_uid, count):
+        response = self.table.update_item(
+            Key={self.HASH_KEY: user_uid, self.RANGE_KEY: COUNTER_SEQ},
+            UpdateExpression="ADD %s :count" % COUNTER_ATTR,
+            ExpressionAttributeValues={":count": count},
+            ReturnValues="UPDATED_NEW"
+        )
+        return int(response['Attributes'][COUNTER_ATTR])
+
+    @staticmethod
+    def _gap_is_recent(entry):
+        return time.time() - float(entry['recorded_at']) < GAP_GRACE_SECONDS
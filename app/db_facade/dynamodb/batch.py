@@ -0,0 +1,220 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from boto3.dynamodb.types import TypeSerializer, TypeDeserializer
+from botocore.exceptions import ClientError
+
+from app.helpers.utils import exponential_backoff
+
+"""
+http://boto3.readthedocs.io/en/latest/reference/services/dynamodb.html#DynamoDB.Client.batch_get_item
+http://boto3.readthedocs.io/en/latest/reference/services/dynamodb.html#DynamoDB.Client.transact_write_items
+http://boto3.readthedocs.io/en/latest/reference/services/dynamodb.html#DynamoDB.Client.batch_write_item
+helpers for the batch operations of dynamodb. they use the low-level client, because, unlike the resources,
+it's safe to share it between threads.
+"""
+MAX_BATCH_GET_SIZE = 100
+# the number of items of a TransactWriteItems request
+MAX_TRANSACT_WRITE_SIZE = 25
+MAX_BATCH_WRITE_SIZE = 25
+MAX_RETRIES = 8
+
+_serializer = TypeSerializer()
+_deserializer = TypeDeserializer()
+
+
+def serialize_item(item):
+    return {k: _serializer.serialize(v) for k, v in item.items()}
+
+
+def deserialize_item(item):
+    return {k: _deserializer.deserialize(v) for k, v in item.items()}
+
+
+def chunks(items, size):
+    items = list(items)
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def batch_get_items(client, table_name, keys, max_workers=4, time_budget=None, **request_kwargs):
+    """
+    fetches the items with the given primary keys. the keys are split into chunks of MAX_BATCH_GET_SIZE, which are
+    fetched in parallel. unprocessed keys are retried with exponential backoff.
+
+    :param client: low-level boto3 dynamodb client
+    :param table_name:
+    :param keys: list of dicts, each with the hash and range key of an item
+    :param max_workers: max number of chunks fetched in parallel
+    :param time_budget: TimeBudget | None. if set, the retries stop once it's exhausted. passed explicitly, as the
+    chunks are fetched on other threads
+    :param request_kwargs: e.g. ProjectionExpression, ExpressionAttributeNames, ConsistentRead
+    :return: list of the found items, deserialized. keys without item are skipped; the order is not preserved
+    :raises UnprocessedItemsRemain - if not all keys could be processed after MAX_RETRIES retries (or until the time
+    budget was exhausted)
+    """
+    key_chunks = chunks([serialize_item(key) for key in keys], MAX_BATCH_GET_SIZE)
+    if not key_chunks:
+        return []
+
+    def fetch(key_chunk):
+        request_items = {table_name: {"Keys": key_chunk, **request_kwargs}}
+        found = []
+        for _ in exponential_backoff(max_retries=MAX_RETRIES, time_budget=time_budget):
+            response = client.batch_get_item(RequestItems=request_items)
+            found.extend(response['Responses'].get(table_name, []))
+            request_items = response.get('UnprocessedKeys')
+            if not request_items:
+                return found
+        raise UnprocessedItemsRemain("%i keys remain unprocessed" % len(request_items[table_name]['Keys']))
+
+    if len(key_chunks) == 1:
+        results = [fetch(key_chunks[0])]
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(key_chunks))) as executor:
+            results = list(executor.map(fetch, key_chunks))
+
+    return [deserialize_item(item) for chunk_result in results for item in chunk_result]
+
+
+class WriteOutcome:
+    written = 'written'
+    condition_failed = 'condition_failed'
+    # e.g. throttled until the retries ran out
+    unprocessed = 'unprocessed'
+
+
+def transact_put_items(client, table_name, items, condition_expression, companions=None, shared=None, max_workers=4,
+                       time_budget=None):
+    """
+    puts the items, each only if `condition_expression` holds for it. see transact_write()
+    :param items: list of items, deserialized. no two with the same key
+    :param condition_expression: str, e.g. "attribute_not_exists(#k)". mustn't need ExpressionAttributeValues
+    :return: list with the WriteOutcome of each item, in the order of `items`
+    """
+    operations = [{"Put": {"TableName": table_name, "Item": serialize_item(item),
+                           "ConditionExpression": condition_expression}}
+                  for item in items]
+    return transact_write(client, operations, companions=companions, shared=shared, max_workers=max_workers,
+                          time_budget=time_budget)
+
+
+def transact_delete_items(client, table_name, keys, condition_expression, condition_values, companions=None,
+                          shared=None, max_workers=4, time_budget=None):
+    """
+    deletes the items with the given keys, each only if `condition_expression` holds for it. see transact_write()
+    :param keys: list of dicts, each with the hash and range key of an item. no duplicates
+    :param condition_expression: str, e.g. "id = :id"
+    :param condition_values: list with the ExpressionAttributeValues (deserialized) of the condition of each key
+    :return: list with the WriteOutcome of each key, in the order of `keys`
+    """
+    operations = [{"Delete": {"TableName": table_name, "Key": serialize_item(key),
+                              "ConditionExpression": condition_expression,
+                              "ExpressionAttributeValues": serialize_item(values)}}
+                  for key, values in zip(keys, condition_values)]
+    return transact_write(client, operations, companions=companions, shared=shared, max_workers=max_workers,
+                          time_budget=time_budget)
+
+
+def transact_write(client, operations, companions=None, shared=None, max_workers=4, time_budget=None):
+    """
+    unlike BatchWriteItem, TransactWriteItems supports conditions. the operations are split into chunks, written in
+    parallel, a transaction per chunk - the latency depends on the number of chunks rather than of items. if the
+    condition of some operations fails, the transaction is cancelled and retried without them. the operations
+    cancelled for other reasons (throttling, conflicting transactions) are retried with exponential backoff. if a
+    transaction fails with another error, the operations of its chunk are left unprocessed.
+
+    :param client: low-level boto3 dynamodb client
+    :param operations: list of TransactItems entries (serialized), at most one per item
+    :param companions: None or a list with a list of TransactItems entries for each operation, e.g. the change log
+    entry of the change. written in the same transaction as the operation - or not at all, if its condition fails
+    :param shared: None or function(indexes of operations) -> list of TransactItems entries, written in the same
+    transaction as these operations, e.g. a counter of all of them. unconditional. called before each attempt, with the
+    operations which are still pending. the chunks are then written one after another: concurrent transactions,
+    which update the same shared item, are cancelled (TransactionConflict) and retried with backoff - which takes
+    longer than writing them in turn
+    :param max_workers: max number of chunks written in parallel
+    :param time_budget: TimeBudget | None. if set, the retries stop once it's exhausted
+    :return: list with the WriteOutcome of each operation, in the order of `operations`
+    """
+    outcomes = [WriteOutcome.unprocessed] * len(operations)
+    companions = companions or [[] for _ in operations]
+    # the shared entries of a chunk are at most one per operation
+    per_operation = 1 + max([len(c) for c in companions] or [0]) + (1 if shared else 0)
+
+    def write(indexes):
+        pending = indexes
+        for _ in exponential_backoff(max_retries=MAX_RETRIES, time_budget=time_budget):
+            # (index of the operation, is it the operation itself) for each entry of the transaction
+            owners = [(i, j == 0) for i in pending for j in range(1 + len(companions[i]))]
+            shared_entries = shared(pending) if shared else []
+            try:
+                client.transact_write_items(TransactItems=[op for i in pending
+                                                           for op in [operations[i]] + companions[i]] + shared_entries)
+            except ClientError as err:
+                if err.response['Error']['Code'] != 'TransactionCanceledException':
+                    # e.g. an internal error. the operations of this chunk remain unprocessed, the other chunks aren't
+                    # affected
+                    return
+                reasons = err.response.get('CancellationReasons', [])
+                failed = {owner for owner, reason in zip(owners, reasons)
+                          if reason.get('Code') == 'ConditionalCheckFailed'}
+                for i, is_operation in failed:
+                    if is_operation:
+                        outcomes[i] = WriteOutcome.condition_failed
+                # if the condition of a companion fails, the operation remains unprocessed
+                pending = [i for i in pending if (i, True) not in failed and (i, False) not in failed]
+                if not pending:
+                    return
+                continue
+            for i in pending:
+                outcomes[i] = WriteOutcome.written
+            return
+
+    _in_parallel(write, chunks(range(len(operations)), MAX_TRANSACT_WRITE_SIZE // per_operation),
+                 1 if shared else max_workers)
+    return outcomes
+
+
+def batch_delete_items(client, table_name, keys, max_workers=4, time_budget=None):
+    """
+    deletes the items with the given keys, unconditionally, via BatchWriteItem. the keys are split into chunks of
+    MAX_BATCH_WRITE_SIZE, which are written in parallel. unprocessed keys are retried with exponential backoff.
+    :param keys: list of dicts, each with the hash and range key of an item. no duplicates
+    :return: list with the WriteOutcome of each key (written or unprocessed), in the order of `keys`
+    """
+    outcomes = [WriteOutcome.unprocessed] * len(keys)
+
+    def write(indexes):
+        pending = {_key_str(keys[i]): i for i in indexes}
+        request_items = {table_name: [{"DeleteRequest": {"Key": serialize_item(keys[i])}} for i in indexes]}
+        for _ in exponential_backoff(max_retries=MAX_RETRIES, time_budget=time_budget):
+            response = client.batch_write_item(RequestItems=request_items)
+            request_items = response.get('UnprocessedItems')
+            unprocessed = set()
+            if request_items:
+                unprocessed = {_key_str(deserialize_item(r['DeleteRequest']['Key'])) for r in request_items[table_name]}
+            for key, i in list(pending.items()):
+                if key not in unprocessed:
+                    outcomes[i] = WriteOutcome.written
+                    del pending[key]
+            if not pending:
+                return
+
+    _in_parallel(write, chunks(range(len(keys)), MAX_BATCH_WRITE_SIZE), max_workers)
+    return outcomes
+
+
+def _key_str(key):
+    return tuple(sorted(key.items()))
+
+
+def _in_parallel(f, index_chunks, max_workers):
+    if len(index_chunks) == 1:
+        f(index_chunks[0])
+    elif index_chunks:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(index_chunks))) as executor:
+            list(executor.map(f, index_chunks))
+
+
+class UnprocessedItemsRemain(Exception):
+    def __init__(self, *args):
+        super(UnprocessedItemsRemain, self).__init__(*args)
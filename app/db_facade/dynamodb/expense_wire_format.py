@@ -0,0 +1,59 @@
+from operator import itemgetter
+
+from app.models.json_schema import expense_properties
+
+"""
+https://docs.aws.amazon.com/amazondynamodb/latest/developerguide/Programming.LowLevelAPI.html#Programming.LowLevelAPI.DataTypeDescriptors
+converts expenses, as returned by the low-level client (e.g. {"amount": {"N": "12.5"}}), straight to the format the
+facade returns. the result is the same as that of the Table resource's deserialisation followed by
+ExpenseConverter.convertFromDbFormat() and sanitize_expense(), but each attribute is decoded by a function specific
+to its property - no type dispatch, no Decimals and no intermediate copies.
+"""
+
+
+def _amount(value):
+    """
+    int if the number is whole, float otherwise - as ExpenseConverter.convertNumberFromDbFormat()
+    """
+    number = value['N']
+    if '.' in number or 'e' in number or 'E' in number:
+        number = float(number)
+        return int(number) if number.is_integer() else number
+    return int(number)
+
+
+def _tags(value):
+    if 'L' in value:
+        return [tag['S'] for tag in value['L']]
+    # a string set
+    return list(value['SS'])
+
+
+_string = itemgetter('S')
+
+# property -> function decoding its attribute value
+_decoders = {
+    'id': _string,
+    'name': _string,
+    'amount': _amount,
+    'tags': _tags,
+    'currency': _string,
+    'timestamp_utc': _string,
+    'timestamp_utc_created': _string,
+    'timestamp_utc_updated': _string,
+}
+assert set(_decoders) == set(expense_properties), "A property of the expense schema has no decoder"
+
+
+def expense_from_wire(item):
+    """
+    :param item: an item of the `Items` of a low-level client response
+    :return: the expense. attributes which aren't expense properties (e.g. user_uid) are dropped
+    """
+    # not stored, if empty. see ExpenseConverter.convertToDbFormat()
+    expense = {'name': '', 'tags': []}
+    for attr, value in item.items():
+        decode = _decoders.get(attr)
+        if decode is not None:
+            expense[attr] = decode(value)
+    return expense
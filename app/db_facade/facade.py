@@ -1,18 +1,31 @@
 import uuid
 import warnings
+from datetime import timezone, timedelta, time
 from decimal import Decimal
-from itertools import groupby
+from threading import Lock
 
 import boto3
-from boto3.dynamodb.conditions import Key, And, Attr
-
-from app.db_facade.misc import OrderingDirection
-from app.db_facade.table_schema import index_for_property
-from app.helpers.time import utc_now_str
-from app.helpers.utils import deadline
+from boto3.dynamodb.conditions import Key, And, Attr, ConditionExpressionBuilder
+from botocore.exceptions import ClientError
+
+from app.db_facade.misc import OrderingDirection, SyncLookup
+from app.db_facade.pagination import ContinuationTokenSerializer, InvalidContinuationToken
+from app.db_facade.aggregation import CurrencyAccumulator, BucketedAccumulator, ADDITIVE_AGGREGATES
+from app.db_facade.capacity import ConsumedCapacityMeter
+from app.db_facade.health import TableHealthCheck, TableStatus
+from app.db_facade.changelog import ChangeLog, ChangeOperation
+from app.db_facade.rollups import StatisticsRollups, deltas_for, merge_deltas
+from app.db_facade.table_schema import index_for_property, query_plan_for_property
+from app.helpers.fx_rates import get_rate_table, NoFxRate, DEFAULT_RATES_FILE
+from app.helpers.time import utc_now_str, dt_from_utc_iso_str
+from app.helpers.time_budget import TimeBudget, TimeBudgetExhausted, current_budget, retries_within_budget
+from app.helpers.utils import deadline, exponential_backoff
 from app.models.expense_validation import Validator
 from app.models.json_schema import expense_properties
 from config import EnvironmentName
+from .dynamodb.batch import batch_get_items, batch_delete_items, transact_put_items, transact_delete_items, \
+    serialize_item, deserialize_item, WriteOutcome, UnprocessedItemsRemain
+from .dynamodb.expense_wire_format import expense_from_wire
 from .dynamodb.reserved_attr_names import reserved_attr_names
 from .table_schema import range_key, hash_key
 
@@ -21,17 +34,25 @@ http://boto3.readthedocs.io/en/latest/reference/services/dynamodb.html
 """
 raw_db = None
 expense_type = dict
+# how many times a change, written in a transaction, is tried. e.g. if the expense changes concurrently
+MAX_TRANSACTION_ATTEMPTS = 3
 """
 https://docs.aws.amazon.com/amazondynamodb/latest/developerguide/ReservedWords.html
 we know the property names of an expense. in this dict we keep valid property names that can
 be used in query expressions.
 """
 escaped_attr_names = {}
-for property in expense_properties:
-    safe_property_name = property
-    if property.upper() in reserved_attr_names:
+for exp_property in expense_properties:
+    safe_property_name = exp_property
+    if exp_property.upper() in reserved_attr_names:
         safe_property_name = "#%s" % safe_property_name
-    escaped_attr_names[safe_property_name] = property
+    escaped_attr_names[safe_property_name] = exp_property
+# property name -> the name to use in expressions
+attr_name_placeholders = {v: k for k, v in escaped_attr_names.items()}
+# the properties, which an update can change in place. the rest are part of the key
+updatable_properties = [p for p in expense_properties if p not in ('id', range_key)]
+# the properties, which patch() can change. timestamp_utc_updated is set by the server
+patchable_properties = [p for p in updatable_properties if p not in ('timestamp_utc_created', 'timestamp_utc_updated')]
 # to be included in queries if all expense properties are to be retrieved (EXcluding item attributes that don't belong
 # to the expense schema). handles property names which are Dynamodb reserved words
 projection_expr_expenseONLY_attrs = {
@@ -62,8 +83,13 @@ class ExpenseConverter(object):
             del copy['name']
         return copy
 
-    def convertFromDbFormat(self, exp):
-        copy = exp.copy()
+    def convertFromDbFormat(self, exp, in_place=False):
+        """
+        :param exp: expense in db format
+        :param in_place: if true, `exp` is converted instead of a copy of it. e.g. for the items of a db response,
+        which aren't referenced from elsewhere
+        """
+        copy = exp if in_place else exp.copy()
         for key, value in copy.items():
             if isinstance(value, Decimal):
                 copy[key] = self.convertNumberFromDbFormat(value)
@@ -119,21 +145,56 @@ class __DbFacade(object):
     HASH_KEY = hash_key
     RANGE_KEY = range_key
     EXPENSES_TABLE_NAME = EXPENSES_TABLE_NAME_PREFIX
+    CHANGELOG_TABLE_NAME_PREFIX = 'expenses-changelog-'
+    CHANGELOG_TABLE_NAME = CHANGELOG_TABLE_NAME_PREFIX
+    ROLLUPS_TABLE_NAME_PREFIX = 'expenses-rollups-'
+    ROLLUPS_TABLE_NAME = ROLLUPS_TABLE_NAME_PREFIX
 
     DEFAULT_ORDERING = OrderingDirection.desc
     converter = ExpenseConverter()
     reserved_dynamodb_words = ['name']
 
     def __init__(self):
-        self.expenses_table = None
         self.lazy_ping = False
+        self.max_execution_time = 3
+        # see DYNAMODB_* in config.py
+        self.client_settings = {}
+        # the dynamodb connection and the table handles are created by _connect(), in init_app() or, with
+        # LAZY_INIT, on first use
+        self._boto_kwargs = {}
+        self._connect_lock = Lock()
+        self._raw_db = None
+        self._raw_client = None
+        self._expenses_table = None
+        self._changelog = None
+        self._rollups = None
+        self.changelog_enabled = False
+        self.rollups_enabled = False
         self.max_sync_request_size = 10  # default. overridden in init_app()
+        self.max_sync_verify_request_size = 100
+        self.continuation_tokens = None
+        self.capacity_meter = ConsumedCapacityMeter()
+        self.table_health = TableHealthCheck()
+        self.max_sync_changes_size = 100
+        # get_list() via the low-level client. see expense_wire_format.py
+        self.get_list_low_level = False
+        self.statistics_max_pages = None
+        self.fx_rates_file = DEFAULT_RATES_FILE
 
     def init_app(self, app):
-        global raw_db
-
         self.EXPENSES_TABLE_NAME = (self.EXPENSES_TABLE_NAME_PREFIX + app.config['APP_STAGE']).lower()
+        self.CHANGELOG_TABLE_NAME = (self.CHANGELOG_TABLE_NAME_PREFIX + app.config['APP_STAGE']).lower()
+        self.ROLLUPS_TABLE_NAME = (self.ROLLUPS_TABLE_NAME_PREFIX + app.config['APP_STAGE']).lower()
         self.lazy_ping = app.config['DB_PING_LAZY']
+        self.max_execution_time = app.config['MAX_EXECUTION_TIME']
+        client_settings = {
+            "connect_timeout": app.config['DYNAMODB_CONNECT_TIMEOUT'],
+            "read_timeout": app.config['DYNAMODB_READ_TIMEOUT'],
+            "max_retries": app.config['DYNAMODB_MAX_RETRIES'],
+            "retry_mode": app.config['DYNAMODB_RETRY_MODE'],
+            "max_pool_connections": app.config['DYNAMODB_MAX_POOL_CONNECTIONS'],
+            "tcp_keepalive": app.config['DYNAMODB_TCP_KEEPALIVE'],
+        }
         kwargs = {}
         if app.config['APP_STAGE'] in [EnvironmentName.development, EnvironmentName.testing]:
             local_dynamodb_url = app.config['LOCAL_DYNAMODB_URL']
@@ -142,36 +203,147 @@ class __DbFacade(object):
         else:
             print("Will attempt to connect to an AWS instance of DynamoDB")
 
-        raw_db = boto3.resource('dynamodb', **kwargs)
-        print("Target DynamoDB endpoint %s" % raw_db.meta.client.meta.endpoint_url)
-        self.ping_db(raw_db)
-        self.raw_db = raw_db
-        self.expenses_table = raw_db.Table(self.EXPENSES_TABLE_NAME)
         self.max_sync_request_size = app.config['MAX_SYNC_REQUEST_SIZE']
+        self.max_sync_verify_request_size = app.config['MAX_SYNC_VERIFY_REQUEST_SIZE']
+        self.continuation_tokens = ContinuationTokenSerializer(app.config['SECRET_KEY'])
+        self.max_sync_changes_size = app.config['MAX_SYNC_CHANGES_SIZE']
+        self.changelog_enabled = app.config['SYNC_CHANGELOG_ENABLED']
+        self.get_list_low_level = app.config['GET_LIST_LOW_LEVEL_CLIENT']
+        self.statistics_max_pages = app.config['STATISTICS_MAX_PAGES']
+        self.rollups_enabled = app.config['STATISTICS_ROLLUPS_ENABLED']
+        self.fx_rates_file = app.config['FX_RATES_FILE']
+        self.table_health = TableHealthCheck(ttl_seconds=app.config['DB_HEALTH_CHECK_TTL'])
+
+        with self._connect_lock:
+            # the table handles depend on the stage
+            self._expenses_table = self._changelog = self._rollups = None
+            reuse = self._raw_db is not None and (kwargs, client_settings) == (self._boto_kwargs, self.client_settings)
+            if not reuse:
+                self._boto_kwargs = kwargs
+                self.client_settings = client_settings
+                self._raw_db = self._raw_client = None
+        if app.config['LAZY_INIT']:
+            print("Lazy init - the DynamoDB connection will be created on first use")
+        elif reuse:
+            # e.g. the app is created again by a warm process. keep the pooled connections
+            self.ping_db(self._raw_db)
+        else:
+            self._connect(ping=True)
+
+    def _connect(self, ping=False):
+        """
+        creates the boto3 resource and client. done once - concurrent callers wait for the first one. they are kept
+        for the lifetime of the process, so a warm lambda reuses their pooled connections
+        :param ping: if True, checks the connectivity (and, if not lazy_ping, that the expenses table exists) first
+        """
+        global raw_db
+        with self._connect_lock:
+            if self._raw_db is not None:
+                return
+            # a single session resolves the credentials and loads the service model once, for both
+            session = boto3.session.Session()
+            config = self._boto_config()
+            db = session.resource('dynamodb', config=config, **self._boto_kwargs)
+            print("Target DynamoDB endpoint %s" % db.meta.client.meta.endpoint_url)
+            if ping:
+                self.ping_db(db)
+            # unlike raw_db.meta.client, doesn't (de)serialize the attribute values. safe to share between threads
+            self._raw_client = session.client('dynamodb', config=config, **self._boto_kwargs)
+            for client in (db.meta.client, self._raw_client):
+                client.meta.events.register_first('needs-retry.dynamodb',
+                                                  retries_within_budget(config.connect_timeout + config.read_timeout))
+            raw_db = self._raw_db = db
+
+    def _boto_config(self):
+        """
+        the timeouts and retries of a single dynamodb call must fit in the time a request may take. calls made
+        later in a request are retried only while the rest of its budget allows - see retries_within_budget()
+        :return: botocore.config.Config
+        """
+        return TimeBudget(self.max_execution_time).boto_config(**self.client_settings)
+
+    @property
+    def raw_db(self):
+        if self._raw_db is None:
+            self._connect()
+        return self._raw_db
+
+    @property
+    def raw_client(self):
+        if self._raw_db is None:
+            self._connect()
+        return self._raw_client
+
+    @property
+    def expenses_table(self):
+        if self._expenses_table is None:
+            self._expenses_table = self.raw_db.Table(self.EXPENSES_TABLE_NAME)
+        return self._expenses_table
+
+    @property
+    def changelog(self):
+        """
+        :return: ChangeLog | None - if the change log is disabled
+        """
+        if self.changelog_enabled and self._changelog is None:
+            self._changelog = ChangeLog(self.raw_db.Table(self.CHANGELOG_TABLE_NAME))
+        return self._changelog
+
+    @property
+    def rollups(self):
+        """
+        :return: StatisticsRollups | None - if the rollups are disabled
+        """
+        if self.rollups_enabled and self._rollups is None:
+            self._rollups = StatisticsRollups(self.raw_db.Table(self.ROLLUPS_TABLE_NAME))
+        return self._rollups
+
+    @property
+    def _transactional_writes(self):
+        """
+        :return: True if each change to the expenses is written in a transaction, together with its change log entry
+        and/or the updates of the statistics rollups
+        """
+        return bool(self.changelog or self.rollups)
 
     @deadline(3, "Fail fast. DB health check failed. Is the table created and is the db reachable?")
     def ping_db(self, db):
 
         """
         makes a simple request to dynamodb to ensure that there's connectivity. will fail fast if there isn't
-        :return:
+        :return: the result of the health check. see TableHealthCheck.check()
         :raises Exception - if the db is not available
         """
+        health = self.table_health.check(db.meta.client, self.EXPENSES_TABLE_NAME, force=True)
         try:
-
-            list(db.tables.all())  # this can timeout if the db is not up
+            assert health['status'] != TableStatus.unreachable, health['error']
 
             if self.lazy_ping:
                 print("lazy pinging the db - not checking if the expenses table exists")
             else:
-                assert len(list(db.tables.all())), "No tables created!"
-
-                assert self.EXPENSES_TABLE_NAME in [t.name for t in
-                                                    db.tables.all()], "%s doesn't exist!" % self.EXPENSES_TABLE_NAME
+                assert health['status'] != TableStatus.missing, "%s doesn't exist!" % self.EXPENSES_TABLE_NAME
 
             print("Valid connection to the DynamoDB. Endpoint url [%s]" % db.meta.client.meta.endpoint_url)
         except Exception as err:
             raise Exception("DB not ready. raw error: " + str(err))
+        return health
+
+    def health(self):
+        """
+        :return: dict. the (cached) health of the expenses table, see TableHealthCheck.check(), and the capacity units
+        consumed by this process - "consumed_capacity", see ConsumedCapacityMeter.snapshot()
+        """
+        return {**self.table_health.check(self.raw_client, self.EXPENSES_TABLE_NAME),
+                "consumed_capacity": self.capacity_meter.snapshot()}
+
+    @staticmethod
+    def _ensure_time_left():
+        """
+        :raises TimeBudgetExhausted - if the time budget of the current request has been spent
+        """
+        budget = current_budget()
+        if budget is not None:
+            budget.ensure()
 
     def validate_get_list(self, property_name, ordering_direction, batch_size):
         if property_name not in index_for_property.keys():
@@ -203,30 +375,59 @@ class __DbFacade(object):
 
         :raises UnindexedPropertySelected if `property_name` is not a property that can be used to query
         """
+        expenses, _ = self.get_list_page(property_value=property_value,
+                                         user_uid=user_uid,
+                                         property_name=property_name,
+                                         ordering_direction=ordering_direction,
+                                         batch_size=batch_size,
+                                         inclusive_start=inclusive_start)
+        return expenses
+
+    def get_list_page(self,
+                      property_value,
+                      user_uid,
+                      property_name='timestamp_utc',
+                      ordering_direction: OrderingDirection = DEFAULT_ORDERING,
+                      batch_size=25,
+                      inclusive_start=False,
+                      continuation_token=None):
+        """
+        like get_list(), but also returns an opaque continuation token, which can be passed back to get the next page.
+        if `continuation_token` is set, `property_value` and `inclusive_start` are ignored - the query continues
+        exactly after the last item of the previous page.
+
+        :param continuation_token: str | None - a token returned from a previous call with the same
+                                   `user_uid`, `property_name` and `ordering_direction`
+        :return: tuple (list of expense objects, continuation token | None). the token is None if there are no more
+        items
+
+        :raises UnindexedPropertySelected if `property_name` is not a property that can be used to query
+        :raises InvalidContinuationToken if the `continuation_token` is not valid for this query
+        :raises TimeBudgetExhausted
+        """
 
         # validation
         self.validate_get_list(property_name, ordering_direction, batch_size)
+        self._ensure_time_left()
         batch_size = min(batch_size, MAX_BATCH_SIZE)
 
-        property_is_main_sort_key = index_for_property[property_name] is None
-
         # configure the query
         query_kwargs = {
-            **projection_expr_expenseONLY_attrs,
-            "Select": "SPECIFIC_ATTRIBUTES",
+            **self._plan_query(property_name),
             "Limit": batch_size,
             "ConsistentRead": False,
             "ScanIndexForward": True if ordering_direction is OrderingDirection.asc else False,
         }
 
-        # choose which index to query, if applicable
-        if property_name in index_for_property.keys():
-            if not property_is_main_sort_key:
-                query_kwargs['IndexName']: index_for_property[property_name]
-                query_kwargs['TableName'] = self.EXPENSES_TABLE_NAME
-
         # configure the hash and sort keys
-        if not property_value:
+        if continuation_token:
+            # the previous page ended at a known key - continue right after it
+            query_kwargs['ExclusiveStartKey'] = self.continuation_tokens.loads(continuation_token,
+                                                                               user_uid=user_uid,
+                                                                               property_name=property_name,
+                                                                               ordering_direction=ordering_direction)
+            query_kwargs['KeyConditionExpression'] = Key(self.HASH_KEY).eq(user_uid)
+        elif not property_value:
             # e.g. if querying via timestamp_utc, desc - search will start from the newest items
             query_kwargs['KeyConditionExpression'] = Key(self.HASH_KEY).eq(user_uid)
         else:
@@ -238,9 +439,62 @@ class __DbFacade(object):
 
             query_kwargs['KeyConditionExpression'] = And(Key(self.HASH_KEY).eq(user_uid), sort_key_cond(property_value))
 
-        result = self.expenses_table.query(**query_kwargs)['Items']
-
-        return [self.converter.convertFromDbFormat(e) for e in result]
+        if self.get_list_low_level:
+            expenses, last_evaluated_key = self._query_page_low_level(query_kwargs)
+        else:
+            response = self.expenses_table.query(**query_kwargs)
+            self.capacity_meter.record(response.get('ConsumedCapacity'), target=query_kwargs.get('IndexName'))
+            expenses = [sanitize_expense(self.converter.convertFromDbFormat(e, in_place=True))
+                        for e in response['Items']]
+            last_evaluated_key = response.get('LastEvaluatedKey')
+
+        next_token = self.continuation_tokens.dumps(last_evaluated_key,
+                                                    user_uid=user_uid,
+                                                    property_name=property_name,
+                                                    ordering_direction=ordering_direction)
+        return expenses, next_token
+
+    def _query_page_low_level(self, query_kwargs):
+        """
+        makes the query via the low-level client and decodes the items straight from the wire format
+        :param query_kwargs: kwargs for Table.query()
+        :return: tuple (list of expense objects, LastEvaluatedKey | None)
+        """
+        query_kwargs = query_kwargs.copy()
+        # the builder numbers its placeholders statefully - one per query
+        key_condition = ConditionExpressionBuilder().build_expression(query_kwargs.pop('KeyConditionExpression'),
+                                                                      is_key_condition=True)
+        query_kwargs['KeyConditionExpression'] = key_condition.condition_expression
+        query_kwargs['ExpressionAttributeNames'] = {**query_kwargs.get('ExpressionAttributeNames', {}),
+                                                    **key_condition.attribute_name_placeholders}
+        query_kwargs['ExpressionAttributeValues'] = serialize_item(key_condition.attribute_value_placeholders)
+        if 'ExclusiveStartKey' in query_kwargs:
+            query_kwargs['ExclusiveStartKey'] = serialize_item(query_kwargs['ExclusiveStartKey'])
+
+        response = self.raw_client.query(TableName=self.EXPENSES_TABLE_NAME, **query_kwargs)
+        self.capacity_meter.record(response.get('ConsumedCapacity'), target=query_kwargs.get('IndexName'))
+
+        last_evaluated_key = response.get('LastEvaluatedKey')
+        if last_evaluated_key:
+            last_evaluated_key = deserialize_item(last_evaluated_key)
+        return [expense_from_wire(e) for e in response['Items']], last_evaluated_key
+
+    def _plan_query(self, property_name):
+        """
+        given the property which will be used as a RANGE key, choose which index to query.
+        :param property_name: one of the keys of `query_plan_for_property`
+        :return: dict with kwargs for Table.query()
+        """
+        plan = query_plan_for_property[property_name]
+        query_kwargs = {
+            **projection_expr_expenseONLY_attrs,
+            "Select": "SPECIFIC_ATTRIBUTES",
+            # makes it possible to measure the cost of the query per index
+            "ReturnConsumedCapacity": "TOTAL"
+        }
+        if plan['IndexName']:
+            query_kwargs['IndexName'] = plan['IndexName']
+        return query_kwargs
 
     @sanitize_response_decorator(expense_type)
     def persist(self, expense, user_uid):
@@ -250,16 +504,68 @@ class __DbFacade(object):
         :return: the persisted expense
         :raises ItemWithSameRangeKeyExists
         :raises PersistFailed
+        :raises TimeBudgetExhausted - nothing has been written
         """
+        self._ensure_time_left()
         expense = expense.copy()
         touch_timestamp(expense, 'timestamp_utc_created')
         touch_timestamp(expense, 'timestamp_utc_updated')
-        raw_persisted = self._facade_put_item(context=self.expenses_table, expense=expense, user_uid=user_uid)
+        if self._transactional_writes:
+            raw_persisted = self._transact_persist(expense, user_uid)
+        else:
+            raw_persisted = self._facade_put_item(context=self.expenses_table, expense=expense, user_uid=user_uid)
         # still has user_uid
         persisted = self.converter.convertFromDbFormat(raw_persisted)
 
         return persisted
 
+    def persist_many(self, expenses, user_uid):
+        """
+        persists the expenses in TransactWriteItems batches. like persist(), an expense isn't written if there's
+        already an expense with the same `timestamp_utc`
+        :param expenses: list of expenses, each with `id` set to None
+        :param user_uid:
+        :return: list with an item per expense, in the same order - the persisted expense, or the exception for
+        which it wasn't persisted: ItemWithSameRangeKeyExists or DynamodbThroughputExhausted
+        :raises ValueError - if an expense has an `id`
+        :raises TimeBudgetExhausted - nothing has been written
+        """
+        if any(expense['id'] for expense in expenses):
+            raise ValueError("Can't persist an expense which already has an `id`")
+        self._ensure_time_left()
+
+        results = [None] * len(expenses)
+        to_write, written_indexes, range_keys = [], [], set()
+        for i, expense in enumerate(expenses):
+            exp = expense.copy()
+            touch_timestamp(exp, 'timestamp_utc_created')
+            touch_timestamp(exp, 'timestamp_utc_updated')
+            exp['id'] = str(uuid.uuid4())
+            exp['user_uid'] = user_uid
+            if exp[self.RANGE_KEY] in range_keys:
+                # a transaction can't write the same item twice
+                results[i] = ItemWithSameRangeKeyExists("Item with RANGE key %s already exists" % exp[self.RANGE_KEY])
+                continue
+            range_keys.add(exp[self.RANGE_KEY])
+            to_write.append(exp)
+            written_indexes.append(i)
+
+        items = [self.converter.convertToDbFormat(exp) for exp in to_write]
+        outcomes = transact_put_items(self.raw_client, self.EXPENSES_TABLE_NAME, items,
+                                      condition_expression="attribute_not_exists(%s)" % self.RANGE_KEY,
+                                      companions=self._change_log_companions(user_uid, ChangeOperation.persist, items),
+                                      shared=self._shared_rollup_operations(user_uid, items),
+                                      time_budget=current_budget())
+
+        for i, exp, outcome in zip(written_indexes, to_write, outcomes):
+            if outcome == WriteOutcome.written:
+                results[i] = sanitize_expense(exp.copy())
+            elif outcome == WriteOutcome.condition_failed:
+                results[i] = ItemWithSameRangeKeyExists("Item with RANGE key %s already exists" % exp[self.RANGE_KEY])
+            else:
+                results[i] = DynamodbThroughputExhausted("The expense couldn't be written in time")
+        return results
+
     @sanitize_response_decorator(expense_type)
     def update(self, expense, old_expense, user_uid):
         """
@@ -274,32 +580,94 @@ class __DbFacade(object):
         :raises NoExpenseWithThisId - if there's not expense at rest that has the same `id`. This will be raised
         either when there's no expense with the same key, or when the expense at rest has a different id (which
         is not a valid application state) than `expense`.
+        :raises ItemWithSameRangeKeyExists - if the `timestamp_utc` changed to that of another expense
+        :raises TimeBudgetExhausted - nothing has been written
         """
         exp = expense.copy()
         old_expense = old_expense.copy()
 
         if exp['id'] != old_expense['id']:
             raise ValueError("The `id`s of the updated and the old expense don't match")
+        self._ensure_time_left()
 
         touch_timestamp(exp, 'timestamp_utc_updated')
 
         if exp[self.RANGE_KEY] == old_expense[self.RANGE_KEY]:
-            self._standard_update(exp, user_uid)
+            changed = [p for p in updatable_properties if exp[p] != old_expense[p]]
+            if self._transactional_writes:
+                changes = {p: exp[p] for p in set(changed) | {'timestamp_utc_updated'}}
+                _, exp = self._transact_update(exp['id'], exp[self.RANGE_KEY], changes, user_uid)
+            else:
+                at_rest = self._standard_update(exp, user_uid, changed=changed)
+                # the properties the client didn't change keep their value at rest
+                exp = {**self.converter.convertFromDbFormat(at_rest), **{p: exp[p] for p in changed}}
         else:
             # https://stackoverflow.com/a/30314563/4509634 You can use UpdateItem to update any nonkey attributes.
             self._two_phase_update(exp, old_expense, user_uid)
 
         return exp
 
+    @sanitize_response_decorator(expense_type)
+    def patch(self, expense_id, timestamp_utc, expected_timestamp_utc_updated, changes, user_uid):
+        """
+        changes only the given properties of an expense, if it hasn't been updated since the client read it
+        (optimistic concurrency). unlike update(), doesn't need the whole expense, nor its previous state
+        :param expense_id:
+        :param timestamp_utc: the `timestamp_utc` of the expense. can't be changed - see update()
+        :param expected_timestamp_utc_updated: the `timestamp_utc_updated` of the expense, as the client knows it
+        :param changes: dict. property name (one of `updatable_properties`, but `timestamp_utc_updated`) -> new value
+        :param user_uid:
+        :return: the expense, as it is at rest after the change
+        :raises ValueError - if a property in `changes` can't be patched
+        :raises NoExpenseWithThisId
+        :raises ExpenseChangedConcurrently - the expense at rest has a different `timestamp_utc_updated`
+        :raises TimeBudgetExhausted - nothing has been written
+        """
+        if not set(changes).issubset(patchable_properties):
+            raise ValueError("Only [%s] can be patched" % ", ".join(patchable_properties))
+        self._ensure_time_left()
+
+        changes = {**changes, 'timestamp_utc_updated': utc_now_str()}
+        if self._transactional_writes:
+            _, patched = self._transact_update(expense_id, timestamp_utc, changes, user_uid,
+                                               expected_timestamp_utc_updated=expected_timestamp_utc_updated)
+            return patched
+
+        key = {self.HASH_KEY: user_uid, self.RANGE_KEY: timestamp_utc}
+        update_kwargs = self._update_expression(changes)
+        update_kwargs['ExpressionAttributeValues'].update({":id": expense_id,
+                                                           ":expected": expected_timestamp_utc_updated})
+        try:
+            response = self.expenses_table.update_item(
+                Key=key,
+                ReturnValues="ALL_OLD",
+                ConditionExpression="id = :id AND timestamp_utc_updated = :expected",
+                **update_kwargs
+            )
+        except Exception as ex:
+            if "ConditionalCheckFailedException" not in str(ex):
+                raise ex
+            at_rest = self.expenses_table.get_item(Key=key, ConsistentRead=True).get('Item')
+            if not at_rest or at_rest['id'] != expense_id:
+                raise NoExpenseWithThisId()
+            raise ExpenseChangedConcurrently("The expense was updated at %s" % at_rest['timestamp_utc_updated'])
+
+        return {**self.converter.convertFromDbFormat(response['Attributes']), **changes}
+
     def remove(self, expense, user_uid):
         """
         :param expense: expense object
         :param user_uid:
         :return: None
         :raises NoExpenseWithThisId
+        :raises TimeBudgetExhausted - nothing has been removed
         :returns void
         """
+        self._ensure_time_left()
         expense = expense.copy()
+        if self._transactional_writes:
+            self._transact_remove(expense, user_uid)
+            return
         try:
             self.expenses_table.delete_item(
                 Key={
@@ -316,7 +684,120 @@ class __DbFacade(object):
             else:
                 raise err
 
-    def sync(self, sync_request_objs, user_uid):
+    def remove_many(self, expenses, user_uid):
+        """
+        removes the expenses in a few round-trips, regardless of their number: the expenses at rest are read via
+        BatchGetItem, then the ones with the requested `id` are deleted in chunks.
+
+        with the change log or the rollups on, the deletes are written via TransactWriteItems, together with the change
+        log entries and the rollup updates. an expense is deleted only if the expense at rest still has the same `id`,
+        `amount`, `currency` and `timestamp_utc_updated` as when it was read. if it doesn't, it's read again (up to
+        MAX_TRANSACTION_ATTEMPTS times). otherwise, they are deleted via BatchWriteItem, which costs half the WCUs -
+        but unconditionally, so an expense replaced after it was read is removed too
+        :param expenses: list of dicts with (at least) the `id` and `timestamp_utc` of an expense
+        :param user_uid:
+        :return: dict {"removed": [ids], "missing": [ids of the expenses without an expense at rest with the same
+        `timestamp_utc` and `id`], "unprocessed": [ids of the expenses which couldn't be removed in time]}
+        :raises DynamodbThroughputExhausted - if the expenses at rest can't be read. nothing has been removed
+        :raises TimeBudgetExhausted - nothing has been removed
+        """
+        self._ensure_time_left()
+        requested = {(expense[self.RANGE_KEY], expense['id']) for expense in expenses}
+        try:
+            to_remove = self._read_to_remove(user_uid, {range_key for range_key, _ in requested}, requested)
+        except UnprocessedItemsRemain:
+            self._ensure_time_left()
+            raise DynamodbThroughputExhausted()
+
+        if self._transactional_writes:
+            removed_ids, unprocessed_ids = self._transact_remove_many(to_remove, requested, user_uid)
+        else:
+            outcomes = batch_delete_items(self.raw_client, self.EXPENSES_TABLE_NAME,
+                                          keys=[{self.HASH_KEY: user_uid, self.RANGE_KEY: item[self.RANGE_KEY]}
+                                                for item in to_remove],
+                                          time_budget=current_budget())
+            removed_ids = {item['id'] for item, outcome in zip(to_remove, outcomes) if outcome == WriteOutcome.written}
+            unprocessed_ids = {item['id'] for item, outcome in zip(to_remove, outcomes)
+                               if outcome == WriteOutcome.unprocessed}
+
+        result = {"removed": [], "missing": [], "unprocessed": []}
+        for expense_id in sorted({expense['id'] for expense in expenses}):
+            if expense_id in removed_ids:
+                result['removed'].append(expense_id)
+            elif expense_id in unprocessed_ids:
+                result['unprocessed'].append(expense_id)
+            else:
+                result['missing'].append(expense_id)
+        return result
+
+    def _transact_remove_many(self, to_remove, requested, user_uid):
+        """
+        :param to_remove: the expenses, as they were read
+        :param requested: set of (`timestamp_utc`, `id`) of the expenses to remove
+        :return: tuple (set of the removed ids, set of the ids which couldn't be removed in time)
+        """
+        removed_ids, unprocessed_ids = set(), set()
+        for attempt in range(MAX_TRANSACTION_ATTEMPTS):
+            outcomes = self._transact_remove_read(to_remove, user_uid)
+            removed_ids |= {item['id'] for item, outcome in zip(to_remove, outcomes)
+                            if outcome == WriteOutcome.written}
+            unprocessed_ids |= {item['id'] for item, outcome in zip(to_remove, outcomes)
+                                if outcome == WriteOutcome.unprocessed}
+            changed = [item for item, outcome in zip(to_remove, outcomes) if outcome == WriteOutcome.condition_failed]
+            if not changed:
+                break
+            if attempt == MAX_TRANSACTION_ATTEMPTS - 1:
+                unprocessed_ids |= {item['id'] for item in changed}
+                break
+            # the expense at rest was changed (or replaced, or removed) after it was read. it's removed, if it's still
+            # the requested one
+            try:
+                to_remove = self._read_to_remove(user_uid, {item[self.RANGE_KEY] for item in changed}, requested)
+            except UnprocessedItemsRemain:
+                unprocessed_ids |= {item['id'] for item in changed}
+                break
+        return removed_ids, unprocessed_ids
+
+    def _read_to_remove(self, user_uid, range_keys, requested):
+        """
+        :param range_keys: the `timestamp_utc`s to read
+        :param requested: set of (`timestamp_utc`, `id`) of the expenses to remove
+        :return: the expenses at rest (read consistently), which are requested
+        :raises UnprocessedItemsRemain
+        """
+        at_rest = batch_get_items(self.raw_client,
+                                  table_name=self.EXPENSES_TABLE_NAME,
+                                  keys=[{self.HASH_KEY: user_uid, self.RANGE_KEY: key} for key in range_keys],
+                                  time_budget=current_budget(),
+                                  ConsistentRead=True)
+        return [item for item in at_rest if (item[self.RANGE_KEY], item['id']) in requested]
+
+    def _transact_remove_read(self, to_remove, user_uid):
+        """
+        :param to_remove: the expenses, as they were read
+        :return: list with the WriteOutcome of each expense. condition_failed if the expense at rest changed since
+        it was read
+        """
+        if not to_remove:
+            return []
+        # the change log entries and the rollup updates are written in the same transactions. the expenses must not
+        # have changed since they were read - the rollups are updated with the amounts read, and the sequence numbers
+        # of the removals are allocated after that
+        return transact_delete_items(self.raw_client, self.EXPENSES_TABLE_NAME,
+                                     keys=[{self.HASH_KEY: user_uid, self.RANGE_KEY: item[self.RANGE_KEY]}
+                                           for item in to_remove],
+                                     condition_expression="id = :id AND amount = :amount AND currency = :currency "
+                                                          "AND timestamp_utc_updated = :updated",
+                                     condition_values=[{":id": item['id'], ":amount": item['amount'],
+                                                        ":currency": item['currency'],
+                                                        ":updated": item['timestamp_utc_updated']}
+                                                       for item in to_remove],
+                                     companions=self._change_log_companions(user_uid, ChangeOperation.remove,
+                                                                            to_remove),
+                                     shared=self._shared_rollup_operations(user_uid, to_remove, sign=-1),
+                                     time_budget=current_budget())
+
+    def sync(self, sync_request_objs, user_uid, lookup: SyncLookup = SyncLookup.query):
         """
         given a list from the client of request objects (each containing `timestamp_utc_updated` & the `id` of an expense,
         this method will return which of the input objects the client should remove, add and update.
@@ -326,50 +807,229 @@ class __DbFacade(object):
             "some-expense-id": {"timestamp_utc_updated": "<iso8601>", "timestamp_utc_updated": "<iso8601>"},
             ...
         }
-        :return: dict with keys "to_add", "to_remove", "to_update".
+        :param lookup: SyncLookup. with SyncLookup.batch_get, one read is made per request object - and one more, by
+        `id`, for those without an expense at rest with their `timestamp_utc`. "to_add" contains only expenses which
+        took the place (the same `timestamp_utc`) of an expense of the client, and the expenses found neither way are
+        "unknown" rather than "to_remove"
+        :return: dict with keys "to_add", "to_remove", "to_update", "unknown" (ids, always empty with SyncLookup.query)
         :raises RuntimeError if no LSI is setup
         :raises DynamodbThroughputExhausted - if the operation exhausted the allowed RCUs dedicated to the base table.
+        :raises TimeBudgetExhausted
         """
         try:
             assert 'id' in index_for_property
             assert index_for_property['id']
         except AssertionError:
             raise RuntimeError("Invalid application state. a LSI with `id` as RANGE key is required for /sync")
+        self._ensure_time_left()
 
         try:
-            items = self._sync_get_items(user_uid, sync_request_objs)
+            items = self._sync_get_items(user_uid, sync_request_objs, lookup=lookup)
             result = self._sync_process_items(items, sync_request_objs)
+            result['unknown'] = []
+            if lookup is SyncLookup.batch_get:
+                result['unknown'], result['to_remove'] = result['to_remove'], []
             convert = self.converter.convertFromDbFormat
 
-            result['to_update'] = [convert(sanitize_expense(e)) for e in result['to_update']]
-            result['to_add'] = [convert(sanitize_expense(e)) for e in result['to_add']]
+            result['to_update'] = [convert(sanitize_expense(e), in_place=True) for e in result['to_update']]
+            result['to_add'] = [convert(sanitize_expense(e), in_place=True) for e in result['to_add']]
 
             return result
+        except UnprocessedItemsRemain:
+            self._ensure_time_left()  # the retries might have stopped because there's no time left for them
+            raise DynamodbThroughputExhausted()
+        except Exception as ex:
+            if "ProvisionedThroughputExceededException" in str(ex):
+                raise DynamodbThroughputExhausted()
+            else:
+                raise ex
+
+    def sync_changes(self, since, user_uid):
+        """
+        incremental alternative to sync(). given the high-water mark of the client (the largest change log sequence
+        number the client has seen), return only what has changed after it.
+
+        :param since: int >= 0. 0 if the client hasn't synced via the change log before
+        :param user_uid:
+        :return: dict with keys "to_add", "to_remove", "to_update" (same as sync()), "high_water_mark" - the
+        value of `since` for the next call, "has_more" - true if not all changes fit into this response, and
+        "retry_after" - None or seconds. set if a change, made concurrently, might still be written before the later
+        changes. they are returned once it is - the client should repeat the call after that many seconds
+        :raises RuntimeError if the change log is not enabled
+        :raises DynamodbThroughputExhausted - if the operation exhausted the allowed RCUs of the change log table.
+        :raises TimeBudgetExhausted - if the time budget is spent before anything could be read
+        """
+        if not self.changelog:
+            raise RuntimeError("Invalid application state. The change log is required for incremental /sync")
+        self._ensure_time_left()
+        try:
+            # if the time budget runs out while reading, the changes read so far are returned, with has_more=True
+            entries, high_water_mark, has_more, retry_after = self.changelog.changes_since(
+                user_uid, since_seq=since, max_changes=self.max_sync_changes_size, time_budget=current_budget())
         except Exception as ex:
             if "ProvisionedThroughputExceededException" in str(ex):
                 raise DynamodbThroughputExhausted()
             else:
                 raise ex
 
-    def statistics(self, from_dt, to_dt, user_uid):
+        result = self._sync_collapse_changes(entries)
+        result['high_water_mark'] = high_water_mark
+        result['has_more'] = has_more
+        result['retry_after'] = retry_after
+        return result
+
+    def _sync_collapse_changes(self, entries):
+        """
+        several changes to the same expense are collapsed into one, based on the first and the last change to it
+        :param entries: change log entries, ordered by sequence number
+        :return: dict with keys "to_add", "to_remove", "to_update"
+        """
+        first_and_last = {}
+        for entry in entries:
+            first, _ = first_and_last.get(entry['id'], (entry, None))
+            first_and_last[entry['id']] = (first, entry)
+
+        result = {
+            'to_add': [],
+            'to_remove': [],
+            'to_update': []
+        }
+        convert = self.converter.convertFromDbFormat
+        for exp_id, (first, last) in first_and_last.items():
+            created_since = first['operation'] == ChangeOperation.persist
+            if last['operation'] == ChangeOperation.remove:
+                # the client can't have an expense, which was created (and removed) after its high-water mark
+                if not created_since:
+                    result['to_remove'].append(exp_id)
+            elif created_since:
+                result['to_add'].append(convert(last['expense'], in_place=True))
+            else:
+                result['to_update'].append(convert(last['expense'], in_place=True))
+        return result
+
+    def statistics(self, from_dt, to_dt, user_uid, aggregates=None, bucket=None, home_currency=None):
+        """
+        :param from_dt: iso8601 str, inclusive
+        :param to_dt: iso8601 str, exclusive
+        :param user_uid:
+        :param aggregates: None or a list of names from aggregation.AGGREGATES
+        :param bucket: None or one of aggregation.BUCKETS. if set, the statistics are computed for each UTC
+        day/week/month of the time window
+        :return: if `aggregates` is None, dict. currency -> the sum of the amounts of the expenses in this currency,
+        within the time window. otherwise, dict. currency -> {aggregate name: value}.
+        if `bucket` is set, list of {"start": <first day of the bucket>, "statistics": <dict as above>},
+        ordered by "start", for each bucket with expenses
+        :param home_currency: None or str. if set, the amounts are also converted to this currency and summed.
+        the result becomes {"by_currency": <dict as above>, "home_currency": <dict>} and each bucket of a series
+        gets a "home_currency" key. see CurrencyAccumulator.normalised_total()
+        :raises QueryPageBudgetExhausted - if reading the expenses needs more than `statistics_max_pages` pages
+        :raises TimeBudgetExhausted - if the time budget of the request is spent before all expenses are read
+        :raises NoFxRate - if there's no exchange rate for the home currency
+        """
+        self._ensure_time_left()
+        rate_table = get_rate_table(self.fx_rates_file) if home_currency else None
+        if home_currency and not rate_table.has_rate(home_currency):
+            raise NoFxRate(home_currency)  # fail before querying
+
+        accumulator = BucketedAccumulator(bucket) if bucket else CurrencyAccumulator()
+        self._statistics_accumulate(accumulator, from_dt, to_dt, user_uid,
+                                    use_rollups=all(a in ADDITIVE_AGGREGATES for a in aggregates or []))
+        if bucket:
+            return accumulator.series(aggregates, rate_table=rate_table, home_currency=home_currency)
+        result = accumulator.totals() if aggregates is None else accumulator.summary(aggregates)
+        if home_currency:
+            return {"by_currency": result, "home_currency": accumulator.normalised_total(rate_table, home_currency)}
+        return result
+
+    def _statistics_accumulate(self, accumulator, from_dt, to_dt, user_uid, use_rollups=True):
+        """
+        feeds the expenses within the time window to the accumulator, in ascending `timestamp_utc` order
+        :param accumulator: CurrencyAccumulator | BucketedAccumulator
+        :param use_rollups: if False, the statistics are computed from the expenses, even if rollups are enabled.
+        needed for aggregates like min/max, which the rollups can't provide
+        """
+        page_budget = PageBudget(self.statistics_max_pages)
+
+        for source, start, end in self._statistics_plan(from_dt, to_dt, use_rollups=use_rollups):
+            if source == 'rollups':
+                accumulator.add_rollups(self.rollups.read(user_uid, start, end))
+            else:
+                accumulator.add_all(self._statistics_query_items(start, end, user_uid, page_budget))
+
+    def _statistics_plan(self, from_dt, to_dt, use_rollups=True):
+        """
+        decide which parts of the [from_dt, to_dt) window are read from the rollups and which from the expenses.
+        the rollups are used for the UTC days which are fully within the window.
+        :return: list of (source, start, end) tuples, ordered by time. source is either 'expenses' - start and end
+        are the [from, to) window to query, or 'rollups' - start and end are the first and last day to read
+        """
+        if not (self.rollups and use_rollups):
+            return [('expenses', from_dt, to_dt)]
+
+        from_date, to_date = [dt_from_utc_iso_str(ts).astimezone(timezone.utc) for ts in (from_dt, to_dt)]
+        if from_date.date() == to_date.date():
+            return [('expenses', from_dt, to_dt)]
+
+        def is_midnight(d):
+            return d.time() == time(0)
+
+        plan = []
+        first_full_day = from_date.date()
+        if not is_midnight(from_date):
+            first_full_day += timedelta(days=1)
+            # all timestamps of a day start with "<day>T", so "<day>U" is larger than any of them
+            plan.append(('expenses', from_dt, from_date.date().isoformat() + "U"))
+        last_full_day = to_date.date() - timedelta(days=1)
+        if first_full_day <= last_full_day:
+            plan.append(('rollups', first_full_day.isoformat(), last_full_day.isoformat()))
+        if not is_midnight(to_date):
+            # the day itself is smaller than any timestamp within it
+            plan.append(('expenses', to_date.date().isoformat(), to_dt))
+        return plan
+
+    def _statistics_query_items(self, from_dt, to_dt, user_uid, page_budget=None):
+        """
+        :param page_budget: PageBudget | None
+        :return: generator of the expenses (only their currency, amount and timestamp_utc) in [from_dt, to_dt)
+        """
         query_kwargs = {
             # **projection_expr_expenseONLY_attrs,
             "ProjectionExpression": "currency,amount,timestamp_utc",
             "Select": "SPECIFIC_ATTRIBUTES",
             "ConsistentRead": False,
-            "ScanIndexForward": False,  # descending order
+            "ScanIndexForward": True,  # ascending order - bucketed statistics are computed in a single pass
             "KeyConditionExpression":
                 And(
-                    Key("timestamp_utc").between(from_dt, to_dt),
-                    Key('user_uid').eq(user_uid)
+                    Key('user_uid').eq(user_uid),
+                    Key("timestamp_utc").between(from_dt, to_dt)
                 )
         }
 
-        result = self.expenses_table.query(**query_kwargs)['Items']
-        if result and result[0][
-            'timestamp_utc'] == to_dt:  # simulate exclusive lte (between() is inclusive on both sides)
-            result.pop(0)
-        return self._groupStatisticsItems(result)
+        for page in self._iter_query_pages(query_kwargs, page_budget):
+            for item in page:
+                if item['timestamp_utc'] != to_dt:  # simulate exclusive lte (between() is inclusive on both sides)
+                    yield item
+
+    def _iter_query_pages(self, query_kwargs, page_budget=None):
+        """
+        queries the expenses table, following `LastEvaluatedKey` until all pages are read.
+        :param query_kwargs: kwargs for Table.query()
+        :param page_budget: PageBudget | None. if set, each page is spent from it
+        :return: generator of the `Items` of each page
+        :raises QueryPageBudgetExhausted
+        :raises TimeBudgetExhausted - if the time budget of the request is spent before all pages are read
+        """
+        query_kwargs = query_kwargs.copy()
+        while True:
+            if page_budget:
+                page_budget.spend()
+            self._ensure_time_left()
+            response = self.expenses_table.query(**query_kwargs)
+            yield response['Items']
+
+            if 'LastEvaluatedKey' not in response:
+                return
+            query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
 
     def _groupStatisticsItems(self, items):
         """
@@ -379,24 +1039,12 @@ class __DbFacade(object):
             {"currency":"EUR", "amount":10},
         ] ===> {"EUR":20, "USD":20}
         """
-        key = lambda k: k['currency']
-        items.sort(key=key)
+        return CurrencyAccumulator().add_all(items).totals()
 
-        def shrt_num(x): return float("%.2f" % x)
-
-        list_of_dicts = [
-            {
-                currencyName:
-                    shrt_num(sum(self.converter.convertNumberFromDbFormat((i['amount'])) for i in itemsOfSameCurrency))}
-            for (currencyName, itemsOfSameCurrency)
-            in groupby(items, key=key)
-        ]
-        result = {}
-        for d in list_of_dicts:
-            result.update(d)
-        return result
+    def _sync_get_items(self, user_uid, request_objects, lookup=SyncLookup.query):
+        if lookup is SyncLookup.batch_get:
+            return self._sync_batch_get_items(user_uid, request_objects)
 
-    def _sync_get_items(self, user_uid, request_objects):
         choose = max if self.DEFAULT_ORDERING is OrderingDirection.desc else min
         start_timestamp = choose([exp['timestamp_utc'] for exp in request_objects.values()])
         from_db = self.get_list(user_uid=user_uid,
@@ -410,6 +1058,44 @@ class __DbFacade(object):
             result[exp['id']] = exp
         return result
 
+    def _sync_batch_get_items(self, user_uid, request_objects):
+        """
+        the request objects have the `timestamp_utc` of the expenses, which, together with the user_uid, is the full
+        primary key. fetch exactly these items. the expenses of the client, which aren't at their key anymore (e.g.
+        their `timestamp_utc` was changed), are then looked up by their `id` - as long as there's time left
+        :return: same as _sync_get_items()
+        """
+        keys = {(user_uid, obj['timestamp_utc']) for obj in request_objects.values()}
+        from_db = batch_get_items(self.raw_client,
+                                  table_name=self.EXPENSES_TABLE_NAME,
+                                  keys=[{self.HASH_KEY: hash_value, self.RANGE_KEY: range_value}
+                                        for hash_value, range_value in keys],
+                                  time_budget=current_budget(),
+                                  **projection_expr_expenseONLY_attrs)
+        result = {exp['id']: self.converter.convertFromDbFormat(exp, in_place=True) for exp in from_db}
+        budget = current_budget()
+        for exp_id in sorted(set(request_objects) - set(result)):
+            if budget is not None and budget.expired():
+                break
+            exp = self._sync_get_item_by_id(user_uid, exp_id)
+            if exp:
+                result[exp_id] = exp
+        return result
+
+    def _sync_get_item_by_id(self, user_uid, expense_id):
+        """
+        :return: the expense with the `id`, read consistently via the LSI with `id` as RANGE key. None if there's none
+        """
+        response = self.expenses_table.query(
+            IndexName=index_for_property['id'],
+            KeyConditionExpression=Key(self.HASH_KEY).eq(user_uid) & Key('id').eq(expense_id),
+            ConsistentRead=True,
+            **projection_expr_expenseONLY_attrs
+        )
+        if not response['Items']:
+            return None
+        return self.converter.convertFromDbFormat(response['Items'][0], in_place=True)
+
     def _sync_process_items(self, items_from_db, request_objects):
         """
         :param items_from_db: a dict with key an expense `id` and value the expense
@@ -453,23 +1139,30 @@ class __DbFacade(object):
         :raises  NoSuchUser
         """
 
-    def _standard_update(self, expense, user_uid):
+    def _standard_update(self, expense, user_uid, changed=None):
         """
-        given that there's already an item with the same hash and range keys,
-        use the `expense` will replace the existing item.
+        given that there's already an item with the same hash and range keys, updates (UpdateItem) only the changed
+        properties of the existing item.
         :param expense:
         :param user_uid:
-        :return:
+        :param changed: the names of the changed properties. `timestamp_utc_updated` is always updated. if None, all
+        but the keys are
+        :return: the replaced item, as it was at rest
         :raises NoExpenseWithThisId if there's no expense with the same key found to update
                                     OR the expense at rest has a different `id`
         """
+        changed = updatable_properties if changed is None else set(changed) | {'timestamp_utc_updated'}
+        update_kwargs = self._update_expression({p: expense[p] for p in changed})
+        update_kwargs['ExpressionAttributeValues'][':id'] = expense['id']
         try:
-            previous_exp = self.expenses_table.put_item(
-                Item=self.converter.convertToDbFormat({'user_uid': user_uid, **expense}),
+            previous_exp = self.expenses_table.update_item(
+                Key={self.HASH_KEY: user_uid, self.RANGE_KEY: expense[self.RANGE_KEY]},
                 ReturnValues="ALL_OLD",
-                # only replace if the item in the db and the updated item have the same id
-                ConditionExpression=Attr('id').eq(expense['id'])
+                # only update if the item in the db and the updated item have the same id. also, the item must exist
+                ConditionExpression="id = :id",
+                **update_kwargs
             )
+            return previous_exp.get('Attributes')
         except Exception as ex:
             if "ConditionalCheckFailedException" in str(ex):
                 raise NoExpenseWithThisId \
@@ -478,30 +1171,260 @@ class __DbFacade(object):
             else:
                 raise ex
 
+    def _update_expression(self, changes):
+        """
+        :param changes: dict. property name -> the new value
+        :return: dict with the UpdateExpression, ExpressionAttributeNames and ExpressionAttributeValues kwargs of
+        UpdateItem. the empty `name` and `tags` are removed, as they aren't stored (see ExpenseConverter)
+        """
+        sets, removes, names, values = [], [], {}, {}
+        for i, (property_name, value) in enumerate(sorted(changes.items())):
+            attr_name = attr_name_placeholders[property_name]
+            if attr_name.startswith('#'):
+                names[attr_name] = property_name
+            if property_name in ('name', 'tags') and not value:
+                removes.append(attr_name)
+                continue
+            if type(value) in [int, float]:
+                value = self.converter.convertNumberToDbFormat(str(value))
+            values[':v%i' % i] = value
+            sets.append('%s = :v%i' % (attr_name, i))
+
+        expression = []
+        if sets:
+            expression.append("SET " + ", ".join(sets))
+        if removes:
+            expression.append("REMOVE " + ", ".join(removes))
+        update_kwargs = {"UpdateExpression": " ".join(expression), "ExpressionAttributeValues": values}
+        if names:
+            update_kwargs['ExpressionAttributeNames'] = names
+        return update_kwargs
+
     def _two_phase_update(self, expense, old_expense, user_uid):
         """
         This is only needed if the change in the newly update expense was to a property that we use as a SORT key
-        in the main index
+        in the main index. the updated expense is put and the old one is deleted in a single TransactWriteItems, so
+        there's never a moment with both or neither of them at rest.
+
+        a transaction can't return the deleted item, which the rollups need. so the delete is conditional also on the
+        `amount`, `currency` and `timestamp_utc_updated` at rest being those of `old_expense`. if they aren't, they are
+        read and the transaction is retried with them. the change log entry is written in the same transaction.
         :param expense:
         :param old_expense:
         :param user_uid:
-        :return:
+        :return: the deleted old item, as it was at rest (its `timestamp_utc`, `currency` and `amount`)
+
+        :raises ItemWithSameRangeKeyExists - there's another expense with the `timestamp_utc` of `expense`
+        :raises NoExpenseWithThisId - there's no expense at rest with the `timestamp_utc` and `id` of `old_expense`
+        """
+        old_key = {self.HASH_KEY: user_uid, self.RANGE_KEY: old_expense[self.RANGE_KEY]}
+        new_item = self.converter.convertToDbFormat({**expense, self.HASH_KEY: user_uid})
+        at_rest = {self.RANGE_KEY: old_expense[self.RANGE_KEY], 'currency': old_expense['currency'],
+                   'amount': self.converter.convertNumberToDbFormat(str(old_expense['amount'])),
+                   'timestamp_utc_updated': old_expense['timestamp_utc_updated']}
+
+        for _ in exponential_backoff(max_retries=MAX_TRANSACTION_ATTEMPTS - 1, time_budget=current_budget()):
+            condition_values = {":id": expense['id'], ":currency": at_rest['currency'], ":amount": at_rest['amount'],
+                                ":updated": at_rest['timestamp_utc_updated']}
+            reasons = self._transact([
+                {"Put": {"TableName": self.EXPENSES_TABLE_NAME, "Item": serialize_item(new_item),
+                         "ConditionExpression": "attribute_not_exists(%s)" % self.RANGE_KEY}},
+                {"Delete": {"TableName": self.EXPENSES_TABLE_NAME, "Key": serialize_item(old_key),
+                            "ConditionExpression": "id = :id AND currency = :currency AND amount = :amount "
+                                                   "AND timestamp_utc_updated = :updated",
+                            "ExpressionAttributeValues": serialize_item(condition_values)}},
+            ] + self._change_log_operations(user_uid, ChangeOperation.update, new_item)
+                + self._rollup_operations(user_uid, added=new_item, removed=at_rest))
+            if reasons is None:
+                return at_rest
+            put_reason, delete_reason = reasons[:2]
+
+            if delete_reason == 'ConditionalCheckFailed':
+                current = self.expenses_table.get_item(Key=old_key, ConsistentRead=True).get('Item')
+                if not current or current['id'] != expense['id']:
+                    raise NoExpenseWithThisId("no expense at rest found to update or the id of the expense at rest "
+                                              "is not the same.")
+                at_rest = {self.RANGE_KEY: current[self.RANGE_KEY], 'currency': current['currency'],
+                           'amount': current['amount'], 'timestamp_utc_updated': current['timestamp_utc_updated']}
+            if put_reason == 'ConditionalCheckFailed':
+                raise ItemWithSameRangeKeyExists("Item with RANGE key %s already exists" % expense[self.RANGE_KEY])
+            # else - the expense at rest was different, or the transaction conflicted with another one
+
+        raise DynamodbThroughputExhausted("The update couldn't be written")
+
+    def _change_log_companions(self, user_uid, operation, items):
+        """
+        allocates the sequence numbers of the changes. call it only after the expenses at rest, to which the changes
+        are made, have been read - see _transact_update()
+        :param operation: ChangeOperation
+        :param items: the expenses in db format, as they are after the changes
+        :return: None if the change log is disabled, otherwise a list with the TransactItems entries, which write
+        the change log entry of each item. see transact_write()
+        """
+        if not self.changelog or not items:
+            return None
+        first_seq = self.changelog.allocate(user_uid, len(items))
+        return [[self.changelog.put_operation(user_uid, first_seq + i, operation, item)]
+                for i, item in enumerate(items)]
+
+    def _change_log_operations(self, user_uid, operation, item):
+        """
+        like _change_log_companions(), for a single change
+        :return: list with the TransactItems entry of the change log entry. empty if the change log is disabled
+        """
+        return (self._change_log_companions(user_uid, operation, [item]) or [[]])[0]
 
-        :raises see _facade_put_item
+    def _transact(self, transact_items):
+        """
+        :param transact_items: TransactItems entries (serialized)
+        :return: None if the transaction was written, otherwise a list with the cancellation reason code of each entry
+        """
+        try:
+            self.raw_client.transact_write_items(TransactItems=transact_items)
+            return None
+        except ClientError as err:
+            if err.response['Error']['Code'] != 'TransactionCanceledException':
+                raise
+            return [r.get('Code') for r in err.response.get('CancellationReasons', [])] or [None] * len(transact_items)
+
+    def _transact_persist(self, expense, user_uid):
         """
+        like _facade_put_item(), but the expense is written together with its change log entry, in a transaction
+        :return: the expense, as it was persisted
+        :raises ItemWithSameRangeKeyExists
+        :raises PersistFailed
+        :raises DynamodbThroughputExhausted - if it couldn't be written in MAX_TRANSACTION_ATTEMPTS
+        """
+        if expense['id']:
+            raise RuntimeError('dangerous operation. cannot add id to an expense which already has id')
+        if expense.get(self.RANGE_KEY) is None:
+            raise PersistFailed("One of the required keys was not given a value: %s" % self.RANGE_KEY)
+        exp = {**expense, 'id': str(uuid.uuid4()), self.HASH_KEY: user_uid}
+        item = self.converter.convertToDbFormat(exp)
+        put = {"Put": {"TableName": self.EXPENSES_TABLE_NAME, "Item": serialize_item(item),
+                       "ConditionExpression": "attribute_not_exists(%s)" % self.RANGE_KEY}}
+        for _ in exponential_backoff(max_retries=MAX_TRANSACTION_ATTEMPTS - 1, time_budget=current_budget()):
+            reasons = self._transact([put] + self._change_log_operations(user_uid, ChangeOperation.persist, item)
+                                     + self._rollup_operations(user_uid, added=item))
+            if reasons is None:
+                return exp
+            if reasons[0] == 'ConditionalCheckFailed':
+                raise ItemWithSameRangeKeyExists("Item with RANGE key %s already exists" % exp[self.RANGE_KEY])
+        raise DynamodbThroughputExhausted("The expense couldn't be written")
 
-        # delete the old expense and put the updated one in a single batch
-        # it's fine because they have different sort keys
+    def _transact_update(self, expense_id, timestamp_utc, changes, user_uid, expected_timestamp_utc_updated=None):
+        """
+        reads the expense at rest and then updates (UpdateItem) the changed properties, together with the change log
+        entry, in a transaction - only if the expense at rest hasn't changed since it was read. otherwise, it is read
+        again. so the sequence number of the change is larger than that of any change made before it, and the entry
+        has the expense exactly as it is after the change.
+        :param changes: dict. property name -> the new value. `timestamp_utc_updated` included
+        :param expected_timestamp_utc_updated: if set, the expense is updated only if it's its `timestamp_utc_updated`
+        :return: tuple (the item as it was at rest before the update, the expense after it)
+        :raises NoExpenseWithThisId
+        :raises ExpenseChangedConcurrently - only if `expected_timestamp_utc_updated` is set
+        :raises DynamodbThroughputExhausted - if it couldn't be written in MAX_TRANSACTION_ATTEMPTS
+        """
+        key = {self.HASH_KEY: user_uid, self.RANGE_KEY: timestamp_utc}
+        for _ in exponential_backoff(max_retries=MAX_TRANSACTION_ATTEMPTS - 1, time_budget=current_budget()):
+            at_rest = self._read_at_rest(key, expense_id)
+            if expected_timestamp_utc_updated is not None and \
+                    at_rest['timestamp_utc_updated'] != expected_timestamp_utc_updated:
+                raise ExpenseChangedConcurrently("The expense was updated at %s" % at_rest['timestamp_utc_updated'])
+
+            updated = {**self.converter.convertFromDbFormat(at_rest), **changes}
+            update_kwargs = self._update_expression(changes)
+            values = {**update_kwargs.pop('ExpressionAttributeValues'),
+                      ":id": expense_id, ":updated": at_rest['timestamp_utc_updated']}
+            update = {"Update": {"TableName": self.EXPENSES_TABLE_NAME, "Key": serialize_item(key),
+                                 "ConditionExpression": "id = :id AND timestamp_utc_updated = :updated",
+                                 "ExpressionAttributeValues": serialize_item(values), **update_kwargs}}
+            log = self._change_log_operations(user_uid, ChangeOperation.update,
+                                              self.converter.convertToDbFormat(updated))
+            rollups = self._rollup_operations(user_uid, added=updated, removed=at_rest)
+            if self._transact([update] + log + rollups) is None:
+                return at_rest, updated
+        raise DynamodbThroughputExhausted("The update couldn't be written")
+
+    def _transact_remove(self, expense, user_uid):
+        """
+        like _transact_update(), but deletes the expense
+        :param expense: with (at least) the `id` and `timestamp_utc` of the expense
+        :return: the removed item, as it was at rest
+        :raises NoExpenseWithThisId
+        :raises DynamodbThroughputExhausted - if it couldn't be removed in MAX_TRANSACTION_ATTEMPTS
+        """
+        key = {self.HASH_KEY: user_uid, self.RANGE_KEY: expense[self.RANGE_KEY]}
+        for _ in exponential_backoff(max_retries=MAX_TRANSACTION_ATTEMPTS - 1, time_budget=current_budget()):
+            at_rest = self._read_at_rest(key, expense['id'])
+            delete = {"Delete": {"TableName": self.EXPENSES_TABLE_NAME, "Key": serialize_item(key),
+                                 "ConditionExpression": "id = :id AND timestamp_utc_updated = :updated",
+                                 "ExpressionAttributeValues": serialize_item({
+                                     ":id": expense['id'], ":updated": at_rest['timestamp_utc_updated']})}}
+            log = self._change_log_operations(user_uid, ChangeOperation.remove, at_rest)
+            if self._transact([delete] + log + self._rollup_operations(user_uid, removed=at_rest)) is None:
+                return at_rest
+        raise DynamodbThroughputExhausted("The expense couldn't be removed")
+
+    def _read_at_rest(self, key, expense_id):
+        """
+        :return: the item with the key, read consistently
+        :raises NoExpenseWithThisId - if there's no such item, or it has a different `id`
+        """
+        at_rest = self.expenses_table.get_item(Key=key, ConsistentRead=True).get('Item')
+        if not at_rest or at_rest['id'] != expense_id:
+            raise NoExpenseWithThisId("no expense at rest found or the id of the expense at rest is not the same")
+        return at_rest
 
-        updated = self._facade_put_item(context=self.expenses_table, expense=expense, user_uid=user_uid, add_id=False)
+    def rebuild_rollups(self, user_uid, days):
+        """
+        recomputes the statistics rollups of the days from the expenses at rest. see StatisticsRollups.rebuild_day()
+        :param days: iterable of 'YYYY-MM-DD'
+        :return: list of the days, which couldn't be rebuilt because their expenses kept changing
+        :raises RuntimeError - if the rollups are disabled
+        """
+        if not self.rollups:
+            raise RuntimeError("The statistics rollups are disabled")
+        return [day for day in days if not self.rollups.rebuild_day(user_uid, day, self._expenses_of_day)]
 
-        # wouldn't delete the old expense if the put_item above raised an exception (ItemWithSameRangeKeyExists)
-        self.expenses_table.delete_item(Key={
+    def _expenses_of_day(self, user_uid, day):
+        """
+        :param day: 'YYYY-MM-DD'
+        :return: generator of the `currency` and `amount` of the expenses of the user in the UTC day, read consistently
+        """
+        query_kwargs = {
+            "KeyConditionExpression": Key(self.HASH_KEY).eq(user_uid) & Key(self.RANGE_KEY).begins_with(day),
+            "ProjectionExpression": "currency, amount",
+            "ConsistentRead": True
+        }
+        while True:
+            response = self.expenses_table.query(**query_kwargs)
+            yield from response['Items']
+            if 'LastEvaluatedKey' not in response:
+                return
+            query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    def _rollup_operations(self, user_uid, added=None, removed=None):
+        """
+        :param added: the expense as it is at rest after the change. None if it was removed
+        :param removed: the expense as it was at rest before the change. None if it was added
+        :return: list with the TransactItems entries, which update the statistics rollups with the change. empty if
+        the rollups are disabled
+        """
+        if not self.rollups:
+            return []
+        return self.rollups.update_operations(user_uid, merge_deltas(deltas_for(added), deltas_for(removed, sign=-1)))
 
-            'user_uid': user_uid,
-            'timestamp_utc': old_expense['timestamp_utc']
-        })
-        return updated
+    def _shared_rollup_operations(self, user_uid, items, sign=1):
+        """
+        :param items: the expenses (db format), which are added - or removed, if `sign` is -1
+        :return: None if the rollups are disabled, otherwise the `shared` function for transact_write(), which updates
+        the rollups with the items written in the transaction
+        """
+        if not self.rollups:
+            return None
+        return lambda indexes: self.rollups.update_operations(
+            user_uid, merge_deltas(*[deltas_for(items[i], sign=sign) for i in indexes]))
 
     def _facade_put_item(self, context, expense, user_uid, add_id=True):
         """
@@ -536,7 +1459,8 @@ class __DbFacade(object):
         except Exception as ex:
             if "ConditionalCheckFailedException" in str(ex):
                 raise ItemWithSameRangeKeyExists("Item with RANGE key %s already exists" % exp[self.RANGE_KEY])
-            elif "One of the required keys was not given a value" in str(ex):
+            elif "One of the required keys was not given a value" in str(ex) or "Missing the key" in str(ex):
+                # the message of dynamodb local | of dynamodb
                 raise PersistFailed(str(ex))
             else:
                 raise ex
@@ -572,6 +1496,45 @@ class DynamodbThroughputExhausted(Exception):
         super(DynamodbThroughputExhausted, self).__init__(*args)
 
 
+class ExpenseChangedConcurrently(Exception):
+    """
+    the expense at rest was updated after the client has read it
+    """
+
+    def __init__(self, *args):
+        super(ExpenseChangedConcurrently, self).__init__(*args)
+
+
+class QueryPageBudgetExhausted(Exception):
+    """
+    Raised when an operation needs to read more pages of query results than it is allowed to
+    """
+
+    def __init__(self, *args):
+        super(QueryPageBudgetExhausted, self).__init__(*args)
+
+
+class PageBudget(object):
+    """
+    the number of query pages (each up to 1MB) an operation is allowed to read, to keep it within MAX_EXECUTION_TIME
+    """
+
+    def __init__(self, max_pages=None):
+        """
+        :param max_pages: int | None. None means unlimited
+        """
+        self.max_pages = max_pages
+        self.spent = 0
+
+    def spend(self):
+        """
+        :raises QueryPageBudgetExhausted if all pages have already been spent
+        """
+        if self.max_pages is not None and self.spent >= self.max_pages:
+            raise QueryPageBudgetExhausted("Exceeded the budget of %i pages" % self.max_pages)
+        self.spent += 1
+
+
 class ItemWithSameRangeKeyExists(Exception):
     def __init__(self, *args):
         super(ItemWithSameRangeKeyExists, self).__init__(*args)
@@ -0,0 +1,84 @@
+import time
+from threading import Lock
+
+from botocore.exceptions import ClientError, BotoCoreError
+
+"""
+health of the expenses table, via a single DescribeTable request (unlike ListTables, it doesn't depend on the number
+of tables in the account). the result is cached for a while, so that frequent health checks don't exhaust the
+throttling budget of the control-plane API.
+"""
+
+
+class TableStatus:
+    # https://docs.aws.amazon.com/amazondynamodb/latest/APIReference/API_TableDescription.html
+    active = 'ACTIVE'
+    updating = 'UPDATING'
+    # not statuses of dynamodb - the table doesn't exist or the request failed
+    missing = 'MISSING'
+    unreachable = 'UNREACHABLE'
+
+    # the table can serve requests
+    ready = (active, updating)
+
+
+class TableHealthCheck(object):
+
+    def __init__(self, ttl_seconds=30, clock=time.monotonic):
+        """
+        :param ttl_seconds: for how long a result is reused
+        :param clock: function returning seconds. used to expire the cached result
+        """
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._lock = Lock()
+        self._cached = None  # (table name, result, time of the check)
+
+    def check(self, client, table_name, force=False):
+        """
+        :param client: boto3 dynamodb client
+        :param table_name:
+        :param force: if True, the cached result is ignored
+        :return: dict. {"table": str, "status": str (see TableStatus), "ready": bool, "item_count": int | None,
+        "provisioned_capacity": {"read": int, "write": int} | None, "age_seconds": how long ago the check was made,
+        "error": str | None}
+        """
+        with self._lock:
+            now = self._clock()
+            if force or not self._is_fresh(table_name, now):
+                self._cached = (table_name, self._describe(client, table_name), now)
+            _, result, checked_at = self._cached
+            return {**result, "age_seconds": round(now - checked_at, 3)}
+
+    def invalidate(self):
+        with self._lock:
+            self._cached = None
+
+    def _is_fresh(self, table_name, now):
+        return self._cached is not None and self._cached[0] == table_name and \
+               now - self._cached[2] < self.ttl_seconds
+
+    @staticmethod
+    def _describe(client, table_name):
+        result = {"table": table_name, "status": None, "ready": False, "item_count": None,
+                  "provisioned_capacity": None, "error": None}
+        try:
+            table = client.describe_table(TableName=table_name)['Table']
+        except ClientError as err:
+            missing = err.response.get('Error', {}).get('Code') == 'ResourceNotFoundException'
+            result.update(status=TableStatus.missing if missing else TableStatus.unreachable, error=str(err))
+            return result
+        except BotoCoreError as err:  # e.g. the endpoint can't be reached
+            result.update(status=TableStatus.unreachable, error=str(err))
+            return result
+
+        throughput = table.get('ProvisionedThroughput', {})
+        result.update(
+            status=table['TableStatus'],
+            ready=table['TableStatus'] in TableStatus.ready,
+            # updated by dynamodb approximately every six hours
+            item_count=table.get('ItemCount'),
+            provisioned_capacity={"read": throughput.get('ReadCapacityUnits'),
+                                  "write": throughput.get('WriteCapacityUnits')}
+        )
+        return result
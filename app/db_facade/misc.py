@@ -11,3 +11,22 @@ class OrderingDirection(Enum):
             return True
         else:
             return candidate in [ord.name for ord in OrderingDirection]
+
+
+class SyncLookup(Enum):
+    """
+    how sync() finds the expenses at rest.
+    query - reads the newest expenses of the user. finds expenses the client doesn't have, but not older than the
+    newest `max_sync_request_size` expenses
+    batch_get - reads exactly the expenses which the client has, by their primary keys. can't find expenses
+    the client doesn't have
+    """
+    query = 'query'
+    batch_get = 'batch_get'
+
+    @classmethod
+    def is_member(cls, candidate: str):
+        if type(candidate) == SyncLookup:
+            return True
+        else:
+            return candidate in [lookup.name for lookup in SyncLookup]
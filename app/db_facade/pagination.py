@@ -0,0 +1,57 @@
+from itsdangerous import URLSafeSerializer, BadSignature
+
+"""
+opaque continuation tokens for paging through query results.
+a token wraps the `LastEvaluatedKey` of a dynamodb query, together with the parameters of the query that produced it,
+signs it and base64 encodes it. when received back from a client, the token is verified and the key can be used as
+`ExclusiveStartKey` of the next query, without re-seeking via a key condition.
+"""
+
+_salt = 'expenses-continuation-token'
+
+
+class ContinuationTokenSerializer(object):
+
+    def __init__(self, secret_key):
+        self._serializer = URLSafeSerializer(secret_key, salt=_salt)
+
+    def dumps(self, last_evaluated_key, user_uid, property_name, ordering_direction):
+        """
+        :param last_evaluated_key: the LastEvaluatedKey of a query. if None, there's no next page and None is returned
+        :param user_uid: the owner of the paged items
+        :param property_name: the property, via which the items are ordered
+        :param ordering_direction: OrderingDirection instance
+        :return: str | None
+        """
+        if not last_evaluated_key:
+            return None
+        return self._serializer.dumps({
+            "key": last_evaluated_key,
+            "user_uid": user_uid,
+            "property": property_name,
+            "ordering": ordering_direction.name
+        })
+
+    def loads(self, token, user_uid, property_name, ordering_direction):
+        """
+        :param token: a token created via dumps()
+        :return: the LastEvaluatedKey, ready to be used as ExclusiveStartKey
+        :raises InvalidContinuationToken - if the token is malformed, has been tampered with or was issued
+        for a different user/query
+        """
+        try:
+            payload = self._serializer.loads(token)
+        except BadSignature:
+            raise InvalidContinuationToken("The continuation token is malformed")
+
+        if payload.get('user_uid') != user_uid or payload['key'].get('user_uid') != user_uid:
+            raise InvalidContinuationToken("The continuation token was issued for another user")
+        if payload.get('property') != property_name or payload.get('ordering') != ordering_direction.name:
+            raise InvalidContinuationToken("The continuation token was issued for a different query")
+
+        return payload['key']
+
+
+class InvalidContinuationToken(Exception):
+    def __init__(self, *args):
+        super(InvalidContinuationToken, self).__init__(*args)
@@ -0,0 +1,174 @@
+from collections import defaultdict
+from datetime import timezone
+from decimal import Decimal
+
+from boto3.dynamodb.conditions import Key, Attr
+from botocore.exceptions import ClientError
+
+from app.db_facade.dynamodb.batch import serialize_item
+from app.helpers.time import dt_from_utc_iso_str
+from app.helpers.utils import exponential_backoff
+
+"""
+pre-aggregated statistics. for each user and each UTC day, an item holds the sum and the count of the expenses
+of the user in each currency, as the attributes sum_<currency> and count_<currency>. e.g.
+{"user_uid": "...", "day": "2018-01-31", "sum_EUR": 12.5, "count_EUR": 2, "sum_USD": 3, "count_USD": 1}
+
+the items are maintained via atomic ADD updates, written in the same transaction as the change to the expenses (see
+update_operations()) - so concurrent changes don't lose updates, and a change is never applied to the expenses but not
+to the rollups. each ADD also increments the `version` of the item, so that rebuild_day() can tell whether the item
+changed since it was read.
+"""
+
+SUM_PREFIX = 'sum_'
+COUNT_PREFIX = 'count_'
+VERSION = 'version'
+# how many times rebuild_day() retries, if the expenses of the day change while it recomputes their rollup
+MAX_REBUILD_RETRIES = 5
+
+
+def day_of(timestamp):
+    """
+    :param timestamp: iso8601 str
+    :return: the UTC day of the timestamp. 'YYYY-MM-DD'
+    """
+    if timestamp[-1:] == 'Z' and timestamp[10:11] == 'T':
+        # the format in which the timestamps are stored, e.g. "2018-01-04T22:44:30.652Z". no need to parse it
+        return timestamp[:10]
+    return dt_from_utc_iso_str(timestamp).astimezone(timezone.utc).date().isoformat()
+
+
+def deltas_for(expense, sign=1):
+    """
+    :param expense: dict with at least `timestamp_utc`, `currency` and `amount`. could be None
+    :param sign: 1 if the expense is added, -1 if it is removed
+    :return: dict. (day, currency) -> (amount delta, count delta)
+    """
+    if not expense:
+        return {}
+    return {(day_of(expense['timestamp_utc']), expense['currency']): (sign * Decimal(str(expense['amount'])), sign)}
+
+
+def merge_deltas(*deltas):
+    merged = defaultdict(lambda: (Decimal(0), 0))
+    for delta in deltas:
+        for key, (amount, count) in delta.items():
+            merged_amount, merged_count = merged[key]
+            merged[key] = (merged_amount + amount, merged_count + count)
+    # e.g. updating only the name of an expense doesn't change the rollups
+    return {key: value for key, value in merged.items() if value != (0, 0)}
+
+
+class StatisticsRollups(object):
+    HASH_KEY = 'user_uid'
+    RANGE_KEY = 'day'
+
+    def __init__(self, table):
+        """
+        :param table: boto3 Table resource of the rollups table
+        """
+        self.table = table
+
+    def update_operations(self, user_uid, deltas):
+        """
+        :param deltas: see deltas_for() and merge_deltas()
+        :return: list with a TransactItems entry (serialized) per day, which ADDs the deltas of the day. to be
+        written in the same transaction as the change to the expenses
+        """
+        by_day = defaultdict(dict)
+        for (day, currency), delta in deltas.items():
+            by_day[day][currency] = delta
+
+        operations = []
+        for day, currencies in sorted(by_day.items()):
+            names, values, additions = {'#v': VERSION}, {':one': 1}, ['#v :one']
+            for i, (currency, (amount, count)) in enumerate(currencies.items()):
+                names['#s%i' % i] = SUM_PREFIX + currency
+                names['#c%i' % i] = COUNT_PREFIX + currency
+                values[':s%i' % i] = amount
+                values[':c%i' % i] = count
+                additions.append('#s{0} :s{0}, #c{0} :c{0}'.format(i))
+
+            operations.append({"Update": {
+                "TableName": self.table.name,
+                "Key": serialize_item({self.HASH_KEY: user_uid, self.RANGE_KEY: day}),
+                "UpdateExpression": "ADD " + ", ".join(additions),
+                "ExpressionAttributeNames": names,
+                "ExpressionAttributeValues": serialize_item(values)
+            }})
+        return operations
+
+    def read(self, user_uid, from_day, to_day):
+        """
+        :param from_day: 'YYYY-MM-DD', inclusive
+        :param to_day: 'YYYY-MM-DD', inclusive
+        :return: generator of (day, currency, sum, count) tuples, for the currencies with at least one expense
+        """
+        query_kwargs = {
+            "KeyConditionExpression": Key(self.HASH_KEY).eq(user_uid) & Key(self.RANGE_KEY).between(from_day, to_day),
+            "ConsistentRead": False,
+        }
+        while True:
+            response = self.table.query(**query_kwargs)
+            for item in response['Items']:
+                for attr, value in item.items():
+                    if not attr.startswith(SUM_PREFIX):
+                        continue
+                    currency = attr[len(SUM_PREFIX):]
+                    count = int(item.get(COUNT_PREFIX + currency, 0))
+                    if count:
+                        yield item[self.RANGE_KEY], currency, value, count
+
+            if 'LastEvaluatedKey' not in response:
+                return
+            query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    def days(self, user_uid):
+        """
+        :return: generator of the days, for which the user has a rollup
+        """
+        query_kwargs = {
+            "KeyConditionExpression": Key(self.HASH_KEY).eq(user_uid),
+            "ProjectionExpression": "#d",
+            "ExpressionAttributeNames": {"#d": self.RANGE_KEY}
+        }
+        while True:
+            response = self.table.query(**query_kwargs)
+            for item in response['Items']:
+                yield item[self.RANGE_KEY]
+            if 'LastEvaluatedKey' not in response:
+                return
+            query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    def rebuild_day(self, user_uid, day, expenses_of_day):
+        """
+        overwrites the rollup of the day with the sums of the expenses of the day at rest - deletes it, if there are
+        none. used to backfill the rollups. safe while the expenses change: the rollup is read before the expenses,
+        and it's overwritten only if its `version` is still the same - i.e. no change to the expenses of the day was
+        written in between. otherwise, both are read again.
+        :param expenses_of_day: function(user_uid, day) -> iterable of the expenses (at least their `currency` and
+        `amount`) at rest on the day, read consistently
+        :return: True if the rollup was rebuilt, False if the expenses kept changing
+        """
+        key = {self.HASH_KEY: user_uid, self.RANGE_KEY: day}
+        for _ in exponential_backoff(max_retries=MAX_REBUILD_RETRIES):
+            version = self.table.get_item(Key=key, ConsistentRead=True).get('Item', {}).get(VERSION)
+            condition = Attr(VERSION).not_exists() if version is None else Attr(VERSION).eq(version)
+
+            expenses = expenses_of_day(user_uid, day)
+            deltas = merge_deltas(*[deltas_for({**exp, 'timestamp_utc': day}) for exp in expenses])
+            attributes = {}
+            for (_, currency), (amount, count) in deltas.items():
+                attributes[SUM_PREFIX + currency] = amount
+                attributes[COUNT_PREFIX + currency] = count
+            try:
+                if attributes:
+                    self.table.put_item(Item={**key, **attributes, VERSION: version or 0},
+                                        ConditionExpression=condition)
+                else:
+                    self.table.delete_item(Key=key, ConditionExpression=condition)
+                return True
+            except ClientError as err:
+                if err.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    raise
+        return False
@@ -53,14 +53,83 @@ dynamodb_users_table_init_information = {
     ],
     "ProvisionedThroughput": {"ReadCapacityUnits": 25, "WriteCapacityUnits": 25}
 }
+changelog_table_init_information = {
+    "KeySchema": [
+        {
+            'AttributeName': hash_key,
+            'KeyType': 'HASH'
+        },
+        {
+            'AttributeName': 'seq',
+            'KeyType': 'RANGE'
+        }
+    ],
+    "AttributeDefinitions": [
+        {
+            'AttributeName': hash_key,
+            'AttributeType': 'S'
+        },
+        {
+            'AttributeName': 'seq',
+            'AttributeType': 'N'
+        },
+    ],
+    "ProvisionedThroughput": {"ReadCapacityUnits": 10, "WriteCapacityUnits": 25}
+}
+
+rollups_table_init_information = {
+    "KeySchema": [
+        {
+            'AttributeName': hash_key,
+            'KeyType': 'HASH'
+        },
+        {
+            'AttributeName': 'day',
+            'KeyType': 'RANGE'
+        }
+    ],
+    "AttributeDefinitions": [
+        {
+            'AttributeName': hash_key,
+            'AttributeType': 'S'
+        },
+        {
+            'AttributeName': 'day',
+            'AttributeType': 'S'
+        },
+    ],
+    "ProvisionedThroughput": {"ReadCapacityUnits": 10, "WriteCapacityUnits": 25}
+}
+
+
+def _range_key_of(key_schema):
+    return [k['AttributeName'] for k in key_schema if k['KeyType'] == 'RANGE'][0]
+
+
+def _build_query_plans(table_information):
+    """
+    for each property that can be used as a RANGE key in a query, find the index in which it is the RANGE key.
+    :param table_information: the kwargs used to create the table (see dynamodb_users_table_init_information)
+    :return: dict. property name -> {"IndexName": <str | None>}
+    """
+    plans = {
+        _range_key_of(table_information['KeySchema']): {
+            "IndexName": None,  # use main table
+        }
+    }
+    for index in table_information.get("LocalSecondaryIndexes", []):
+        plans[_range_key_of(index['KeySchema'])] = {
+            "IndexName": index['IndexName'],
+        }
+    return plans
+
+
+# against each property is how to query the table, if the property is to be used as a RANGE key.
+query_plan_for_property = _build_query_plans(dynamodb_users_table_init_information)
 
 # against each property is the name of the LSI, in which the property acts as a RANGE key.
 # there's one entry with value None - that's the RANGE property of the base table
-index_for_property = {
-    range_key: None,  # use main table
-    'timestamp_utc_created': timestamp_utc_created_lsi,
-    'id': id_lsi
-}  # TODO extract this from dynamodb_users_table_init_information
+index_for_property = {prop: plan['IndexName'] for prop, plan in query_plan_for_property.items()}
 
 assert len([o for o in index_for_property.values() if
             o is None]) == 1, "There must be one and only one property with value None. " \
@@ -1,15 +1,28 @@
-from app.db_facade.misc import OrderingDirection
+from app.db_facade.aggregation import AGGREGATES, BUCKETS
+from app.db_facade.misc import OrderingDirection, SyncLookup
 
 
 class ApiError:
     MAXIMUM_TIME_WINDOW_EXCEEDED = "Maximum time window exceeded"
+    OUT_OF_TIME = "The request couldn't be served in time. Retry later"
+    TOO_MANY_EXPENSES_IN_WINDOW = "There are too many expenses in the time window to process them in time. Use a smaller window"
     EMPTY_REQUEST_BODY = "Empty request body"
     IDS_OF_EXPENSES_DONT_MATCH = "When updating, the `id` properties of both the updated expense and its previous state must be the same"
     INVALID_BATCH_SIZE = "Received an invalid batch_size. Must be >0 integer."
     BATCH_SIZE_EXCEEDED = "Serving this request would exceed the maximum size of the response, %i. "
     INVALID_QUERY_PARAMS = "Invalid URL query parameters"
+    INVALID_CONTINUATION_TOKEN = "Invalid continuation_token"
+    INVALID_SYNC_LOOKUP = "Invalid value for lookup. Allowed: [%s]" % ", ".join([l.name for l in SyncLookup])
+    INVALID_AGGREGATES = "Invalid value for aggregates. Comma-separated list of [%s]" % ", ".join(AGGREGATES)
+    INVALID_HOME_CURRENCY = "There's no exchange rate for the home_currency"
+    INVALID_BUCKET = "Invalid value for bucket. Allowed: [%s]" % ", ".join(BUCKETS)
+    INVALID_HIGH_WATER_MARK = "The `since` URL argument must be a non-negative integer"
     NO_EXPENSE_WITH_THIS_ID = "Can't find an expense with this id in this account"
     ID_PROPERTY_FORBIDDEN = "The id property MUST be null"
+    EXPENSE_WITH_SAME_TIMESTAMP_EXISTS = "There's already an expense with the same timestamp_utc"
+    OUT_OF_THROUGHPUT = "The database is out of throughput currently. Retry later"
+    EXPENSE_CHANGED_CONCURRENTLY = "The expense has been updated since `timestamp_utc_updated`. Read it again"
+    PROPERTY_NOT_PATCHABLE = "The property %s can't be patched"
     INVALID_EXPENSE = "The expense doesn't match the expected format"
     INVALID_ORDER_PARAM = "Invalid value for ordering direction. Allowed: [%s]" % ", ".join(
         [o.name for o in OrderingDirection])
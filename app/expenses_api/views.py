@@ -1,5 +1,3 @@
-import json
-
 from dateutil.parser import parse
 from flask import request, current_app, g
 from werkzeug.exceptions import abort
@@ -7,9 +5,14 @@ from werkzeug.exceptions import abort
 from app.api_utils.response import make_json_response, make_error_response
 from app.auth.firebase import FirebaseTokenValidator
 from app.db_facade import db_facade
-from app.db_facade.facade import MAX_BATCH_SIZE, NoExpenseWithThisId, DynamodbThroughputExhausted
-from app.db_facade.misc import OrderingDirection
+from app.db_facade.facade import MAX_BATCH_SIZE, NoExpenseWithThisId, DynamodbThroughputExhausted, \
+    InvalidContinuationToken, QueryPageBudgetExhausted, ItemWithSameRangeKeyExists, ExpenseChangedConcurrently, \
+    patchable_properties
+from app.db_facade.aggregation import AGGREGATES, BUCKETS
+from app.db_facade.misc import OrderingDirection, SyncLookup
 from app.expenses_api.api_error_msgs import ApiError
+from app.helpers.fx_rates import NoFxRate
+from app.helpers.time_budget import TimeBudgetExhausted
 from app.helpers.time import ensure_ts_str_ends_with_z
 from app.models.expense_validation import Validator
 from . import expenses_api
@@ -35,6 +38,13 @@ def needs_firebase_uid(f):
     return decorated
 
 
+@expenses_api.errorhandler(TimeBudgetExhausted)
+def out_of_time(err):
+    response = make_error_response(ApiError.OUT_OF_TIME, status_code=503)
+    response.headers['Retry-After'] = str(current_app.config['TIME_BUDGET_RETRY_AFTER'])
+    return response
+
+
 @expenses_api.route("/ping", methods=['GET'])
 def ping_expenses():
     return str('pong')
@@ -65,35 +75,42 @@ def get_expenses_list():
     ordering_direction = request.args.get("ordering_direction", default='desc')
     expense_id = request.args.get("start_from_id", default=None)
     batch_size = request.args.get('batch_size', type=int, default=10)
+    continuation_token = request.args.get('continuation_token', default=None)
 
     try:
         validate_get_expenses_list(property_name=property_name, property_value=property_value, expense_id=expense_id,
-                                   ordering_direction=ordering_direction, batch_size=batch_size)
+                                   ordering_direction=ordering_direction, batch_size=batch_size,
+                                   continuation_token=continuation_token)
     except AssertionError as ex:
         status_code = 400
         if ApiError.BATCH_SIZE_EXCEEDED in str(ex):
             status_code = 413
 
-        return make_json_response(json.dumps({
-            'error': "%s. %s" % (ApiError.INVALID_QUERY_PARAMS, str(ex))
-        }), status_code=status_code)
+        return make_error_response("%s. %s" % (ApiError.INVALID_QUERY_PARAMS, str(ex)), status_code=status_code)
 
     ordering_direction = OrderingDirection[ordering_direction]
 
-    response = db_facade.get_list(
-        property_value=property_value,
-        property_name=property_name,
-        ordering_direction=ordering_direction,
-        user_uid=user_uid,
-        batch_size=batch_size
-    )
-
-    return make_json_response(response)
+    try:
+        expenses, next_continuation_token = db_facade.get_list_page(
+            property_value=property_value,
+            property_name=property_name,
+            ordering_direction=ordering_direction,
+            user_uid=user_uid,
+            batch_size=batch_size,
+            continuation_token=continuation_token
+        )
+    except InvalidContinuationToken as err:
+        return make_error_response("%s. %s" % (ApiError.INVALID_CONTINUATION_TOKEN, str(err)), status_code=400)
+
+    response = make_json_response(expenses)
+    if next_continuation_token:
+        response.headers[current_app.config['CONTINUATION_TOKEN_HEADER_NAME']] = next_continuation_token
+    return response
 
 
 def validate_get_expenses_list(property_name, property_value,
                                expense_id, ordering_direction, batch_size,
-                               none_is_ok=True):
+                               continuation_token=None, none_is_ok=True):
     assert property_name in expense_schema['properties'].keys(), "%s is not a valid expense property" % property_name
 
     if property_value:
@@ -102,7 +119,7 @@ def validate_get_expenses_list(property_name, property_value,
 
     assert OrderingDirection.is_member(ordering_direction), ApiError.INVALID_ORDER_PARAM
 
-    if property_value:
+    if property_value and not continuation_token:
         assert expense_id, "If a property_value is set, the start_from_id is mandatory"
 
     assert batch_size < MAX_BATCH_SIZE, ApiError.BATCH_SIZE_EXCEEDED
@@ -120,7 +137,13 @@ def persist():
     except AssertionError as e:
 
         return make_error_response(str(e), status_code=400)
-    persisted = db_facade.persist(expense=expense, user_uid=user_uid)
+
+    try:
+        persisted = db_facade.persist(expense=expense, user_uid=user_uid)
+    except ItemWithSameRangeKeyExists:
+        return make_error_response(ApiError.EXPENSE_WITH_SAME_TIMESTAMP_EXISTS, status_code=409)
+    except DynamodbThroughputExhausted:
+        return make_error_response(ApiError.OUT_OF_THROUGHPUT, status_code=503)
 
     return make_json_response(persisted, status_code=200)
 
@@ -131,6 +154,44 @@ def validate_persist_request(expense):
     assert expense['id'] == None, ApiError.ID_PROPERTY_FORBIDDEN  # must be non
 
 
+@expenses_api.route('/persist_many', methods=['POST'])
+@needs_firebase_uid
+def persist_many():
+    user_uid = request.user_uid
+
+    expenses = request.get_json(force=True, silent=True)
+    try:
+        validate_persist_many_request(expenses)
+    except AssertionError as e:
+        return make_error_response(str(e), status_code=400)
+
+    results = [None] * len(expenses)
+    for i, err_msg in Validator.validate_many(expenses):
+        results[i] = {"status": 400, "error": "%s %s" % (ApiError.INVALID_EXPENSE, err_msg)}
+    for i, expense in enumerate(expenses):
+        if results[i] is None and expense['id'] is not None:
+            results[i] = {"status": 400, "error": ApiError.ID_PROPERTY_FORBIDDEN}
+
+    to_persist = [i for i, result in enumerate(results) if result is None]
+    persisted = db_facade.persist_many(expenses=[expenses[i] for i in to_persist], user_uid=user_uid)
+    for i, result in zip(to_persist, persisted):
+        if isinstance(result, ItemWithSameRangeKeyExists):
+            results[i] = {"status": 409, "error": ApiError.EXPENSE_WITH_SAME_TIMESTAMP_EXISTS}
+        elif isinstance(result, DynamodbThroughputExhausted):
+            results[i] = {"status": 503, "error": ApiError.OUT_OF_THROUGHPUT}
+        else:
+            results[i] = {"status": 200, "expense": result}
+
+    return make_json_response(results, status_code=200)
+
+
+def validate_persist_many_request(expenses):
+    assert expenses, ApiError.EMPTY_REQUEST_BODY
+    assert isinstance(expenses, list), 'expected a list of expenses as payload.'
+    max_size = current_app.config['MAX_PERSIST_MANY_SIZE']
+    assert len(expenses) <= max_size, ApiError.BATCH_SIZE_EXCEEDED % max_size
+
+
 @expenses_api.route('/update', methods=['PUT'])
 @needs_firebase_uid
 def update():
@@ -146,6 +207,10 @@ def update():
         return make_json_response(result)
     except NoExpenseWithThisId as err:
         return make_error_response(ApiError.NO_EXPENSE_WITH_THIS_ID, status_code=404)
+    except ItemWithSameRangeKeyExists as err:
+        return make_error_response(ApiError.EXPENSE_WITH_SAME_TIMESTAMP_EXISTS, status_code=409)
+    except DynamodbThroughputExhausted as err:
+        return make_error_response(ApiError.OUT_OF_THROUGHPUT, status_code=503)
     except ValueError as err:
         return make_error_response(ApiError.IDS_OF_EXPENSES_DONT_MATCH, status_code=400)
 
@@ -167,6 +232,49 @@ def validate_update_request(request_data):
     return True, None
 
 
+@expenses_api.route('/patch', methods=['PATCH'])
+@needs_firebase_uid
+def patch():
+    user_uid = request.user_uid
+
+    request_data = request.get_json(force=True, silent=True)
+    try:
+        validate_patch_request(request_data)
+    except AssertionError as err:
+        return make_error_response(str(err), status_code=400)
+
+    try:
+        result = db_facade.patch(expense_id=request_data['id'],
+                                 timestamp_utc=request_data['timestamp_utc'],
+                                 expected_timestamp_utc_updated=request_data['timestamp_utc_updated'],
+                                 changes=request_data['changes'],
+                                 user_uid=user_uid)
+        return make_json_response(result)
+    except NoExpenseWithThisId:
+        return make_error_response(ApiError.NO_EXPENSE_WITH_THIS_ID, status_code=404)
+    except ExpenseChangedConcurrently:
+        return make_error_response(ApiError.EXPENSE_CHANGED_CONCURRENTLY, status_code=409)
+    except DynamodbThroughputExhausted:
+        return make_error_response(ApiError.OUT_OF_THROUGHPUT, status_code=503)
+
+
+def validate_patch_request(request_data):
+    assert request_data, ApiError.EMPTY_REQUEST_BODY
+    assert isinstance(request_data, dict), 'expected an object as payload.'
+    assert request_data.get('id') and Validator.validate_property(request_data['id'], 'id'), \
+        ApiError.ID_PROPERTY_MANDATORY
+    for ts_property in ['timestamp_utc', 'timestamp_utc_updated']:
+        assert Validator.validate_property(request_data.get(ts_property), ts_property), \
+            "`%s` must be a valid timestamp" % ts_property
+
+    changes = request_data.get('changes')
+    assert isinstance(changes, dict) and changes, "`changes` must be a non-empty object"
+    for property_name, value in changes.items():
+        assert property_name in patchable_properties, ApiError.PROPERTY_NOT_PATCHABLE % property_name
+        assert Validator.validate_property(value, property_name), '%s is not a valid value for %s' % \
+                                                                  (str(value), property_name)
+
+
 @expenses_api.route('/remove', methods=['POST'])
 @needs_firebase_uid
 def remove():
@@ -180,9 +288,11 @@ def remove():
 
     try:
         db_facade.remove(expense=expense_to_delete, user_uid=user_uid)
-        return make_json_response('[]')
+        return make_json_response([])
     except NoExpenseWithThisId as ex:
         return make_error_response(ApiError.NO_EXPENSE_WITH_THIS_ID, status_code=404)
+    except DynamodbThroughputExhausted as err:
+        return make_error_response(ApiError.OUT_OF_THROUGHPUT, status_code=503)
 
 
 def validate_remove_request(request_data):
@@ -191,32 +301,98 @@ def validate_remove_request(request_data):
     assert 'id' in request_data and request_data['id'], ApiError.ID_PROPERTY_MANDATORY
 
 
+@expenses_api.route('/remove_many', methods=['POST'])
+@needs_firebase_uid
+def remove_many():
+    user_uid = request.user_uid
+
+    expenses = request.get_json(force=True, silent=True)
+    try:
+        validate_remove_many_request(expenses)
+    except AssertionError as err:
+        return make_error_response(str(err), status_code=400)
+
+    try:
+        return make_json_response(db_facade.remove_many(expenses=expenses, user_uid=user_uid))
+    except DynamodbThroughputExhausted as err:
+        return make_error_response(ApiError.OUT_OF_THROUGHPUT, status_code=503)
+
+
+def validate_remove_many_request(request_data):
+    assert request_data, ApiError.EMPTY_REQUEST_BODY
+    assert isinstance(request_data, list), 'expected a list of objects with `id` and `timestamp_utc` as payload.'
+    max_size = current_app.config['MAX_REMOVE_MANY_SIZE']
+    assert len(request_data) <= max_size, ApiError.BATCH_SIZE_EXCEEDED % max_size
+    for expense in request_data:
+        assert isinstance(expense, dict) and \
+            Validator.validate_property(expense.get('timestamp_utc'), 'timestamp_utc'), \
+            "the objects must have a valid `timestamp_utc`"
+        assert expense.get('id') and Validator.validate_property(expense['id'], 'id'), ApiError.ID_PROPERTY_MANDATORY
+
+
 @expenses_api.route('/sync', methods=['POST'])
 @needs_firebase_uid
 def sync():
     user_uid = request.user_uid
+    since = request.args.get('since', default=None)
+    if since is not None:
+        return sync_changes(since, user_uid)
+
     request_data = request.get_json(force=True, silent=True)
+    lookup = request.args.get('lookup', default=SyncLookup.query.name)
 
     try:
-        validate_sync_request(request_data)
+        validate_sync_request(request_data, lookup)
     except AssertionError as err:
         return make_error_response(str(err), status_code=400)
 
     try:
-        return make_json_response(db_facade.sync(sync_request_objs=request_data, user_uid=user_uid))
+        return make_json_response(db_facade.sync(sync_request_objs=request_data, user_uid=user_uid,
+                                                 lookup=SyncLookup[lookup]))
     except RuntimeError as err:
         return make_error_response("problem at the back end. mi scuzi.", status_code=500)
     except DynamodbThroughputExhausted as err:
-        return make_error_response("The API cannot server your request currently.", status_code=413)
+        return make_error_response(ApiError.OUT_OF_THROUGHPUT, status_code=503)
 
 
-def validate_sync_request(request_data):
+def sync_changes(since, user_uid):
+    try:
+        since = validate_sync_changes_request(since)
+    except AssertionError as err:
+        return make_error_response(str(err), status_code=400)
+
+    try:
+        changes = db_facade.sync_changes(since=since, user_uid=user_uid)
+        response = make_json_response(changes)
+        if changes['retry_after']:
+            response.headers['Retry-After'] = str(changes['retry_after'])
+        return response
+    except RuntimeError as err:
+        return make_error_response("problem at the back end. mi scuzi.", status_code=500)
+    except DynamodbThroughputExhausted as err:
+        return make_error_response(ApiError.OUT_OF_THROUGHPUT, status_code=503)
+
+
+def validate_sync_changes_request(since):
+    """
+    :param since: the raw value of the `since` url arg
+    :return: the high-water mark as int
+    """
+    # not isdigit() - it accepts e.g. superscripts, which int() doesn't
+    assert since.isdecimal(), ApiError.INVALID_HIGH_WATER_MARK
+    return int(since)
+
+
+def validate_sync_request(request_data, lookup=SyncLookup.query.name):
     assert isinstance(request_data, dict), 'expected an object as payload.'
-    assert len(request_data) <= db_facade.max_sync_request_size, \
-        ApiError.BATCH_SIZE_EXCEEDED % db_facade.max_sync_request_size
+    assert SyncLookup.is_member(lookup), ApiError.INVALID_SYNC_LOOKUP
+    max_size = db_facade.max_sync_verify_request_size if lookup == SyncLookup.batch_get.name \
+        else db_facade.max_sync_request_size
+    assert len(request_data) <= max_size, ApiError.BATCH_SIZE_EXCEEDED % max_size
     assert all(
-        [((expected_key in partial_expense.keys()) for expected_key in ['timestamp_utc', 'timestamp_utc_updated']) for
-         partial_expense in
+        [isinstance(partial_expense, dict) and
+         all((expected_key in partial_expense.keys()) for expected_key in ['timestamp_utc', 'timestamp_utc_updated'])
+         for partial_expense in
          request_data.values()]), "the values of the object must be objects with the `timestamp_utc_updated` and `timestamp_utc` keys"
 
 
@@ -230,9 +406,27 @@ def statistics(from_dt, to_dt):
     except ValueError:
         return make_error_response(ApiError.INVALID_QUERY_PARAMS, status_code=400)
 
+    aggregates = request.args.get('aggregates', default=None)
+    if aggregates is not None:
+        aggregates = aggregates.split(',')
+        if not all(a in AGGREGATES for a in aggregates):
+            return make_error_response(ApiError.INVALID_AGGREGATES, status_code=400)
+
+    bucket = request.args.get('bucket', default=None)
+    if bucket is not None and bucket not in BUCKETS:
+        return make_error_response(ApiError.INVALID_BUCKET, status_code=400)
+
+    home_currency = request.args.get('home_currency', default=None)
+
     from_dt = ensure_ts_str_ends_with_z(from_dt)
     to_dt = ensure_ts_str_ends_with_z(to_dt)
 
-    result = db_facade.statistics(from_dt=from_dt, to_dt=to_dt, user_uid=request.user_uid)
+    try:
+        result = db_facade.statistics(from_dt=from_dt, to_dt=to_dt, user_uid=request.user_uid, aggregates=aggregates,
+                                      bucket=bucket, home_currency=home_currency)
+    except NoFxRate:
+        return make_error_response(ApiError.INVALID_HOME_CURRENCY, status_code=400)
+    except QueryPageBudgetExhausted:
+        return make_error_response(ApiError.TOO_MANY_EXPENSES_IN_WINDOW, status_code=503)
 
     return make_json_response(result, 200)
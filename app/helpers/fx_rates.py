@@ -0,0 +1,109 @@
+import json
+import os
+from decimal import Decimal
+from threading import Lock
+
+from app.helpers.currencies import currencies
+
+"""
+a table of foreign exchange rates, used to normalise amounts in different currencies to a single (home) currency.
+the rates are read from a versioned JSON file
+{
+    "version": "2018-02-01",
+    "base": "EUR",
+    "rates": {"EUR": "1", "USD": "1.2457", ...}  # units of the currency for one unit of the base currency
+}
+which is loaded once per process. deploying a new file (i.e. changing its modification time) or calling
+invalidate_rate_table() makes the next get_rate_table() reload it.
+"""
+
+DEFAULT_RATES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fx_rates.json')
+
+# the position of each known currency in the rate arrays. fixed for the lifetime of the process
+CURRENCY_CODES = tuple(sorted(currencies))
+CURRENCY_INDEX = {code: i for i, code in enumerate(CURRENCY_CODES)}
+
+
+class FxRateTable(object):
+    __slots__ = ('version', 'base', '_rates')
+
+    def __init__(self, version, base, rates):
+        """
+        :param version: str. identifies the rates, e.g. the date on which they were published
+        :param base: the currency, relative to which the rates are given
+        :param rates: dict. currency -> units of the currency for one unit of the base currency
+        """
+        self.version = version
+        self.base = base
+        # rates[CURRENCY_INDEX[currency]]. None if there's no rate for the currency
+        self._rates = [None] * len(CURRENCY_CODES)
+        for currency, rate in rates.items():
+            if currency not in CURRENCY_INDEX:
+                raise ValueError("Unknown currency in the rate table: %s" % currency)
+            self._rates[CURRENCY_INDEX[currency]] = Decimal(str(rate))
+
+    def has_rate(self, currency):
+        i = CURRENCY_INDEX.get(currency)
+        return i is not None and self._rates[i] is not None
+
+    def normalise(self, totals, home_currency):
+        """
+        converts each of the totals to the home currency and sums them
+        :param totals: dict. currency -> Decimal amount
+        :param home_currency: str
+        :return: tuple (Decimal total in the home currency, sorted list of the currencies without a rate - their
+                 amounts are not included in the total)
+        :raises NoFxRate - if there's no rate for the home currency
+        """
+        if not self.has_rate(home_currency):
+            raise NoFxRate(home_currency)
+        rates, index = self._rates, CURRENCY_INDEX
+
+        total_in_base = Decimal(0)
+        unconverted = []
+        for currency, amount in totals.items():
+            i = index.get(currency)
+            rate = rates[i] if i is not None else None
+            if rate is None:
+                unconverted.append(currency)
+            else:
+                total_in_base += amount / rate
+        return total_in_base * rates[index[home_currency]], sorted(unconverted)
+
+
+def load_rate_table(path):
+    """
+    :param path: path to a rates JSON file. see the module docstring for the format
+    :return: FxRateTable
+    """
+    with open(path) as f:
+        data = json.load(f)
+    return FxRateTable(version=data['version'], base=data['base'], rates=data['rates'])
+
+
+_lock = Lock()
+_cached = {"path": None, "mtime": None, "table": None}
+
+
+def get_rate_table(path=DEFAULT_RATES_FILE):
+    """
+    :return: the FxRateTable of the file. loaded only on the first call and when the file has been modified since
+    """
+    mtime = os.stat(path).st_mtime
+    with _lock:
+        if _cached['table'] is None or _cached['path'] != path or _cached['mtime'] != mtime:
+            _cached.update(path=path, mtime=mtime, table=load_rate_table(path))
+        return _cached['table']
+
+
+def invalidate_rate_table():
+    """
+    the next get_rate_table() will reload the rate file, e.g. after it's been replaced within the same second
+    """
+    with _lock:
+        _cached['table'] = None
+
+
+class NoFxRate(Exception):
+    def __init__(self, *args):
+        super(NoFxRate, self).__init__(*args)
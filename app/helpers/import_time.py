@@ -0,0 +1,50 @@
+import os
+import subprocess
+import sys
+import time
+
+"""
+import-time profile of python code, run in a fresh interpreter with `python -X importtime`. used by the cold start
+benchmark (benchmarks/import_time.py) and the tests which check that the lambda entry point defers the heavy imports.
+needs python 3.7+ - older versions ignore the option, so nothing would be profiled
+"""
+
+# -X importtime was added in python 3.7
+IMPORTTIME_SUPPORTED = sys.version_info >= (3, 7)
+
+ENTRY_POINT = "import manage"
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def profile_imports(code=ENTRY_POINT, env=None):
+    """
+    :param code: python code to run in a new interpreter, in the root directory of the repo
+    :param env: dict. environment variables to add to the current ones
+    :return: tuple (wall-clock seconds of the interpreter, dict. module -> (self us, cumulative us))
+    :raises subprocess.CalledProcessError - if the code fails
+    :raises RuntimeError - if the interpreter is older than python 3.7
+    """
+    if not IMPORTTIME_SUPPORTED:
+        raise RuntimeError("`python -X importtime` needs python 3.7+, this is %s" % sys.version.split()[0])
+    started = time.perf_counter()
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                             env={**os.environ, **(env or {})}, cwd=ROOT_DIR,
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, check=True)
+    elapsed = time.perf_counter() - started
+
+    modules = {}
+    for line in process.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return elapsed, modules
+
+
+def top_level(modules):
+    """
+    :param modules: the modules, as returned by profile_imports()
+    :return: set. the top-level packages of the modules
+    """
+    return {name.split('.')[0] for name in modules}
@@ -0,0 +1,148 @@
+import threading
+import time
+
+"""
+the time left to serve a request. a lambda is killed when its timeout passes, so the work done for a request (db
+requests, their retries, paging) must fit in what's left of MAX_EXECUTION_TIME - or, on lambda, of the invocation.
+
+the budget of the request, which the current thread serves, is available via current_budget(). see init_time_budget()
+in app/__init__.py
+"""
+
+# the timeouts of a single dynamodb request, if the budget allows them
+DEFAULT_CONNECT_TIMEOUT = 0.5
+DEFAULT_READ_TIMEOUT = 0.5
+DEFAULT_MAX_RETRIES = 3
+# a request can't be made in less
+MIN_TIMEOUT = 0.1
+
+
+class TimeBudget(object):
+
+    def __init__(self, seconds, clock=time.monotonic):
+        """
+        :param seconds: the budget, from now
+        :param clock: function returning seconds
+        """
+        self.seconds = seconds
+        self._clock = clock
+        self._expires_at = clock() + seconds
+
+    @classmethod
+    def from_lambda_context(cls, context, reserve=0.1, clock=time.monotonic):
+        """
+        :param context: the context object of a lambda invocation
+        :param reserve: seconds kept for returning the response
+        """
+        return cls(max(context.get_remaining_time_in_millis() / 1000 - reserve, 0), clock=clock)
+
+    def remaining(self):
+        """
+        :return: seconds left, >= 0
+        """
+        return max(self._expires_at - self._clock(), 0)
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def ensure(self, needed=0, msg="The time budget has been exhausted"):
+        """
+        :param needed: seconds which the next step needs
+        :raises TimeBudgetExhausted - if less than `needed` seconds are left (or none at all)
+        """
+        remaining = self.remaining()
+        if remaining <= 0 or remaining < needed:
+            raise TimeBudgetExhausted(msg)
+
+    def boto_config(self, connect_timeout=DEFAULT_CONNECT_TIMEOUT, read_timeout=DEFAULT_READ_TIMEOUT,
+                    max_retries=DEFAULT_MAX_RETRIES, retry_mode=None, **config_kwargs):
+        """
+        botocore client config, whose timeouts and retries fit in the remaining time: each attempt can take up to
+        connect_timeout + read_timeout, and all of them together - no longer than what's left.
+        :param connect_timeout: the connect timeout, if there's enough time
+        :param read_timeout: the read timeout, if there's enough time
+        :param max_retries: the max number of retries, if there's enough time
+        :param retry_mode: None (botocore's default) | 'legacy' | 'standard' | 'adaptive'. ignored by botocore
+        versions which don't have the retry modes (older than 1.15)
+        :param config_kwargs: passed to botocore.config.Config. the options which the installed botocore doesn't know
+        (e.g. tcp_keepalive, which only recent versions have) are left out
+        :return: botocore.config.Config
+        """
+        from botocore.config import Config
+
+        remaining = self.remaining()
+        if connect_timeout + read_timeout > remaining:
+            # not even a single attempt fits. shorten both timeouts, in proportion
+            scale = remaining / (connect_timeout + read_timeout)
+            connect_timeout = max(connect_timeout * scale, MIN_TIMEOUT)
+            read_timeout = max(read_timeout * scale, MIN_TIMEOUT)
+        attempts = int(remaining // (connect_timeout + read_timeout))
+        retries = max(min(max_retries, attempts - 1), 0)
+        retries = {'max_attempts': retries}
+        if retry_mode and _retry_modes_supported():
+            retries['mode'] = retry_mode
+        # Config() raises a TypeError for an option it doesn't know
+        config_kwargs = {name: value for name, value in config_kwargs.items() if name in Config.OPTION_DEFAULTS}
+        return Config(connect_timeout=connect_timeout, read_timeout=read_timeout, retries=retries, **config_kwargs)
+
+
+def _retry_modes_supported():
+    """
+    :return: bool. whether the installed botocore has the retry modes. older versions reject `retries['mode']`
+    """
+    try:
+        import botocore.retries  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def retries_within_budget(attempt_timeout):
+    """
+    the retries of boto_config() fit in MAX_EXECUTION_TIME, but a call made late in a request has less time left.
+    register the returned handler first for botocore's `needs-retry` event of a client - it stops the retries of each
+    call once another attempt wouldn't fit in what's left of current_budget().
+
+    botocore retries whenever a handler of the event returns anything but None, so a handler can't veto the retry of
+    botocore's own one. instead, the error of the failed attempt is raised from the handler - as if it was the last
+    attempt. a successful response is returned as usual
+    :param attempt_timeout: seconds. how long an attempt can take - the connect timeout plus the read timeout
+    :return: function
+    """
+    def needs_retry(response=None, caught_exception=None, operation=None, **kwargs):
+        budget = current_budget()
+        if budget is None or budget.remaining() >= attempt_timeout:
+            return None  # botocore's retry handler decides
+        if caught_exception is not None:
+            raise caught_exception
+        if response is not None:
+            http_response, parsed = response
+            if http_response.status_code >= 300:
+                from botocore.exceptions import ClientError
+                raise ClientError(parsed, operation.name)
+        return None
+
+    return needs_retry
+
+
+_local = threading.local()
+
+
+def current_budget():
+    """
+    :return: the TimeBudget of the request served by the current thread | None - if there isn't one (e.g. outside
+    of a request)
+    """
+    return getattr(_local, 'budget', None)
+
+
+def set_current_budget(budget):
+    """
+    :param budget: TimeBudget | None
+    """
+    _local.budget = budget
+
+
+class TimeBudgetExhausted(Exception):
+    def __init__(self, *args):
+        super(TimeBudgetExhausted, self).__init__(*args)
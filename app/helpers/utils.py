@@ -1,4 +1,8 @@
+import random
 import signal
+import threading
+from functools import wraps
+from time import sleep, monotonic
 
 
 def deadline(timeout, msg="Function timed out"):
@@ -6,30 +10,87 @@ def deadline(timeout, msg="Function timed out"):
     https://www.filosophy.org/post/32/python_function_execution_deadlines__in_simple_examples/
     decorates a function; given a deadline period, if the decorated function hasn't returned,
     a TimedOutExc is raised.
-    :param timeout: in seconds
+
+    on the main thread, the function is interrupted via a SIGALRM timer. the previous SIGALRM handler (and timer, if
+    any) is restored afterwards, also if the function raises.
+    signals can't be used on other threads (e.g. of a threaded WSGI server) - there, the function runs in a helper
+    thread and the caller stops waiting for it at the deadline. the function itself is not interrupted.
+    :param timeout: in seconds. fractions are allowed, e.g. 0.25
     :return:
     """
 
     def decorate(f):
-        def handler(signum, frame):
-            raise TimedOutExc(msg)
-
+        @wraps(f)
         def new_f(*args, **kwargs):
-            # Set the signal handler and a 5-second alarm
-            signal.signal(signal.SIGALRM, handler)
-            signal.alarm(timeout)
-            # call the function
-            res = f(*args, **kwargs)
-            # disable the alarm
-            signal.alarm(0)
-            # return the result from the decorated function
-            return res
-
-        new_f.__name__ = f.__name__
+            if threading.current_thread() is threading.main_thread() and hasattr(signal, 'setitimer'):
+                return _call_with_timer(f, timeout, msg, args, kwargs)
+            return _call_in_thread(f, timeout, msg, args, kwargs)
+
         return new_f
 
     return decorate
 
 
+def _call_with_timer(f, timeout, msg, args, kwargs):
+    def handler(signum, frame):
+        raise TimedOutExc(msg)
+
+    previous_handler = signal.signal(signal.SIGALRM, handler)
+    previous_timer, _ = signal.setitimer(signal.ITIMER_REAL, timeout)
+    started = monotonic()
+    try:
+        return f(*args, **kwargs)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous_handler)
+        if previous_timer:
+            # an outer timer was running - re-arm it with what's left of it. fire immediately, if it's already due
+            signal.setitimer(signal.ITIMER_REAL, max(previous_timer - (monotonic() - started), 0.001))
+
+
+def _call_in_thread(f, timeout, msg, args, kwargs):
+    outcome = {}
+
+    def run():
+        try:
+            outcome['result'] = f(*args, **kwargs)
+        except BaseException as err:
+            outcome['error'] = err
+
+    worker = threading.Thread(target=run, name="deadline-%s" % f.__name__, daemon=True)
+    worker.start()
+    worker.join(timeout)
+    if worker.is_alive():
+        raise TimedOutExc(msg)
+    if 'error' in outcome:
+        raise outcome['error']
+    return outcome['result']
+
+
+def exponential_backoff(max_retries, base_delay=0.05, max_delay=2.0, time_budget=None):
+    """
+    https://aws.amazon.com/blogs/architecture/exponential-backoff-and-jitter/
+    generator used to retry an operation. before each retry (but not before the first attempt), sleeps for a random
+    period ("full jitter") which grows exponentially with each retry.
+
+        for attempt in exponential_backoff(max_retries=5):
+            if try_something():
+                break
+
+    :param max_retries: how many times to retry after the first attempt
+    :param base_delay: in seconds
+    :param max_delay: in seconds. upper bound of a single sleep
+    :param time_budget: TimeBudget | None. if set, there are no more retries once it's exhausted
+    :return: generator of the attempt number, starting from 0
+    """
+    for attempt in range(max_retries + 1):
+        if attempt:
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+            if time_budget is not None and time_budget.remaining() <= delay:
+                return
+            sleep(delay)
+        yield attempt
+
+
 class TimedOutExc(Exception):
     pass
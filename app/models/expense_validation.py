@@ -1,6 +1,14 @@
-from jsonschema import validate, ValidationError
+import re
+
+from jsonschema import Draft4Validator
+from jsonschema.exceptions import best_match
+
 from app.models.json_schema import expense_schema
 
+# compiled once. validate() would check the schema and create a validator on each call
+Draft4Validator.check_schema(expense_schema)
+_expense_validator = Draft4Validator(expense_schema)
+
 
 class ValidatorErrorPrefix:
     MISSING_PROPERTY = "missing required property: "
@@ -9,29 +17,120 @@ class ValidatorErrorPrefix:
     INVALID_TIMESTAMP = "the value %s for property %s is not a valid timestamp. It MUST be in UTC and NOT naive."
 
 
+def _pattern_check(pattern):
+    """
+    :return: function value -> bool. like the `"type": "string", "pattern"` of the schema
+    """
+    search = re.compile(pattern).search
+    return lambda value: type(value) is str and search(value) is not None
+
+
+_max_tags = expense_schema['properties']['tags']['maxItems']
+
+
+def _tags_are_valid(tags):
+    return type(tags) is list and len(tags) <= _max_tags and all(type(t) is str for t in tags) \
+        and len(set(tags)) == len(tags)
+
+
+_timestamp_is_valid = _pattern_check(expense_schema['definitions']['timestamp']['pattern'])
+_timestamp_properties = frozenset(p for p, schema in expense_schema['properties'].items()
+                                  if schema.get('$ref') == '#/definitions/timestamp')
+_expense_properties_ordered = tuple(expense_schema['properties'])
+
+# property -> function value -> bool. True only if the value is surely valid. the other values, e.g. subclasses of
+# the expected types, are left to the jsonschema validator
+_fast_checks = {
+    'id': lambda value: value is None or type(value) is str,
+    'name': lambda value: type(value) is str,
+    'amount': lambda value: type(value) in (int, float),
+    'tags': _tags_are_valid,
+    'currency': _pattern_check(expense_schema['properties']['currency']['pattern']),
+    'timestamp_utc': _timestamp_is_valid,
+    'timestamp_utc_created': _timestamp_is_valid,
+    'timestamp_utc_updated': _timestamp_is_valid,
+}
+assert set(_fast_checks) == set(expense_schema['properties']) == set(expense_schema['required'])
+_fast_checks_items = tuple(_fast_checks.items())
+
+
+def _resolve(schema):
+    """
+    :return: the schema, or the definition it refers to via "$ref": "#/definitions/<name>"
+    """
+    if '$ref' not in schema:
+        return schema
+    resolved = expense_schema
+    for part in schema['$ref'].lstrip('#/').split('/'):
+        resolved = resolved[part]
+    return resolved
+
+
+# property -> (fast check, compiled validator of the property's schema)
+_property_validators = {
+    property_name: (_fast_checks[property_name], Draft4Validator(_resolve(property_schema)))
+    for property_name, property_schema in expense_schema['properties'].items()
+}
+
+
+def _surely_valid(exp):
+    """
+    the fast path of Validator.validate_expense(). all properties are required and no others are allowed
+    """
+    if type(exp) is not dict or len(exp) != len(_fast_checks_items):
+        return False
+    for property_name, check in _fast_checks_items:
+        if property_name not in exp or not check(exp[property_name]):
+            return False
+    return True
+
+
 class Validator:
     @staticmethod
     def validate_property(value, property_name):
         """
-        uses the master schema to extract the schema for a single property
-        handles the case when a $ref is used in the `properties`
+        validates a value against the schema of a single property of the expense schema
         :param value:
         :param property_name:
         :return: boolean, indicating if valid or not
         """
-        try:
-            property_schema = None
-            if "$ref" in expense_schema['properties'][property_name].keys():
-                property = expense_schema['properties'][property_name]['$ref']
-                definition_name = property.split("#/definitions/")[1]
-                property_schema = expense_schema['definitions'][definition_name]
+        fast_check, validator = _property_validators[property_name]
+        return fast_check(value) or validator.is_valid(value)
+
+    @staticmethod
+    def validate_many(expenses):
+        """
+        validates the expenses in a single pass per property, instead of per expense. the values of each property
+        are checked together; the distinct timestamps (of all timestamp properties) are checked once each.
+        the expenses which don't pass are validated one by one, so the messages are those of validate_expense()
+        :param expenses: iterable of dictionaries
+        :return: list of (index of the expense, "<msg>") tuples, ordered by index. empty if all expenses are valid
+        """
+        expenses = list(expenses)
+        columns = _expense_properties_ordered
+        # the expenses which have exactly the properties of the schema
+        candidates = [i for i, exp in enumerate(expenses)
+                      if type(exp) is dict and len(exp) == len(columns) and all(p in exp for p in columns)]
+
+        timestamps = {exp[p] for p in _timestamp_properties for exp in (expenses[i] for i in candidates)
+                      if type(exp[p]) is str}
+        valid_timestamps = set(filter(_timestamp_is_valid, timestamps))
+
+        suspects = set(range(len(expenses))).difference(candidates)
+        for property_name in columns:
+            if property_name in _timestamp_properties:
+                check = valid_timestamps.__contains__
             else:
-                property_schema = expense_schema['properties'][property_name]
+                check = _fast_checks[property_name]
+            suspects.update(i for i, valid in zip(candidates, map(check, (expenses[i][property_name]
+                                                                          for i in candidates))) if not valid)
 
-            validate(value, property_schema)
-            return True
-        except ValidationError:
-            return False
+        report = []
+        for i in sorted(suspects):
+            is_valid, err_msg = Validator.validate_expense(expenses[i])
+            if not is_valid:
+                report.append((i, err_msg))
+        return report
 
     @staticmethod
     def validate_expense_simple(exp):
@@ -44,12 +143,14 @@ class Validator:
         :param exp: a dictionary.
         :return: a tuple. if exp was valid, (True, ""), if invalid, (False, "<msg>") where msg is formatted via ValidateErrorPrefix
         """
+        if _surely_valid(exp):
+            return True, ""
 
         is_valid = True
         err_msg = ""
-        try:
-            validate(exp, schema=expense_schema)
-        except ValidationError as err:
+        # the error, which jsonschema.validate() would raise
+        err = best_match(_expense_validator.iter_errors(exp))
+        if err is not None:
             is_valid = False
             msg = err.message
             prefix = ""
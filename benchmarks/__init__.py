@@ -0,0 +1,5 @@
+"""
+Benchmarks. Not part of the test suite.
+They need the same environment as the tests (APP_STAGE=testing, a running DynamoDB Local, see the README).
+Run from the repo root, e.g. `python -m benchmarks.get_list_rcu`
+"""
@@ -0,0 +1,74 @@
+import datetime
+import time
+import uuid
+from contextlib import contextmanager
+
+from app.helpers.time import ensure_ts_str_ends_with_z
+from app.models.sample_expenses import sample_expenses
+
+
+def make_app():
+    from app import create_app
+    from config import EnvironmentName
+    return create_app(EnvironmentName.testing)
+
+
+@contextmanager
+def scratch_expenses_table(app):
+    """
+    creates the expenses table of the `testing` stage for the duration of the block and deletes it afterwards
+    """
+    from app.db_facade import db_facade, dynamodb_users_table_init_information
+    from app.db_facade.dynamodb.dynamo import create_table_sync, DELETE_table_sync
+
+    with app.app_context():
+        create_table_sync(db_facade.raw_db, table_name=db_facade.EXPENSES_TABLE_NAME,
+                          **dynamodb_users_table_init_information)
+        try:
+            yield db_facade
+        finally:
+            DELETE_table_sync(db_facade.raw_db, table_name=db_facade.EXPENSES_TABLE_NAME)
+
+
+def generate_expenses(size, user_uid=None, currencies=('EUR',), start=None):
+    """
+    :return: list of `size` valid expenses with unique ids and timestamps, one second apart. if `user_uid` is set,
+    the expenses are ready to be written directly to the table
+    """
+    start = start or datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=size)
+    template = sample_expenses[0]
+    expenses = []
+    for i in range(size):
+        exp = template.copy()
+        exp['id'] = str(uuid.uuid4())
+        exp['amount'] = (i % 200) + 0.5
+        exp['currency'] = currencies[i % len(currencies)]
+        exp['timestamp_utc'] = exp['timestamp_utc_created'] = exp['timestamp_utc_updated'] = \
+            ensure_ts_str_ends_with_z((start + datetime.timedelta(seconds=i)).isoformat())
+        if user_uid:
+            exp['user_uid'] = user_uid
+        expenses.append(exp)
+    return expenses
+
+
+def seed(db_facade, expenses):
+    with db_facade.expenses_table.batch_writer() as batch:
+        for exp in map(db_facade.converter.convertToDbFormat, expenses):
+            batch.put_item(Item=exp)
+
+
+def timed(f, repeat):
+    """
+    :return: list with the duration in seconds of each of the `repeat` calls to `f`
+    """
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))]
@@ -0,0 +1,50 @@
+"""
+Compares the per-currency aggregation of /statistics (CurrencyAccumulator) with the previous sort + groupby
+implementation, on synthetic items as returned by dynamodb. Doesn't need a database.
+"""
+import random
+from decimal import Decimal
+from itertools import groupby
+
+from app.db_facade.aggregation import CurrencyAccumulator
+from benchmarks.common import timed, percentile
+
+ITEMS = 100000
+REPEAT = 10
+CURRENCIES = ['EUR', 'USD', 'BGN', 'GBP', 'JPY', 'CHF']
+
+
+def sort_and_groupby(items):
+    """the implementation of _groupStatisticsItems before CurrencyAccumulator"""
+
+    def from_db(num):
+        return int(num) if num % 1 == 0 else float(num)
+
+    key = lambda k: k['currency']
+    items.sort(key=key)
+    result = {}
+    for currency, items_of_currency in groupby(items, key=key):
+        result[currency] = float("%.2f" % sum(from_db(i['amount']) for i in items_of_currency))
+    return result
+
+
+def main():
+    random.seed(0)
+    items = [{"currency": random.choice(CURRENCIES), "amount": Decimal("%i.%02i" % (random.randint(0, 500),
+                                                                                   random.randint(0, 99)))}
+             for _ in range(ITEMS)]
+
+    candidates = [
+        ("sort + groupby", lambda: sort_and_groupby(list(items))),
+        ("CurrencyAccumulator.totals", lambda: CurrencyAccumulator().add_all(items).totals()),
+        ("CurrencyAccumulator.summary", lambda: CurrencyAccumulator().add_all(items).summary()),
+    ]
+    print("%i items, %i currencies" % (ITEMS, len(CURRENCIES)))
+    print("%-30s %10s %10s" % ("implementation", "p50 ms", "max ms"))
+    for name, f in candidates:
+        durations = timed(f, REPEAT)
+        print("%-30s %10.1f %10.1f" % (name, percentile(durations, 50) * 1000, max(durations) * 1000))
+
+
+if __name__ == "__main__":
+    main()
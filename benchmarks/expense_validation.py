@@ -0,0 +1,54 @@
+"""
+Expenses validated per second by Validator.validate_expense() and Validator.validate_many(), compared with calling
+jsonschema.validate() on each expense (the implementation before the compiled validator). Doesn't need a database.
+"""
+from jsonschema import validate, ValidationError
+
+from app.models.expense_validation import Validator
+from app.models.json_schema import expense_schema
+from benchmarks.common import generate_expenses, timed, percentile
+
+EXPENSES = 1000
+REPEAT = 5
+
+
+def per_call_jsonschema(expenses):
+    for exp in expenses:
+        try:
+            validate(exp, schema=expense_schema)
+        except ValidationError:
+            pass
+
+
+def compiled(expenses):
+    for exp in expenses:
+        Validator.validate_expense(exp)
+
+
+def main():
+    valid = generate_expenses(EXPENSES)
+    invalid = []
+    for i, exp in enumerate(generate_expenses(EXPENSES)):
+        # a wrong type, a missing property and a naive timestamp, in turn
+        if i % 3 == 0:
+            exp['amount'] = str(exp['amount'])
+        elif i % 3 == 1:
+            del exp['currency']
+        else:
+            exp['timestamp_utc'] = exp['timestamp_utc'][:-1]
+        invalid.append(exp)
+
+    print("%-45s %12s" % ("implementation", "expenses/s"))
+    candidates = [
+        ("jsonschema.validate per call", per_call_jsonschema),
+        ("Validator.validate_expense", compiled),
+        ("Validator.validate_many", Validator.validate_many),
+    ]
+    for name, f in candidates:
+        for kind, expenses in [("valid", valid), ("invalid", invalid)]:
+            durations = timed(lambda: f(expenses), REPEAT)
+            print("%-45s %12.0f" % ("%s, %s" % (name, kind), EXPENSES / percentile(durations, 50)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+p50/p99 latency of get_list() under concurrent load, sharing the facade's single dynamodb client, with botocore's
+default connection pool and with DYNAMODB_MAX_POOL_CONNECTIONS.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+from benchmarks.common import make_app, scratch_expenses_table, generate_expenses, seed, percentile
+from config import EnvironmentName, configs
+
+USER_UID = 'benchmark user'
+ITEMS = 500
+PAGE_SIZE = 25
+CALLS_PER_THREAD = 20
+CONCURRENCY = (1, 4, 16)
+# botocore's default
+DEFAULT_POOL_CONNECTIONS = 10
+
+
+def make_app_with_pool(max_pool_connections):
+    config = configs[EnvironmentName.testing]
+    original = config.DYNAMODB_MAX_POOL_CONNECTIONS
+    config.DYNAMODB_MAX_POOL_CONNECTIONS = max_pool_connections
+    try:
+        return make_app()
+    finally:
+        config.DYNAMODB_MAX_POOL_CONNECTIONS = original
+
+
+def run(db_facade, threads):
+    """
+    :return: tuple (list with the durations in seconds of the successful calls, number of failed calls - e.g. timed out)
+    """
+    def calls(_):
+        durations, failures = [], 0
+        for _ in range(CALLS_PER_THREAD):
+            start = time.perf_counter()
+            try:
+                db_facade.get_list(None, user_uid=USER_UID, batch_size=PAGE_SIZE)
+            except (BotoCoreError, ClientError):
+                failures += 1
+                continue
+            durations.append(time.perf_counter() - start)
+        return durations, failures
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(calls, range(threads)))
+    return [d for durations, _ in results for d in durations], sum(failures for _, failures in results)
+
+
+def main():
+    pool_sizes = (DEFAULT_POOL_CONNECTIONS, configs[EnvironmentName.testing].DYNAMODB_MAX_POOL_CONNECTIONS)
+    print("%-12s %8s %10s %10s %8s" % ("pool size", "threads", "p50 ms", "p99 ms", "failed"))
+    for pool_size in pool_sizes:
+        app = make_app_with_pool(pool_size)
+        with scratch_expenses_table(app) as db_facade:
+            seed(db_facade, generate_expenses(ITEMS, user_uid=USER_UID))
+            run(db_facade, 1)  # warm up the connection
+            for threads in CONCURRENCY:
+                durations, failures = run(db_facade, threads)
+                print("%-12i %8i %10.1f %10.1f %8i" % (pool_size, threads, percentile(durations, 50) * 1000,
+                                                       percentile(durations, 99) * 1000, failures))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Compares 25-item pages of get_list() via the Table resource + ExpenseConverter with the low-level client fast path
+(GET_LIST_LOW_LEVEL_CLIENT): end to end against the local db, and the decoding of a page alone.
+"""
+from boto3.dynamodb.types import TypeDeserializer
+
+from app.db_facade.dynamodb.expense_wire_format import expense_from_wire
+from app.db_facade.facade import sanitize_expense
+from benchmarks.common import make_app, scratch_expenses_table, generate_expenses, seed, timed, percentile
+
+USER_UID = 'benchmark user'
+ITEMS = 500
+PAGE_SIZE = 25
+REPEAT = 200
+DECODE_REPEAT = 5000
+
+
+def main():
+    app = make_app()
+    with scratch_expenses_table(app) as db_facade:
+        expenses = generate_expenses(ITEMS, user_uid=USER_UID)
+        for i, exp in enumerate(expenses):
+            exp['tags'] = ['tag %i' % (i % 7), 'tag %i' % (i % 5)]
+        seed(db_facade, expenses)
+
+        print("%-40s %10s %10s" % ("25-item page", "p50 ms", "p99 ms"))
+        for low_level in (False, True):
+            db_facade.get_list_low_level = low_level
+            durations = timed(lambda: db_facade.get_list(None, user_uid=USER_UID, batch_size=PAGE_SIZE), REPEAT)
+            print("%-40s %10.2f %10.2f" % ("get_list, %s" % ("low-level client" if low_level else "Table resource"),
+                                           percentile(durations, 50) * 1000, percentile(durations, 99) * 1000))
+
+        # the same page, as returned by the low-level client
+        wire_items = db_facade.raw_client.query(
+            TableName=db_facade.EXPENSES_TABLE_NAME, Limit=PAGE_SIZE,
+            KeyConditionExpression="user_uid = :uid", ExpressionAttributeValues={":uid": {"S": USER_UID}})['Items']
+        deserializer = TypeDeserializer()
+        converter = db_facade.converter
+
+        def via_resource():
+            # what the resource does to each attribute, then the facade
+            return [sanitize_expense(converter.convertFromDbFormat(
+                {k: deserializer.deserialize(v) for k, v in item.items()})) for item in wire_items]
+
+        candidates = [
+            ("decode, TypeDeserializer + converter", via_resource),
+            ("decode, expense_from_wire", lambda: [expense_from_wire(item) for item in wire_items]),
+        ]
+        for name, f in candidates:
+            durations = timed(f, DECODE_REPEAT)
+            print("%-40s %10.3f %10.3f" % (name, percentile(durations, 50) * 1000, percentile(durations, 99) * 1000))
+
+
+if __name__ == "__main__":
+    main()
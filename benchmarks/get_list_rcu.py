@@ -0,0 +1,36 @@
+"""
+Reports the read capacity units (RCUs) consumed per page of get_list(), for each of the indexes
+which can be queried.
+"""
+from app.db_facade.misc import OrderingDirection
+from app.db_facade.table_schema import query_plan_for_property
+from benchmarks.common import make_app, scratch_expenses_table, generate_expenses, seed
+
+USER_UID = 'benchmark user'
+ITEMS = 500
+PAGE_SIZE = 25
+
+
+def main():
+    app = make_app()
+    with scratch_expenses_table(app) as db_facade:
+        seed(db_facade, generate_expenses(ITEMS, user_uid=USER_UID))
+
+        print("%-25s %-35s %8s %10s" % ("property", "index", "pages", "RCU/page"))
+        for property_name, plan in query_plan_for_property.items():
+            db_facade.capacity_meter.reset()
+            pages, token = 0, None
+            while True:
+                _, token = db_facade.get_list_page(None, user_uid=USER_UID, property_name=property_name,
+                                                   ordering_direction=OrderingDirection.desc,
+                                                   batch_size=PAGE_SIZE, continuation_token=token)
+                pages += 1
+                if not token:
+                    break
+            consumed = sum(v['capacity_units'] for v in db_facade.capacity_meter.snapshot().values())
+            print("%-25s %-35s %8i %10.2f" % (property_name, plan['IndexName'] or '<base table>', pages,
+                                              consumed / pages))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+"""
+Import-time profile of the lambda entry point (`manage.app`, see zappa_settings.json), based on `python -X importtime`.
+Runs the import in a fresh interpreter, with and without LAZY_INIT, and reports the slowest imports.
+Without LAZY_INIT the DynamoDB connection is created too, so DynamoDB Local must be running.
+"""
+from app.helpers.import_time import profile_imports, top_level
+
+# imported only on first use (rollbar - when LAZY_INIT is set). dateutil isn't among them, as botocore
+# imports it anyway
+DEFERRED_MODULES = ('rollbar', 'firebase_admin', 'requests', 'jwt')
+TOP = 15
+
+
+def main():
+    for lazy_init in ("0", "1"):
+        elapsed, modules = profile_imports(env={"LAZY_INIT": lazy_init})
+        print("LAZY_INIT=%s: %.0f ms wall-clock, %.0f ms in imports, %i modules" % (
+            lazy_init, elapsed * 1000, sum(self_us for self_us, _ in modules.values()) / 1000, len(modules)))
+        print("  deferred modules imported: %s" % (sorted(top_level(modules) & set(DEFERRED_MODULES)) or "none"))
+        print("  %-50s %12s" % ("slowest imports", "cumul. ms"))
+        for name, (_, cumulative_us) in sorted(modules.items(), key=lambda m: -m[1][1])[:TOP]:
+            print("  %-50s %12.1f" % (name, cumulative_us / 1000))
+
+
+if __name__ == "__main__":
+    main()
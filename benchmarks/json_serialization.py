@@ -0,0 +1,59 @@
+"""
+The share of the json serialisation in the time of a /get_expenses_list request for a page of the largest size the
+endpoint serves (MAX_BATCH_SIZE - 1 = 24): the request end to end against the local db, and the serialisation of the
+same page alone - with the stdlib json, with app.api_utils.serializer (orjson, if installed) and with gzip on top of it.
+"""
+import gzip
+import json
+from unittest.mock import patch
+
+from app.api_utils import serializer
+from app.api_utils.response import GZIP_LEVEL
+from app.db_facade.facade import MAX_BATCH_SIZE
+from app.expenses_api.views import FirebaseTokenValidator
+from benchmarks.common import make_app, scratch_expenses_table, generate_expenses, seed, timed, percentile
+
+USER_UID = 'benchmark user'
+ITEMS = 500
+PAGE_SIZE = MAX_BATCH_SIZE - 1
+REPEAT = 200
+SERIALISE_REPEAT = 5000
+
+
+def main():
+    app = make_app()
+    with scratch_expenses_table(app) as db_facade, \
+            patch.object(FirebaseTokenValidator, 'validate_id_token_and_get_uid', return_value=USER_UID):
+        expenses = generate_expenses(ITEMS, user_uid=USER_UID)
+        for i, exp in enumerate(expenses):
+            exp['tags'] = ['tag %i' % (i % 7), 'tag %i' % (i % 5)]
+        seed(db_facade, expenses)
+
+        client = app.test_client()
+        url = '/expenses_api/%s/get_expenses_list?batch_size=%i' % (app.config['EXPENSES_API_VERSION'], PAGE_SIZE)
+        headers = {app.config['CUSTOM_AUTH_HEADER_NAME']: 'token'}
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200 and len(response.get_json()) == PAGE_SIZE, response.get_data(as_text=True)
+        request = timed(lambda: client.get(url, headers=headers), REPEAT)
+        request_p50 = percentile(request, 50)
+
+        page = db_facade.get_list(None, user_uid=USER_UID, batch_size=PAGE_SIZE)
+        print("serializer backend: %s, %i bytes per page, %i gzipped" % (
+            serializer.backend, len(serializer.dumps(page)), len(gzip.compress(serializer.dumps(page), GZIP_LEVEL))))
+        print("%-40s %10s %10s %10s" % ("%i-item page" % PAGE_SIZE, "p50 ms", "p99 ms", "% request"))
+        print("%-40s %10.3f %10.3f" % ("GET /get_expenses_list", request_p50 * 1000, percentile(request, 99) * 1000))
+
+        candidates = [
+            ("json.dumps", lambda: json.dumps(page)),
+            ("serializer.dumps", lambda: serializer.dumps(page)),
+            ("serializer.dumps + gzip", lambda: gzip.compress(serializer.dumps(page), GZIP_LEVEL)),
+        ]
+        for name, f in candidates:
+            durations = timed(f, SERIALISE_REPEAT)
+            p50 = percentile(durations, 50)
+            print("%-40s %10.3f %10.3f %10.2f" % (name, p50 * 1000, percentile(durations, 99) * 1000,
+                                                   100 * p50 / request_p50))
+
+
+if __name__ == "__main__":
+    main()
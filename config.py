@@ -10,6 +10,14 @@ class BaseConfig(object):
     APP_STAGE = os.environ['APP_STAGE']
 
     FIREBASE_CONFIG_JSON_BASE64 = os.environ.get('FIREBASE_CONFIG_JSON_BASE64', '')
+    # the project for which the id tokens must be issued. defaults to the project_id of FIREBASE_CONFIG_JSON_BASE64
+    FIREBASE_PROJECT_ID = os.environ.get('FIREBASE_PROJECT_ID', '')
+    # the public keys, with which the id tokens are signed
+    FIREBASE_CERTS_URL = os.environ.get('FIREBASE_CERTS_URL',
+                                        'https://www.googleapis.com/robot/v1/metadata/x509/'
+                                        'securetoken@system.gserviceaccount.com')
+    # max number of verified id tokens, remembered until they expire. 0 disables the cache
+    ID_TOKEN_CACHE_SIZE = 10000
     ROLLBAR_CLIENT_TOKEN = os.environ.get('ROLLBAR_CLIENT_TOKEN', '')
     # if true, the contents of `CUSTOM_AUTH_HEADER_NAME` will be treated as readily validated and extracted firebase uid
     # if false, the contents of CUSTOM_AUTH_HEADER_NAME will be validated via the firebase admin sdk and a firebase user uid
@@ -22,11 +30,61 @@ class BaseConfig(object):
     DUMMY_FIREBASE_UID = os.environ.get("DUMMY_FIREBASE_UID", "")
     # makes it possible to create an app when the expenses table is empty
     DB_PING_LAZY = os.environ.get("DB_PING_LAZY", False)
+    # defer creating the DynamoDB connection, the Firebase app and the Rollbar client until first use. shortens the
+    # cold start of a lambda. the connectivity check of the db (ping_db) is skipped
+    LAZY_INIT = bool(int(os.environ.get("LAZY_INIT", "0")))
+    # for how many seconds the result of the DescribeTable health check of the expenses table (/api/health) is reused
+    DB_HEALTH_CHECK_TTL = 30
     CUSTOM_AUTH_HEADER_NAME = "x-firebase-auth-token"
-    MAX_EXECUTION_TIME = 3  # lambda consideration
-
+    # the /get_expenses_list response carries the token for the next page in this header
+    CONTINUATION_TOKEN_HEADER_NAME = "x-continuation-token"
+    MAX_EXECUTION_TIME = 3  # lambda consideration. the time budget of a request, if it's not served by a lambda
+    # the value of the Retry-After header of a 503 response, sent when a request has run out of time
+    TIME_BUDGET_RETRY_AFTER = 1
+    # the botocore client of dynamodb. a single client (and its connection pool) is shared by the requests served
+    # by the process, including the threads of concurrent batch operations
+    DYNAMODB_MAX_POOL_CONNECTIONS = int(os.environ.get("DYNAMODB_MAX_POOL_CONNECTIONS", "25"))
+    # "standard" retries throttling and transient errors with jittered backoff, limited by a retry quota. or "legacy".
+    # ignored by botocore versions without the retry modes
+    DYNAMODB_RETRY_MODE = os.environ.get("DYNAMODB_RETRY_MODE", "standard")
+    # seconds. (connect + read timeout) * attempts is capped by MAX_EXECUTION_TIME - and, for each call, by what's left
+    # of the time budget of the request
+    DYNAMODB_CONNECT_TIMEOUT = 0.5
+    DYNAMODB_READ_TIMEOUT = 0.5
+    DYNAMODB_MAX_RETRIES = 3
+    # keeps the pooled connections of a warm lambda alive between invocations. ignored by botocore versions which
+    # don't have the option
+    DYNAMODB_TCP_KEEPALIVE = bool(int(os.environ.get("DYNAMODB_TCP_KEEPALIVE", "1")))
+
+    # gzip (or br, if brotli is installed) the json responses of at least COMPRESS_MIN_SIZE bytes, if the client accepts
+    # it. behind API Gateway, this needs binary support for the compressed content types (zappa's binary_support)
+    COMPRESS_RESPONSES = bool(int(os.environ.get("COMPRESS_RESPONSES", "0")))
+    COMPRESS_MIN_SIZE = int(os.environ.get("COMPRESS_MIN_SIZE", "1400"))  # smaller bodies fit into one tcp segment
+    # /get_expenses_list queries via the low-level dynamodb client and decodes the expenses straight from the wire
+    # format, instead of via the Table resource and ExpenseConverter. off by default - opt in once its responses were
+    # compared with those of the resource in the target environment (see benchmarks/get_list_low_level.py)
+    GET_LIST_LOW_LEVEL_CLIENT = bool(int(os.environ.get("GET_LIST_LOW_LEVEL_CLIENT", "0")))
+    # max number of expenses in a /persist_many request
+    MAX_PERSIST_MANY_SIZE = 100
+    # max number of expenses in a /remove_many request
+    MAX_REMOVE_MANY_SIZE = 100
     # https://github.com/jorotenev/para_api/issues/1
     MAX_SYNC_REQUEST_SIZE = 15
+    # /sync?lookup=batch_get reads exactly one item per request object, so it can verify more of them
+    MAX_SYNC_VERIFY_REQUEST_SIZE = 500
+    # persist/update/remove append to a per-user change log, used by /sync?since=<high-water mark>. each change is then
+    # written in a transaction, together with its entry. create the change log table (see manage.py) before enabling it
+    SYNC_CHANGELOG_ENABLED = bool(int(os.environ.get("SYNC_CHANGELOG_ENABLED", "0")))
+    MAX_SYNC_CHANGES_SIZE = 100
+    # persist/update/remove maintain per user/day/currency sums, which /statistics reads for the whole days of a window.
+    # each change is then written in a transaction, together with the updates of the sums. once enabled, the statistics
+    # are right only after the sums are backfilled from the expenses at rest (manage.py backfill_rollups)
+    STATISTICS_ROLLUPS_ENABLED = bool(int(os.environ.get("STATISTICS_ROLLUPS_ENABLED", "0")))
+    # max number of query pages (up to 1MB each) /statistics reads, so that it stays within MAX_EXECUTION_TIME
+    STATISTICS_MAX_PAGES = 8
+    # the exchange rates for /statistics?home_currency=. a new file is picked up when its modification time changes
+    FX_RATES_FILE = os.environ.get("FX_RATES_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                 'app', 'helpers', 'fx_rates.json'))
 
     @classmethod
     def init_app(cls, app):
@@ -37,6 +95,8 @@ class DevelopmentConfig(BaseConfig):
     SHORT_CIRCUIT_FIREBASE = bool(int(os.environ.get("SHORT_CIRCUIT_FIREBASE", "0")))
     LOCAL_DYNAMODB_URL = os.environ.get("LOCAL_DYNAMODB_URL", local_dynamodb_url)
     DUMMY_FIREBASE_UID = fake_uid
+    # a local dynamodb answers large batches much slower than the real one. a single attempt fits in the time budget
+    DYNAMODB_READ_TIMEOUT = 2.0
 
     @classmethod
     def init_app(cls, app):
@@ -51,6 +111,9 @@ class TestingConfig(DevelopmentConfig):
 
     TESTING = True
     LOCAL_DYNAMODB_URL = os.environ.get("LOCAL_DYNAMODB_URL", local_dynamodb_url)
+    # the tests create all tables
+    SYNC_CHANGELOG_ENABLED = bool(int(os.environ.get("SYNC_CHANGELOG_ENABLED", "1")))
+    STATISTICS_ROLLUPS_ENABLED = bool(int(os.environ.get("STATISTICS_ROLLUPS_ENABLED", "1")))
 
     @classmethod
     def init_app(cls, app):
@@ -2,6 +2,8 @@
 import os
 import sys
 from os.path import dirname, join
+
+import click
 from dotenv import load_dotenv
 
 
@@ -45,12 +47,21 @@ def _create_expenses_table_no_ctx():
 
         table_name = db_facade.EXPENSES_TABLE_NAME
         from app.db_facade.dynamodb.dynamo import create_table_sync
-        from app.db_facade.table_schema import dynamodb_users_table_init_information
+        from app.db_facade.table_schema import dynamodb_users_table_init_information, \
+            changelog_table_init_information, rollups_table_init_information
         print("creating dynamodb table [%s]" % table_name)
         create_table_sync(dynamodb_resource=db_facade.raw_db,
                           table_name=table_name,
                           silent_if_existing=False,
                           **dynamodb_users_table_init_information)
+        print("creating dynamodb table [%s]" % db_facade.CHANGELOG_TABLE_NAME)
+        create_table_sync(dynamodb_resource=db_facade.raw_db,
+                          table_name=db_facade.CHANGELOG_TABLE_NAME,
+                          **changelog_table_init_information)
+        print("creating dynamodb table [%s]" % db_facade.ROLLUPS_TABLE_NAME)
+        create_table_sync(dynamodb_resource=db_facade.raw_db,
+                          table_name=db_facade.ROLLUPS_TABLE_NAME,
+                          **rollups_table_init_information)
         print("ok")
 
 
@@ -67,6 +78,55 @@ def _delete_expenses_table_no_ctx():
 
         from app.db_facade.dynamodb.dynamo import DELETE_table_sync
         DELETE_table_sync(dynamodb_resource=db_facade.raw_db, table_name=table_name)
+        print("deleting dynamodb table [%s]" % db_facade.CHANGELOG_TABLE_NAME)
+        DELETE_table_sync(dynamodb_resource=db_facade.raw_db, table_name=db_facade.CHANGELOG_TABLE_NAME)
+        print("deleting dynamodb table [%s]" % db_facade.ROLLUPS_TABLE_NAME)
+        DELETE_table_sync(dynamodb_resource=db_facade.raw_db, table_name=db_facade.ROLLUPS_TABLE_NAME)
+        print('ok')
+
+
+@app.cli.command(with_appcontext=False)
+def backfill_rollups():
+    """(Re)compute the statistics rollups from the expenses at rest."""
+    _backfill_rollups_no_ctx()
+
+
+def _backfill_rollups_no_ctx():
+    with app.app_context():
+        from app.db_facade import db_facade
+        from app.db_facade.rollups import StatisticsRollups, day_of
+
+        if not db_facade.rollups:
+            print("The statistics rollups are disabled - set STATISTICS_ROLLUPS_ENABLED=1 first, so that the changes "
+                  "made while backfilling are applied to the rollups too")
+            sys.exit(1)
+
+        print("backfilling [%s] from [%s]" % (db_facade.ROLLUPS_TABLE_NAME, db_facade.EXPENSES_TABLE_NAME))
+        # the days with expenses, and then the days with rollups - those without expenses anymore are deleted.
+        # the tables are scanned page by page, only the (user, day) pairs already rebuilt are kept in memory
+        sources = [
+            (db_facade.expenses_table, {"ProjectionExpression": "user_uid, timestamp_utc"},
+             lambda item: day_of(item['timestamp_utc'])),
+            (db_facade.rollups.table, {"ProjectionExpression": "user_uid, #d",
+                                       "ExpressionAttributeNames": {"#d": StatisticsRollups.RANGE_KEY}},
+             lambda item: item[StatisticsRollups.RANGE_KEY]),
+        ]
+        rebuilt, failed = set(), []
+        for table, scan_kwargs, day_of_item in sources:
+            while True:
+                response = table.scan(**scan_kwargs)
+                days = {(item['user_uid'], day_of_item(item)) for item in response['Items']} - rebuilt
+                for user_uid in {uid for uid, _ in days}:
+                    days_of_user = sorted(day for uid, day in days if uid == user_uid)
+                    failed.extend((user_uid, day) for day in db_facade.rebuild_rollups(user_uid, days_of_user))
+                rebuilt |= days
+                if 'LastEvaluatedKey' not in response:
+                    break
+                scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+        if failed:
+            print("the expenses of these days kept changing, run it again: %s" % failed)
+            sys.exit(1)
         print('ok')
 
 
@@ -128,6 +188,43 @@ def _seed_data_no_ctx(firebase_uid=None):
         print('ok')
 
 
+@app.cli.command(with_appcontext=False)
+@click.argument('path')
+def validate_expenses(path):
+    """Validate the expenses in a .json (a list of expenses) or .csv export."""
+    invalid = _validate_expenses_no_ctx(path)
+    sys.exit(1 if invalid else 0)
+
+
+def _validate_expenses_no_ctx(path):
+    """
+    the csv has a header row with the expense properties. `tags` are separated by `|`, an empty `id` is null
+    :return: the number of invalid expenses
+    """
+    import csv, json
+    from app.models.expense_validation import Validator
+
+    with open(path) as file:
+        if path.endswith('.csv'):
+            expenses = []
+            for row in csv.DictReader(file):
+                row['id'] = row['id'] or None
+                row['tags'] = row['tags'].split('|') if row['tags'] else []
+                try:
+                    row['amount'] = json.loads(row['amount'])
+                except ValueError:
+                    pass  # reported as a wrong type
+                expenses.append(row)
+        else:
+            expenses = json.load(file)
+
+    report = Validator.validate_many(expenses)
+    for i, err_msg in report:
+        print("%i: %s" % (i, err_msg))
+    print("%i expenses, %i invalid" % (len(expenses), len(report)))
+    return len(report)
+
+
 @app.cli.command()
 def boom():
     print("command ran in %s" % app.config['APP_STAGE'])
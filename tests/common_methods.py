@@ -1,3 +1,7 @@
+import datetime
+import uuid
+
+from app.helpers.time import ensure_ts_str_ends_with_z
 from app.models.expense_validation import Validator
 from app.models.sample_expenses import sample_expenses
 
@@ -18,3 +22,20 @@ def is_number(val):
         return type(float(str(val))) == float
     except:
         return False
+
+
+def generate_expenses(size, currencies=('EUR',)):
+    """
+    :return: list of `size` valid expenses with unique ids and timestamps, one second apart, up to now
+    """
+    start = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=size)
+    expenses = []
+    for i in range(size):
+        exp = SINGLE_EXPENSE.copy()
+        exp['id'] = str(uuid.uuid4())
+        exp['amount'] = (i % 200) + 0.5
+        exp['currency'] = currencies[i % len(currencies)]
+        exp['timestamp_utc'] = exp['timestamp_utc_created'] = exp['timestamp_utc_updated'] = \
+            ensure_ts_str_ends_with_z((start + datetime.timedelta(seconds=i)).isoformat())
+        expenses.append(exp)
+    return expenses
@@ -0,0 +1,197 @@
+import datetime
+import json
+import threading
+import time
+import unittest
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from unittest.mock import patch
+
+import jwt
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from flask import Flask
+
+from app.auth.public_keys import PublicKeyCache, CertificatesUnavailable, fetch_certificates, \
+    FAILED_FETCH_RETRY_INTERVAL
+from app.auth.firebase import IdTokenVerifier, FirebaseTokenValidator
+
+PROJECT_ID = 'para-test'
+
+
+def make_key_pair():
+    """
+    :return: tuple (private key, self-signed PEM certificate of its public key)
+    """
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'securetoken.system.gserviceaccount.com')])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key()) \
+        .serial_number(x509.random_serial_number()).not_valid_before(now - datetime.timedelta(days=1)) \
+        .not_valid_after(now + datetime.timedelta(days=1)).sign(key, hashes.SHA256())
+    return key, cert.public_bytes(serialization.Encoding.PEM).decode()
+
+
+class CertServer(object):
+    """
+    local stand-in for google's certificate endpoint
+    """
+
+    def __init__(self, certificates, max_age=3600):
+        self.certificates = certificates
+        self.max_age = max_age
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests += 1
+                body = json.dumps(server.certificates).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Cache-Control', 'public, max-age=%i, must-revalidate, no-transform' % server.max_age)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = HTTPServer(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:%i/certs' % self.httpd.server_port
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class FirebaseAuthTestBase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.key, cls.cert = make_key_pair()
+        cls.other_key, cls.other_cert = make_key_pair()
+
+    def setUp(self):
+        self.server = CertServer({'kid1': self.cert})
+        self.now = [time.time()]
+        self.keys = PublicKeyCache(url=self.server.url, clock=lambda: self.now[0])
+        self.verifier = IdTokenVerifier(PROJECT_ID, self.keys)
+
+    def tearDown(self):
+        self.keys.wait_for_background_refresh()
+        self.server.close()
+
+    def token(self, kid='kid1', key=None, **claims):
+        now = int(time.time())
+        payload = {"iss": "https://securetoken.google.com/" + PROJECT_ID, "aud": PROJECT_ID, "sub": "user-1",
+                   "iat": now - 10, "exp": now + 3600, "auth_time": now - 10}
+        payload.update(claims)
+        return jwt.encode(payload, key or self.key, algorithm='RS256', headers={'kid': kid})
+
+
+class TestIdTokenVerifier(FirebaseAuthTestBase):
+
+    def test_valid_token(self):
+        self.assertEqual('user-1', self.verifier.verify(self.token())['uid'])
+
+    def test_invalid_tokens(self):
+        invalid = [
+            self.token(aud='another-project'),
+            self.token(iss='https://securetoken.google.com/another-project'),
+            self.token(exp=int(time.time()) - 3600),
+            self.token(sub=''),
+            self.token(key=self.other_key),  # signed with a key, which isn't google's
+            self.token(kid='unknown'),
+            self.token()[:-5],
+            'not a token',
+            None,
+        ]
+        for token in invalid:
+            with self.assertRaises(ValueError, msg=token):
+                self.verifier.verify(token)
+
+
+class TestPublicKeyCache(FirebaseAuthTestBase):
+
+    def test_fetch(self):
+        certificates, max_age = fetch_certificates(self.server.url)
+        self.assertEqual({'kid1': self.cert}, certificates)
+        self.assertEqual(3600, max_age)
+
+    def test_keys_are_cached_for_max_age(self):
+        for _ in range(3):
+            self.verifier.verify(self.token())
+        self.assertEqual(1, self.server.requests)
+
+        # the certificates have expired - fetched synchronously
+        self.now[0] += 3600
+        self.verifier.verify(self.token())
+        self.assertEqual(2, self.server.requests)
+
+    def test_background_refresh(self):
+        self.verifier.verify(self.token())
+        # google rotates the keys. the old key is still published
+        self.server.certificates = {'kid1': self.cert, 'kid2': self.other_cert}
+
+        self.now[0] += 3600 * 0.95  # close to the expiry - refreshed in the background
+        self.verifier.verify(self.token())
+        self.keys.wait_for_background_refresh(timeout=5)
+        self.assertEqual(2, self.server.requests)
+        self.assertIsNotNone(self.keys.get('kid2'))
+        self.assertEqual(2, self.server.requests)
+
+    def test_unknown_key_id_refetches_rarely(self):
+        self.verifier.verify(self.token())
+        self.server.certificates = {'kid2': self.other_cert}
+
+        self.now[0] += 120  # rotated before the max-age passed
+        self.assertEqual('user-1', self.verifier.verify(self.token(kid='kid2', key=self.other_key))['uid'])
+        self.assertEqual(2, self.server.requests)
+
+        for _ in range(3):
+            with self.assertRaises(ValueError):
+                self.verifier.verify(self.token(kid='bogus'))
+        self.assertEqual(2, self.server.requests)
+
+    def test_certificates_unavailable(self):
+        self.verifier.verify(self.token())
+        self.server.close()
+
+        # the cached keys are still valid
+        self.now[0] += 120
+        self.assertEqual('user-1', self.verifier.verify(self.token())['uid'])
+
+        self.now[0] += 3600
+        with self.assertRaises(CertificatesUnavailable):
+            self.verifier.verify(self.token())
+
+        # rejected as an invalid token rather than failing the request with a 500
+        app = Flask(__name__)
+        with app.app_context(), patch('app.auth.firebase.token_verifier', self.verifier), \
+                patch('app.auth.firebase.token_cache', None):
+            with self.assertRaises(FirebaseTokenValidator.FirebaseIdTokenValidationExc):
+                FirebaseTokenValidator.validate_id_token_and_get_uid(self.token())
+
+    def test_failed_fetch_isnt_retried_immediately(self):
+        attempts = []
+
+        def fetch(url):
+            attempts.append(url)
+            raise OSError("the certificate endpoint is down")
+
+        keys = PublicKeyCache(url=self.server.url, fetch=fetch, clock=lambda: self.now[0])
+        for _ in range(3):
+            with self.assertRaises(CertificatesUnavailable):
+                keys.get('kid1')
+        self.assertEqual(1, len(attempts), "the requests don't wait for the endpoint, while it's down")
+
+        self.now[0] += FAILED_FETCH_RETRY_INTERVAL
+        with self.assertRaises(CertificatesUnavailable):
+            keys.get('kid1')
+        self.assertEqual(2, len(attempts))
+
+        keys._fetch = fetch_certificates
+        self.now[0] += FAILED_FETCH_RETRY_INTERVAL
+        self.assertIsNotNone(keys.get('kid1'))
@@ -0,0 +1,54 @@
+import unittest
+from unittest.mock import patch, MagicMock
+
+from app.auth import firebase
+from app.auth.firebase import FirebaseTokenValidator
+from app.auth.token_cache import VerifiedTokenCache
+
+
+class TestVerifiedTokenCache(unittest.TestCase):
+
+    def setUp(self):
+        self.now = [1000]
+        self.cache = VerifiedTokenCache(max_size=2, clock=lambda: self.now[0])
+
+    def test_hit_and_miss(self):
+        self.assertIsNone(self.cache.get('token1'))
+        self.cache.put('token1', 'uid1', exp=2000)
+        self.assertEqual('uid1', self.cache.get('token1'))
+        self.assertIsNone(self.cache.get(None))
+        self.assertEqual({"size": 1, "hits": 1, "misses": 2}, self.cache.stats())
+
+    def test_evicted_at_expiry(self):
+        self.cache.put('token1', 'uid1', exp=2000)
+        self.now[0] = 1999
+        self.assertEqual('uid1', self.cache.get('token1'))
+        self.now[0] = 2000
+        self.assertIsNone(self.cache.get('token1'))
+        self.assertEqual(0, self.cache.stats()['size'])
+
+    def test_least_recently_used_is_evicted(self):
+        self.cache.put('token1', 'uid1', exp=2000)
+        self.cache.put('token2', 'uid2', exp=2000)
+        self.cache.get('token1')
+        self.cache.put('token3', 'uid3', exp=2000)
+        self.assertIsNone(self.cache.get('token2'))
+        self.assertEqual('uid1', self.cache.get('token1'))
+        self.assertEqual('uid3', self.cache.get('token3'))
+
+    def test_tokens_are_not_stored(self):
+        self.cache.put('token1', 'uid1', exp=2000)
+        self.assertNotIn('token1', self.cache._entries)
+
+
+class TestValidatorUsesTheCache(unittest.TestCase):
+
+    def test_verified_once(self):
+        verifier = MagicMock()
+        verifier.verify.return_value = {"uid": "uid1", "exp": 2 ** 40}
+        with patch.object(firebase, 'token_verifier', verifier), \
+                patch.object(firebase, 'token_cache', VerifiedTokenCache()):
+            for _ in range(3):
+                self.assertEqual('uid1', FirebaseTokenValidator.validate_id_token_and_get_uid('token1'))
+            self.assertEqual(1, verifier.verify.call_count)
+            self.assertEqual(2, firebase.token_cache.hits)
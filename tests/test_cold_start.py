@@ -0,0 +1,39 @@
+import unittest
+
+from app import create_app
+from app.db_facade import db_facade
+from app.helpers.import_time import profile_imports, top_level, IMPORTTIME_SUPPORTED
+from config import EnvironmentName, configs
+
+
+class TestLazyInit(unittest.TestCase):
+
+    @unittest.skipUnless(IMPORTTIME_SUPPORTED, "profiling the imports needs python 3.7+ (`python -X importtime`)")
+    def test_entry_point_defers_heavy_initialisation(self):
+        """
+        the lambda entry point, in a fresh interpreter. with LAZY_INIT, none of rollbar, firebase_admin and jwt is
+        imported and no connection to the db is made, even in a stage which uses rollbar and firebase
+        """
+        _, modules = profile_imports(
+            code="import manage; from app.db_facade import db_facade; assert db_facade._raw_db is None",
+            env={"APP_STAGE": EnvironmentName.staging, "LAZY_INIT": "1", "ROLLBAR_CLIENT_TOKEN": "token",
+                 "FIREBASE_CONFIG_JSON_BASE64": "config", "FIREBASE_PROJECT_ID": "project"})
+        self.assertIn('manage', modules)
+        self.assertEqual(set(), top_level(modules) & {'rollbar', 'firebase_admin', 'requests', 'jwt'})
+
+    def test_db_is_connected_on_first_use(self):
+        config = configs[EnvironmentName.testing]
+        original = config.LAZY_INIT
+        config.LAZY_INIT = True
+        # as in a cold process. otherwise the connection of the previously created app is reused
+        db_facade._raw_db = db_facade._raw_client = None
+        try:
+            app = create_app(EnvironmentName.testing)
+        finally:
+            config.LAZY_INIT = original
+
+        with app.app_context():
+            self.assertIsNone(db_facade._raw_db)
+            self.assertEqual(db_facade.EXPENSES_TABLE_NAME, db_facade.expenses_table.name)
+            self.assertIsNotNone(db_facade._raw_db)
+            self.assertIs(db_facade.raw_db, db_facade.raw_db)
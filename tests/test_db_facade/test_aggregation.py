@@ -0,0 +1,82 @@
+import unittest
+from decimal import Decimal
+
+from app.db_facade.aggregation import CurrencyAccumulator, BucketedAccumulator, bucket_start
+
+
+class TestCurrencyAccumulator(unittest.TestCase):
+
+    def test_totals(self):
+        acc = CurrencyAccumulator().add_all([
+            {"currency": "EUR", "amount": Decimal("10.1")},
+            {"currency": "USD", "amount": Decimal("20")},
+            {"currency": "EUR", "amount": Decimal("10.2")},
+        ])
+        self.assertEqual({"EUR": 20.3, "USD": 20}, acc.totals())
+
+    def test_sums_decimals_exactly(self):
+        acc = CurrencyAccumulator()
+        for _ in range(1000):
+            acc.add("EUR", Decimal("0.1"))
+        self.assertEqual(100, acc.totals()["EUR"])
+        self.assertEqual(Decimal("100.0"), acc._stats["EUR"][0])
+
+    def test_summary(self):
+        acc = CurrencyAccumulator()
+        for amount in [Decimal(5), Decimal(1), Decimal(3)]:
+            acc.add("EUR", amount)
+        self.assertEqual({"EUR": {"total": 9, "count": 3, "min": 1, "max": 5, "mean": 3}}, acc.summary())
+        self.assertEqual({"EUR": {"count": 3}}, acc.summary(['count']))
+
+    def test_merge(self):
+        first = CurrencyAccumulator().add_all([{"currency": "EUR", "amount": Decimal(1)}])
+        second = CurrencyAccumulator().add_all([{"currency": "EUR", "amount": Decimal(4)},
+                                                {"currency": "USD", "amount": Decimal(2)}])
+        first.merge(second)
+        self.assertEqual({"EUR": {"total": 5, "count": 2, "min": 1, "max": 4},
+                          "USD": {"total": 2, "count": 1, "min": 2, "max": 2}},
+                         first.summary(['total', 'count', 'min', 'max']))
+
+    def test_pre_aggregated_totals(self):
+        acc = CurrencyAccumulator()
+        acc.add("EUR", Decimal(1))
+        acc.add_total("EUR", Decimal(9), 3)
+        acc.add("EUR", Decimal(2))
+        self.assertEqual({"EUR": {"total": 12, "count": 5, "mean": 2.4, "min": None}},
+                         acc.summary(['total', 'count', 'mean', 'min']))
+
+
+class TestBucketedAccumulator(unittest.TestCase):
+
+    def test_bucket_start(self):
+        self.assertEqual("2018-01-31", bucket_start("2018-01-31", 'day'))
+        self.assertEqual("2018-01-29", bucket_start("2018-01-31", 'week'))  # Monday
+        self.assertEqual("2018-01-29", bucket_start("2018-01-29", 'week'))
+        self.assertEqual("2017-12-25", bucket_start("2017-12-31", 'week'))
+        self.assertEqual("2018-01-01", bucket_start("2018-01-31", 'month'))
+
+    def test_series(self):
+        acc = BucketedAccumulator('week').add_all([
+            {"timestamp_utc": "2018-01-28T23:59:59.000Z", "currency": "EUR", "amount": Decimal(1)},
+            {"timestamp_utc": "2018-01-29T00:00:00.000Z", "currency": "EUR", "amount": Decimal(2)},
+            {"timestamp_utc": "2018-02-01T10:00:00.000Z", "currency": "USD", "amount": Decimal(3)},
+            # not in the stored format - still bucketed by its UTC day
+            {"timestamp_utc": "2018-02-05T01:00:00+02:00", "currency": "EUR", "amount": Decimal(4)},
+        ])
+        acc.add_rollups([("2018-02-12", "EUR", Decimal(10), 2)])
+        self.assertEqual([
+            {"start": "2018-01-22", "statistics": {"EUR": 1}},
+            {"start": "2018-01-29", "statistics": {"EUR": 6, "USD": 3}},
+            {"start": "2018-02-12", "statistics": {"EUR": 10}},
+        ], acc.series())
+        self.assertEqual({"EUR": {"count": 2}, "USD": {"count": 1}}, acc.series(['count'])[1]['statistics'])
+
+    def test_must_be_ascending(self):
+        acc = BucketedAccumulator('day')
+        acc.add("2018-01-02T00:00:00.000Z", "EUR", Decimal(1))
+        with self.assertRaises(ValueError):
+            acc.add("2018-01-01T00:00:00.000Z", "EUR", Decimal(1))
+
+    def test_unknown_bucket(self):
+        with self.assertRaises(ValueError):
+            BucketedAccumulator('year')
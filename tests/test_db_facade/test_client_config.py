@@ -0,0 +1,38 @@
+import unittest
+
+from app import create_app
+from app.db_facade import db_facade
+from config import EnvironmentName, configs
+
+
+class TestClientConfig(unittest.TestCase):
+
+    def setUp(self):
+        self.config = configs[EnvironmentName.testing]
+        self.original_pool = self.config.DYNAMODB_MAX_POOL_CONNECTIONS
+
+    def tearDown(self):
+        self.config.DYNAMODB_MAX_POOL_CONNECTIONS = self.original_pool
+        create_app(EnvironmentName.testing)
+
+    def test_client_is_configured(self):
+        create_app(EnvironmentName.testing)
+        for client in (db_facade.raw_client, db_facade.raw_db.meta.client):
+            config = client.meta.config
+            self.assertEqual(self.config.DYNAMODB_MAX_POOL_CONNECTIONS, config.max_pool_connections)
+            self.assertEqual(self.config.DYNAMODB_RETRY_MODE, config.retries['mode'])
+            self.assertEqual(self.config.DYNAMODB_TCP_KEEPALIVE, config.tcp_keepalive)
+            self.assertLessEqual(config.read_timeout, self.config.DYNAMODB_READ_TIMEOUT)
+
+    def test_client_is_reused(self):
+        create_app(EnvironmentName.testing)
+        client, db = db_facade.raw_client, db_facade.raw_db
+
+        create_app(EnvironmentName.testing)
+        self.assertIs(client, db_facade.raw_client)
+        self.assertIs(db, db_facade.raw_db)
+
+        self.config.DYNAMODB_MAX_POOL_CONNECTIONS = self.original_pool + 1
+        create_app(EnvironmentName.testing)
+        self.assertIsNot(client, db_facade.raw_client)
+        self.assertEqual(self.original_pool + 1, db_facade.raw_client.meta.config.max_pool_connections)
@@ -2,9 +2,14 @@
 No actual tests here.
 Sets up the base test class, which will be subclassed by actual tests.
 """
+from unittest.mock import patch
+
 from tests.base_test import BaseTest
 
-from app.db_facade import db_facade, dynamodb_users_table_init_information
+from app.db_facade import db_facade, dynamodb_users_table_init_information, changelog_table_init_information, \
+    rollups_table_init_information
+from app.db_facade.changelog import ChangeLog
+from app.db_facade.rollups import StatisticsRollups
 from app.db_facade.dynamodb.dynamo import create_table_sync, DELETE_table_sync, EMPTY_table_contents
 
 
@@ -20,24 +25,41 @@ class DbTestBase(BaseTest):
         create_table_sync(cls.raw_db, table_name=db_facade.EXPENSES_TABLE_NAME,
                           **dynamodb_users_table_init_information)
         cls.expenses_table = cls.raw_db.Table(db_facade.EXPENSES_TABLE_NAME)
+        create_table_sync(cls.raw_db, table_name=db_facade.CHANGELOG_TABLE_NAME, **changelog_table_init_information)
+        create_table_sync(cls.raw_db, table_name=db_facade.ROLLUPS_TABLE_NAME, **rollups_table_init_information)
 
     @classmethod
     def tearDownClass(cls):
         super(DbTestBase, cls).tearDownClass()
         DELETE_table_sync(cls.raw_db, table_name=db_facade.EXPENSES_TABLE_NAME)
+        DELETE_table_sync(cls.raw_db, table_name=db_facade.CHANGELOG_TABLE_NAME)
+        DELETE_table_sync(cls.raw_db, table_name=db_facade.ROLLUPS_TABLE_NAME)
 
     def setUp(self):
         super(DbTestBase, self).setUp()
-        EMPTY_table_contents(self.raw_db, table_name=db_facade.EXPENSES_TABLE_NAME, hash_key=db_facade.HASH_KEY,
-                             range_key=db_facade.RANGE_KEY)
-        self.expenses_table.reload()
+        self._empty_tables()
 
     def tearDown(self):
         super(DbTestBase, self).tearDown()
+        self._empty_tables()
+
+    def _empty_tables(self):
         EMPTY_table_contents(self.raw_db, table_name=db_facade.EXPENSES_TABLE_NAME, hash_key=db_facade.HASH_KEY,
                              range_key=db_facade.RANGE_KEY)
+        EMPTY_table_contents(self.raw_db, table_name=db_facade.CHANGELOG_TABLE_NAME, hash_key=ChangeLog.HASH_KEY,
+                             range_key=ChangeLog.RANGE_KEY)
+        EMPTY_table_contents(self.raw_db, table_name=db_facade.ROLLUPS_TABLE_NAME, hash_key=StatisticsRollups.HASH_KEY,
+                             range_key=StatisticsRollups.RANGE_KEY)
         self.expenses_table.reload()
 
+    def without_transactional_writes(self):
+        """
+        :return: context manager, in which the facade writes without the change log and the rollups - as by default in
+        production
+        """
+        return patch.multiple(self.facade, changelog_enabled=False, rollups_enabled=False, _changelog=None,
+                              _rollups=None)
+
     @staticmethod
     def withSeedDataDecorator(f):
 
@@ -67,3 +89,17 @@ class DbTestBase(BaseTest):
 
         self.seeded_expenses = valid_items
         self.expenses_table.reload()
+
+
+class WithoutTransactionalWritesMixin(object):
+    """
+    runs the tests of a DbTestBase subclass with the change log and the rollups off - as by default in production,
+    where the facade writes without transactions
+    """
+
+    def setUp(self):
+        super(WithoutTransactionalWritesMixin, self).setUp()
+        patcher = self.without_transactional_writes()
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        assert not self.facade._transactional_writes
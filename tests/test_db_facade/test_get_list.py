@@ -2,6 +2,7 @@ from tests.test_db_facade.test_db_base import DbTestBase
 
 from app.models.sample_expenses import sample_expenses
 from app.db_facade.misc import OrderingDirection
+from app.db_facade.facade import InvalidContinuationToken
 
 seed_data = DbTestBase.withSeedDataDecorator
 
@@ -67,3 +68,137 @@ class TestGetList(DbTestBase):
         )
         self.assertEqual(len(sample_expenses), len(batch_of_one))
         self.assertEqual(len(sample_expenses), len(batch_of_two))
+
+
+class TestGetListPage(DbTestBase):
+
+    @seed_data
+    def test_pages_through_all_items(self):
+        batch_size = 3
+        seen = []
+        token = None
+        while True:
+            expenses, token = self.facade.get_list_page(
+                None,
+                user_uid=self.firebase_uid,
+                property_name='timestamp_utc',
+                ordering_direction=OrderingDirection.desc,
+                batch_size=batch_size,
+                continuation_token=token)
+            self.assertLessEqual(len(expenses), batch_size)
+            seen.extend(expenses)
+            if not token:
+                break
+
+        expected = list(reversed(sample_expenses))
+        self.assertEqual([e['id'] for e in expected], [e['id'] for e in seen],
+                         "Every item must be returned exactly once and in order")
+
+    @seed_data
+    def test_token_bound_to_user_and_query(self):
+        _, token = self.facade.get_list_page(None, user_uid=self.firebase_uid, batch_size=2)
+        self.assertTrue(token)
+
+        with self.assertRaises(InvalidContinuationToken):
+            self.facade.get_list_page(None, user_uid='another user', batch_size=2, continuation_token=token)
+
+        with self.assertRaises(InvalidContinuationToken):
+            self.facade.get_list_page(None, user_uid=self.firebase_uid, batch_size=2,
+                                      ordering_direction=OrderingDirection.asc, continuation_token=token)
+
+        with self.assertRaises(InvalidContinuationToken):
+            self.facade.get_list_page(None, user_uid=self.firebase_uid, batch_size=2,
+                                      continuation_token=token[:-2] + 'xx')
+
+
+class TestGetListIndexes(DbTestBase):
+
+    @seed_data
+    def test_ordered_by_secondary_range_keys(self):
+        for property_name in ['id', 'timestamp_utc_created']:
+            for direction in OrderingDirection:
+                expenses = self.facade.get_list(
+                    None,
+                    user_uid=self.firebase_uid,
+                    property_name=property_name,
+                    ordering_direction=direction,
+                    batch_size=len(sample_expenses))
+
+                expected = sorted([e[property_name] for e in sample_expenses],
+                                  reverse=direction is OrderingDirection.desc)
+                self.assertEqual(expected, [e[property_name] for e in expenses],
+                                 "Expenses must be ordered by %s, %s" % (property_name, direction.name))
+
+    @seed_data
+    def test_start_from_secondary_range_key(self):
+        ids = sorted(e['id'] for e in sample_expenses)
+        expenses = self.facade.get_list(
+            ids[1],
+            user_uid=self.firebase_uid,
+            property_name='id',
+            ordering_direction=OrderingDirection.asc,
+            batch_size=len(sample_expenses))
+
+        self.assertEqual(ids[2:], [e['id'] for e in expenses])
+
+    @seed_data
+    def test_consumed_capacity_recorded_per_index(self):
+        from app.db_facade.table_schema import index_for_property
+        self.facade.capacity_meter.reset()
+        for property_name in index_for_property:
+            self.facade.get_list(None, user_uid=self.firebase_uid, property_name=property_name, batch_size=5)
+
+        recorded = self.facade.capacity_meter.snapshot()
+        for index_name in [i for i in index_for_property.values() if i]:
+            self.assertIn(index_name, recorded)
+            self.assertEqual(1, recorded[index_name]['requests'])
+
+
+class TestGetListLowLevel(DbTestBase):
+
+    def tearDown(self):
+        self.facade.get_list_low_level = self.app.config['GET_LIST_LOW_LEVEL_CLIENT']
+        super(TestGetListLowLevel, self).tearDown()
+
+    def _all_pages(self, low_level, property_name, ordering_direction, start_from=None):
+        self.facade.get_list_low_level = low_level
+        pages, token = [], None
+        while True:
+            page, token = self.facade.get_list_page(start_from, user_uid=self.firebase_uid,
+                                                    property_name=property_name,
+                                                    ordering_direction=ordering_direction,
+                                                    batch_size=3, continuation_token=token)
+            pages.append(page)
+            if not token:
+                return pages
+
+    @seed_data
+    def test_same_pages_as_via_the_resource(self):
+        from app.db_facade.table_schema import index_for_property
+        for property_name in index_for_property:
+            for direction in OrderingDirection:
+                self.assertEqual(self._all_pages(False, property_name, direction),
+                                 self._all_pages(True, property_name, direction))
+
+        start_from = sorted(e['timestamp_utc'] for e in sample_expenses)[2]
+        self.assertEqual(self._all_pages(False, 'timestamp_utc', OrderingDirection.asc, start_from),
+                         self._all_pages(True, 'timestamp_utc', OrderingDirection.asc, start_from))
+
+    def test_decoding(self):
+        from app.db_facade.dynamodb.expense_wire_format import expense_from_wire
+        item = {"user_uid": {"S": "uid"}, "id": {"S": "1"}, "amount": {"N": "12.50"}, "currency": {"S": "EUR"},
+                "timestamp_utc": {"S": "2018-01-04T22:44:30.652Z"},
+                "timestamp_utc_created": {"S": "2018-01-04T22:44:30.652Z"},
+                "timestamp_utc_updated": {"S": "2018-01-04T22:44:30.652Z"}}
+        expense = expense_from_wire(item)
+        self.assertEqual({"id": "1", "name": "", "amount": 12.5, "tags": [], "currency": "EUR",
+                          "timestamp_utc": "2018-01-04T22:44:30.652Z",
+                          "timestamp_utc_created": "2018-01-04T22:44:30.652Z",
+                          "timestamp_utc_updated": "2018-01-04T22:44:30.652Z"}, expense)
+
+        for number, expected in [("3", 3), ("3.0", 3), ("1E+2", 100), ("-0.5", -0.5)]:
+            amount = expense_from_wire({"amount": {"N": number}})['amount']
+            self.assertEqual(expected, amount)
+            self.assertIs(type(expected), type(amount))
+
+        self.assertEqual(["a", "b"], expense_from_wire({"tags": {"L": [{"S": "a"}, {"S": "b"}]}})['tags'])
@@ -0,0 +1,57 @@
+import json
+
+from app.db_facade.health import TableHealthCheck, TableStatus
+from tests.base_test import BaseTestWithHTTPMethodsMixin
+from tests.test_db_facade.test_db_base import DbTestBase
+
+
+class CountingClient(object):
+    def __init__(self, client):
+        self.client = client
+        self.describe_calls = 0
+
+    def describe_table(self, **kwargs):
+        self.describe_calls += 1
+        return self.client.describe_table(**kwargs)
+
+
+class TestTableHealthCheck(DbTestBase, BaseTestWithHTTPMethodsMixin):
+
+    def test_existing_table(self):
+        result = TableHealthCheck().check(self.facade.raw_client, self.facade.EXPENSES_TABLE_NAME)
+        self.assertEqual(TableStatus.active, result['status'])
+        self.assertTrue(result['ready'])
+        self.assertIsNotNone(result['provisioned_capacity']['read'])
+        self.assertIsNone(result['error'])
+
+    def test_missing_table(self):
+        result = TableHealthCheck().check(self.facade.raw_client, "no-such-table")
+        self.assertEqual(TableStatus.missing, result['status'])
+        self.assertFalse(result['ready'])
+
+    def test_result_is_cached(self):
+        now = [0]
+        client = CountingClient(self.facade.raw_client)
+        health = TableHealthCheck(ttl_seconds=30, clock=lambda: now[0])
+
+        health.check(client, self.facade.EXPENSES_TABLE_NAME)
+        now[0] = 29
+        self.assertEqual(29, health.check(client, self.facade.EXPENSES_TABLE_NAME)['age_seconds'])
+        self.assertEqual(1, client.describe_calls)
+
+        now[0] = 30
+        health.check(client, self.facade.EXPENSES_TABLE_NAME)
+        self.assertEqual(2, client.describe_calls)
+
+        health.check(client, self.facade.EXPENSES_TABLE_NAME, force=True)
+        health.invalidate()
+        health.check(client, self.facade.EXPENSES_TABLE_NAME)
+        self.assertEqual(4, client.describe_calls)
+
+    def test_endpoint(self):
+        self.facade.table_health.invalidate()
+        resp = self.get(url='api.health')
+        self.assertEqual(200, resp.status_code)
+        body = json.loads(resp.get_data(as_text=True))
+        self.assertEqual(self.facade.EXPENSES_TABLE_NAME, body['table'])
+        self.assertIn('consumed_capacity', body)
@@ -1,11 +1,15 @@
 from app.helpers.time import dt_from_utc_iso_str, utc_now_str
 from app.models.sample_expenses import sample_expenses
-from tests.test_db_facade.test_db_base import DbTestBase
+from tests.test_db_facade.test_db_base import DbTestBase, WithoutTransactionalWritesMixin
 from dateutil.parser import parse
 
-from app.db_facade.facade import PersistFailed, ItemWithSameRangeKeyExists
+from unittest.mock import patch
+
+from botocore.exceptions import ClientError
+
+from app.db_facade.facade import PersistFailed, ItemWithSameRangeKeyExists, DynamodbThroughputExhausted
 from app.models.expense_validation import Validator
-from tests.common_methods import SINGLE_EXPENSE
+from tests.common_methods import SINGLE_EXPENSE, generate_expenses
 
 seed_data = DbTestBase.withSeedDataDecorator
 
@@ -80,3 +84,69 @@ class TestPersist(DbTestBase):
         assert persisted['id'], last['id']
 
         self.assertEqual("", last['name'])
+
+
+class TestPersistWithoutTransactions(WithoutTransactionalWritesMixin, TestPersist):
+    pass
+
+
+class TestPersistMany(DbTestBase):
+
+    def _expenses(self, size):
+        expenses = generate_expenses(size, currencies=('EUR', 'USD'))
+        for exp in expenses:
+            exp['id'] = None
+        return expenses
+
+    def test_more_than_a_transaction(self):
+        expenses = self._expenses(30)
+        results = self.facade.persist_many(expenses, self.firebase_uid)
+
+        self.assertEqual(30, len(results))
+        for expense, persisted in zip(expenses, results):
+            self.assertTrue(Validator.validate_expense_simple(persisted))
+            self.assertIsNotNone(persisted['id'])
+            self.assertEqual(expense['timestamp_utc'], persisted['timestamp_utc'])
+        self.assertEqual(30, len({p['id'] for p in results}))
+        self.assertEqual(30, self.expenses_table.scan()['Count'])
+
+        changes, high_water_mark, _, _ = self.facade.changelog.changes_since(self.firebase_uid, 0, max_changes=100)
+        self.assertEqual(sorted(p['id'] for p in results), sorted(c['id'] for c in changes))
+        counts = {}
+        for _, currency, _, count in self.facade.rollups.read(self.firebase_uid, '2000-01-01', '2100-01-01'):
+            counts[currency] = counts.get(currency, 0) + count
+        self.assertEqual({'EUR': 15, 'USD': 15}, counts)
+
+    def test_a_failed_transaction(self):
+        transact_write_items = self.facade.raw_client.transact_write_items
+
+        def fail_first(**kwargs):
+            if mocked.call_count == 1:
+                raise ClientError({'Error': {'Code': 'InternalServerError', 'Message': ''}}, 'TransactWriteItems')
+            return transact_write_items(**kwargs)
+
+        expenses = self._expenses(30)
+        with patch.object(self.facade.raw_client, 'transact_write_items', side_effect=fail_first) as mocked:
+            results = self.facade.persist_many(expenses, self.firebase_uid)
+
+        failed = [r for r in results if isinstance(r, DynamodbThroughputExhausted)]
+        self.assertTrue(0 < len(failed) < 30, "only the expenses of the failed transaction aren't persisted")
+        self.assertEqual(30 - len(failed), self.expenses_table.scan()['Count'])
+
+    @seed_data
+    def test_same_range_key(self):
+        expenses = self._expenses(3)
+        expenses[1]['timestamp_utc'] = sample_expenses[0]['timestamp_utc']  # at rest
+        expenses[2]['timestamp_utc'] = expenses[0]['timestamp_utc']  # in the same request
+
+        results = self.facade.persist_many(expenses, self.firebase_uid)
+        self.assertTrue(Validator.validate_expense_simple(results[0]))
+        self.assertIsInstance(results[1], ItemWithSameRangeKeyExists)
+        self.assertIsInstance(results[2], ItemWithSameRangeKeyExists)
+        self.assertEqual(len(sample_expenses) + 1, self.expenses_table.scan()['Count'])
+
+    def test_fails_if_expense_is_with_id(self):
+        expenses = self._expenses(2)
+        expenses[1]['id'] = 'id'
+        self.assertRaises(ValueError, self.facade.persist_many, expenses, self.firebase_uid)
+        self.assertEqual(0, self.expenses_table.scan()['Count'])
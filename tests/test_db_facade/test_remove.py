@@ -1,9 +1,11 @@
-from tests.test_db_facade.test_db_base import DbTestBase
+from unittest.mock import patch
+
+from tests.test_db_facade.test_db_base import DbTestBase, WithoutTransactionalWritesMixin
 
 from app.db_facade.facade import NoExpenseWithThisId
 from app.helpers.time import utc_now_str
 from app.models.sample_expenses import sample_expenses
-from tests.common_methods import SINGLE_EXPENSE
+from tests.common_methods import SINGLE_EXPENSE, generate_expenses
 
 seed_data = DbTestBase.withSeedDataDecorator
 
@@ -64,3 +66,78 @@ class TestRemove(DbTestBase):
                                                property_value=None,
                                                user_uid='two')
         self.assertEqual(len(sample_expenses), len(expenses_of_two))
+
+
+class TestRemoveWithoutTransactions(WithoutTransactionalWritesMixin, TestRemove):
+    pass
+
+
+class TestRemoveMany(DbTestBase):
+
+    def _rollup_counts(self):
+        counts = {}
+        for _, currency, _, count in self.facade.rollups.read(self.firebase_uid, '2000-01-01', '2100-01-01'):
+            counts[currency] = counts.get(currency, 0) + count
+        return counts
+
+    def _persist(self, count):
+        return self.facade.persist_many([{**e, 'id': None} for e in generate_expenses(count)], self.firebase_uid)
+
+    def test_normal_usage(self):
+        persisted = self._persist(30)
+        to_remove = [{'id': e['id'], 'timestamp_utc': e['timestamp_utc']} for e in persisted[:27]]
+        to_remove.append({'id': 'boom', 'timestamp_utc': persisted[28]['timestamp_utc']})  # different id at rest
+        to_remove.append({'id': 'bam', 'timestamp_utc': utc_now_str()})  # nothing at rest
+
+        result = self.facade.remove_many(to_remove, self.firebase_uid)
+        self.assertEqual(sorted(e['id'] for e in to_remove[:27]), result['removed'])
+        self.assertEqual(['bam', 'boom'], result['missing'])
+        self.assertEqual([], result['unprocessed'])
+
+        remaining = self.facade.get_list(None, user_uid=self.firebase_uid, batch_size=25)
+        self.assertEqual({e['id'] for e in persisted[27:]}, {e['id'] for e in remaining})
+        self.assertEqual({'EUR': 3}, self._rollup_counts())
+        changes, _, _, _ = self.facade.changelog.changes_since(self.firebase_uid, 0, max_changes=100)
+        self.assertEqual(set(result['removed']), {c['id'] for c in changes if c['operation'] == 'remove'})
+
+    def test_without_transactional_writes(self):
+        with self.without_transactional_writes():
+            persisted = self._persist(30)
+            to_remove = [{'id': e['id'], 'timestamp_utc': e['timestamp_utc']} for e in persisted[:27]]
+            to_remove.append({'id': 'boom', 'timestamp_utc': persisted[28]['timestamp_utc']})
+
+            # deleted via BatchWriteItem
+            with patch.object(self.facade.raw_client, 'transact_write_items',
+                              side_effect=AssertionError("no transaction is needed")):
+                result = self.facade.remove_many(to_remove, self.firebase_uid)
+        self.assertEqual(sorted(e['id'] for e in persisted[:27]), result['removed'])
+        self.assertEqual(['boom'], result['missing'])
+        self.assertEqual([], result['unprocessed'])
+
+        remaining = self.facade.get_list(None, user_uid=self.firebase_uid, batch_size=25)
+        self.assertEqual({e['id'] for e in persisted[27:]}, {e['id'] for e in remaining})
+
+    def test_changed_after_it_was_read(self):
+        persisted = self._persist(3)
+        changed_amount, replaced = persisted[0], persisted[1]
+        companions = self.facade._change_log_companions
+
+        def change_concurrently(*args, **kwargs):
+            # after the expenses were read, one is updated and another is replaced by a new expense
+            if mocked.call_count == 1:
+                with patch.object(self.facade, '_change_log_companions', companions):
+                    self.facade.update({**changed_amount, 'amount': 1000}, changed_amount, self.firebase_uid)
+                    self.facade.remove(replaced, self.firebase_uid)
+                    self.facade.persist({**replaced, 'id': None}, self.firebase_uid)
+            return companions(*args, **kwargs)
+
+        to_remove = [{'id': e['id'], 'timestamp_utc': e['timestamp_utc']} for e in persisted]
+        with patch.object(self.facade, '_change_log_companions', side_effect=change_concurrently) as mocked:
+            result = self.facade.remove_many(to_remove, self.firebase_uid)
+        self.assertEqual(sorted([changed_amount['id'], persisted[2]['id']]), result['removed'],
+                         "the changed expense is read again, and removed")
+        self.assertEqual([replaced['id']], result['missing'])
+
+        remaining = self.facade.get_list(None, user_uid=self.firebase_uid)
+        self.assertEqual([replaced['timestamp_utc']], [e['timestamp_utc'] for e in remaining])
+        self.assertEqual({'EUR': 1}, self._rollup_counts(), "the rollups are updated with the amount at rest")
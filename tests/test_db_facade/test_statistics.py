@@ -1,6 +1,8 @@
 from datetime import datetime as dt, timezone as tz, timedelta as td
+from unittest.mock import patch
 
 from tests.test_db_facade.test_db_base import DbTestBase
+from app.db_facade.rollups import day_of
 from app.helpers.time import utc_now_str, ensure_ts_str_ends_with_z
 from app.models.sample_expenses import sample_expenses
 
@@ -79,3 +81,195 @@ class TestStatistics(DbTestBase):
         )
 
         self.assertEqual({}, result, 'to_dt is an exclusive boundary, from_dt is inclusive')
+
+
+class TestStatisticsRollups(DbTestBase):
+
+    def _persist(self, exp, days_ago, amount, currency):
+        exp = exp.copy()
+        exp['id'] = None
+        exp['amount'] = amount
+        exp['currency'] = currency
+        exp['timestamp_utc'] = ensure_ts_str_ends_with_z((now - td(days=days_ago)).isoformat())
+        return self.facade.persist(exp, self.firebase_uid)
+
+    def _statistics_for_days(self, days):
+        today = dt(now.year, now.month, now.day, tzinfo=tz.utc)
+        return self.facade.statistics(
+            from_dt=ensure_ts_str_ends_with_z((today - td(days=days)).isoformat()),
+            to_dt=ensure_ts_str_ends_with_z(today.isoformat()),
+            user_uid=self.firebase_uid)
+
+    def test_whole_days_are_read_from_rollups(self):
+        self._persist(exp1, days_ago=2, amount=10, currency='EUR')
+        self._persist(exp2, days_ago=2.01, amount=5.5, currency='EUR')
+        self._persist(exp3, days_ago=3, amount=1, currency='USD')
+
+        self.assertEqual({"EUR": 15.5, "USD": 1}, self._statistics_for_days(5))
+
+        # remove the expenses from the table, bypassing the facade - the rollups still have them
+        self._empty_expenses_table()
+        self.assertEqual({"EUR": 15.5, "USD": 1}, self._statistics_for_days(5))
+
+    def test_rollups_follow_updates_and_removals(self):
+        first = self._persist(exp1, days_ago=2, amount=10, currency='EUR')
+        second = self._persist(exp2, days_ago=3, amount=1, currency='USD')
+
+        changed_amount = first.copy()
+        changed_amount['amount'] = 20
+        self.facade.update(changed_amount, first, self.firebase_uid)
+        self.assertEqual({"EUR": 20, "USD": 1}, self._statistics_for_days(5))
+
+        moved = changed_amount.copy()
+        moved['timestamp_utc'] = ensure_ts_str_ends_with_z((now - td(days=10)).isoformat())
+        moved['currency'] = 'BGN'
+        self.facade.update(moved, changed_amount, self.firebase_uid)
+        self.assertEqual({"USD": 1}, self._statistics_for_days(5))
+        self.assertEqual({"USD": 1, "BGN": 20}, self._statistics_for_days(15))
+
+        self.facade.remove(second, self.firebase_uid)
+        self.assertEqual({}, self._statistics_for_days(5))
+
+    def test_rollups_written_with_the_expense(self):
+        missing_table = {"Update": {"TableName": "no-such-table", "Key": {"user_uid": {"S": self.firebase_uid}},
+                                    "UpdateExpression": "ADD version :one",
+                                    "ExpressionAttributeValues": {":one": {"N": "1"}}}}
+        with patch.object(self.facade.rollups, 'update_operations', return_value=[missing_table]):
+            with self.assertRaises(Exception):
+                self._persist(exp1, days_ago=2, amount=10, currency='EUR')
+        self.assertEqual([], self.facade.get_list(property_value=None, user_uid=self.firebase_uid),
+                         "the expense isn't written without its rollup update")
+
+    def test_rebuild(self):
+        persisted = [self._persist(exp1, days_ago=2, amount=10, currency='EUR'),
+                     self._persist(exp2, days_ago=2.01, amount=5, currency='USD'),
+                     self._persist(exp3, days_ago=3, amount=1, currency='EUR')]
+        days = {day_of(exp['timestamp_utc']) for exp in persisted}
+        stale_day = day_of(ensure_ts_str_ends_with_z((now - td(days=4)).isoformat()))
+        for day in days | {stale_day}:
+            self.facade.rollups.table.put_item(Item={"user_uid": self.firebase_uid, "day": day,
+                                                     "sum_EUR": 100, "count_EUR": 1, "version": 1})
+
+        self.assertEqual([], self.facade.rebuild_rollups(self.firebase_uid, sorted(days | {stale_day})))
+        self.assertEqual({"EUR": 11, "USD": 5}, self._statistics_for_days(5))
+        self.assertEqual(sorted(days), list(self.facade.rollups.days(self.firebase_uid)))
+
+    def test_rebuild_while_the_expenses_change(self):
+        day = day_of(self._persist(exp1, days_ago=2, amount=10, currency='EUR')['timestamp_utc'])
+        expenses_of_day = self.facade._expenses_of_day
+
+        def persist_concurrently(user_uid, day):
+            read = list(expenses_of_day(user_uid, day))
+            if mocked.call_count == 1:
+                # after the rollup was read, another expense is persisted on the same day
+                self.facade.persist({**exp2, 'id': None, 'amount': 5, 'currency': 'EUR',
+                                     'timestamp_utc': day + 'T00:00:00.000Z'}, self.firebase_uid)
+            return read
+
+        with patch.object(self.facade, '_expenses_of_day', side_effect=persist_concurrently) as mocked:
+            self.assertEqual([], self.facade.rebuild_rollups(self.firebase_uid, [day]))
+        self.assertEqual(2, mocked.call_count, "the rollup is rebuilt again, with the new expense")
+        self.assertEqual({"EUR": 15}, self._statistics_for_days(5))
+
+    def test_partial_days_combined_with_rollups(self):
+        self._persist(exp1, days_ago=1, amount=1, currency='EUR')
+        self._persist(exp2, days_ago=3, amount=2, currency='EUR')
+        self._persist(exp3, days_ago=6, amount=4, currency='EUR')
+
+        result = self.facade.statistics(
+            from_dt=ensure_ts_str_ends_with_z((now - td(days=6, minutes=1)).isoformat()),
+            to_dt=ensure_ts_str_ends_with_z((now - td(days=1, minutes=-1)).isoformat()),
+            user_uid=self.firebase_uid)
+        self.assertEqual({"EUR": 7}, result)
+
+    def test_buckets(self):
+        self._persist(exp1, days_ago=1, amount=1, currency='EUR')
+        self._persist(exp2, days_ago=3, amount=2, currency='EUR')
+        self._persist(exp3, days_ago=3.01, amount=4, currency='USD')
+        self._persist(exp4, days_ago=40, amount=8, currency='EUR')
+
+        def day(days_ago):
+            return (now - td(days=days_ago)).date()
+
+        from_dt = ensure_ts_str_ends_with_z((now - td(days=45)).isoformat())
+        to_dt = ensure_ts_str_ends_with_z(now.isoformat())
+        daily = self.facade.statistics(from_dt=from_dt, to_dt=to_dt, user_uid=self.firebase_uid, bucket='day')
+        self.assertEqual([day(40).isoformat(), day(3).isoformat(), day(1).isoformat()],
+                         [b['start'] for b in daily])
+        self.assertEqual([{"EUR": 8}, {"EUR": 2, "USD": 4}, {"EUR": 1}], [b['statistics'] for b in daily])
+
+        monthly = self.facade.statistics(from_dt=from_dt, to_dt=to_dt, user_uid=self.firebase_uid, bucket='month',
+                                         aggregates=['total', 'count', 'min'])
+        self.assertEqual(sorted({day(d).replace(day=1).isoformat() for d in (40, 3, 1)}),
+                         [b['start'] for b in monthly])
+        total = sum(b['statistics']['EUR']['count'] for b in monthly)
+        self.assertEqual(3, total)
+        # min isn't additive - the series is computed from the expenses, not from the rollups
+        self.assertTrue(all(b['statistics']['EUR']['min'] is not None for b in monthly if 'EUR' in b['statistics']))
+
+    def test_home_currency(self):
+        from app.helpers.fx_rates import get_rate_table, NoFxRate
+        self._persist(exp1, days_ago=1, amount=10, currency='EUR')
+        self._persist(exp2, days_ago=3, amount=20, currency='USD')
+
+        from_dt = ensure_ts_str_ends_with_z((now - td(days=5)).isoformat())
+        to_dt = ensure_ts_str_ends_with_z(now.isoformat())
+        result = self.facade.statistics(from_dt=from_dt, to_dt=to_dt, user_uid=self.firebase_uid, home_currency='EUR')
+        rates = get_rate_table(self.facade.fx_rates_file)
+        total, _ = rates.normalise({"EUR": 10, "USD": 20}, 'EUR')
+        self.assertEqual({"EUR": 10, "USD": 20}, result['by_currency'])
+        self.assertEqual(round(float(total), 2), result['home_currency']['total'])
+        self.assertEqual(rates.version, result['home_currency']['fx_rates_version'])
+
+        series = self.facade.statistics(from_dt=from_dt, to_dt=to_dt, user_uid=self.firebase_uid, bucket='day',
+                                        home_currency='EUR')
+        usd_in_eur, _ = rates.normalise({"USD": 20}, 'EUR')
+        self.assertEqual([round(float(usd_in_eur), 2), 10], [b['home_currency']['total'] for b in series])
+
+        with self.assertRaises(NoFxRate):
+            self.facade.statistics(from_dt=from_dt, to_dt=to_dt, user_uid=self.firebase_uid, home_currency='XAU')
+
+    def _empty_expenses_table(self):
+        from app.db_facade.dynamodb.dynamo import EMPTY_table_contents
+        EMPTY_table_contents(self.raw_db, table_name=self.facade.EXPENSES_TABLE_NAME, hash_key=self.facade.HASH_KEY,
+                             range_key=self.facade.RANGE_KEY)
+
+
+class TestStatisticsPaging(DbTestBase):
+
+    def test_all_pages_are_read(self):
+        from boto3.dynamodb.conditions import Key
+        self.seedData(firebase_uid=self.firebase_uid)
+
+        pages = list(self.facade._iter_query_pages({
+            "KeyConditionExpression": Key('user_uid').eq(self.firebase_uid),
+            "Limit": 3
+        }))
+        self.assertEqual(len(sample_expenses), sum(len(page) for page in pages))
+        self.assertGreater(len(pages), 1)
+
+    def test_page_budget(self):
+        from app.db_facade.facade import QueryPageBudgetExhausted
+        self.seedData(firebase_uid=self.firebase_uid, items=[exp1, exp2])
+        original = self.facade.statistics_max_pages
+        self.facade.statistics_max_pages = 0
+        try:
+            with self.assertRaises(QueryPageBudgetExhausted):
+                self.facade.statistics(from_dt=ensure_ts_str_ends_with_z((now - td(hours=3)).isoformat()),
+                                       to_dt=ensure_ts_str_ends_with_z(now.isoformat()),
+                                       user_uid=self.firebase_uid)
+        finally:
+            self.facade.statistics_max_pages = original
+
+    def test_aggregates(self):
+        self.seedData(firebase_uid=self.firebase_uid, items=[exp1, exp2, exp3, exp4])
+        result = self.facade.statistics(from_dt=ensure_ts_str_ends_with_z((now - td(hours=3)).isoformat()),
+                                        to_dt=ensure_ts_str_ends_with_z(now.isoformat()),
+                                        user_uid=self.firebase_uid,
+                                        aggregates=['total', 'count', 'min', 'max'])
+        self.assertEqual({
+            "EUR": {"total": exp1['amount'] + exp2['amount'], "count": 2,
+                    "min": min(exp1['amount'], exp2['amount']), "max": max(exp1['amount'], exp2['amount'])},
+            "USD": {"total": exp3['amount'] + exp4['amount'], "count": 2,
+                    "min": min(exp3['amount'], exp4['amount']), "max": max(exp3['amount'], exp4['amount'])},
+        }, result)
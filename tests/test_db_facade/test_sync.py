@@ -1,3 +1,5 @@
+from unittest.mock import patch
+
 from flask import current_app
 
 from app.models.expense_validation import Validator
@@ -7,6 +9,9 @@ from datetime import datetime as dt, timedelta as td, timezone
 import uuid
 from app.helpers.time import utc_now_str, ensure_ts_str_ends_with_z
 from app.models.sample_expenses import sample_expenses
+from app.db_facade.misc import SyncLookup
+from app.db_facade.changelog import GAP_RETRY_AFTER
+from app.db_facade.facade import ItemWithSameRangeKeyExists
 
 seed_data = DbTestBase.withSeedDataDecorator
 
@@ -57,7 +62,42 @@ class TestSync(DbTestBase):
         self.assertEqual(0, len(response['to_update']), msg)
         self.assertEqual(0, len(response['to_add']), msg)
 
-    def _test_sync(self, items):
+    @seed_data
+    def test_batch_get_lookup(self):
+        self._test_sync(self.seeded_expenses, lookup=SyncLookup.batch_get, expect_additions=False)
+
+    def test_batch_get_lookup_more_than_one_batch(self):
+        items = generate_expenses(250)
+        self.seedData(firebase_uid=self.firebase_uid, items=items)
+        self._touch_expense_in_db(item=items[-1])
+
+        request = generate_sync_request(items)
+        response = self.facade.sync(sync_request_objs=request, user_uid=self.firebase_uid,
+                                    lookup=SyncLookup.batch_get)
+        self._valid_sync_response(response)
+        self.assertEqual([items[-1]['id']], [e['id'] for e in response['to_update']],
+                         "Even the oldest expense must be checked")
+        self.assertEqual([], response['to_remove'])
+        self.assertEqual([], response['to_add'])
+
+    def test_batch_get_lookup_by_id(self):
+        items = generate_expenses(3)
+        self.seedData(firebase_uid=self.firebase_uid, items=items)
+        moved = {**items[0], 'timestamp_utc': '2001-01-01T00:00:00.000Z'}
+        self.facade.update(moved, items[0], self.firebase_uid)
+
+        request = generate_sync_request(items)
+        request[str(uuid.uuid4())] = {'timestamp_utc': items[1]['timestamp_utc'],
+                                      'timestamp_utc_updated': items[1]['timestamp_utc_updated']}
+        response = self.facade.sync(sync_request_objs=request, user_uid=self.firebase_uid,
+                                    lookup=SyncLookup.batch_get)
+        self.assertEqual([(moved['id'], moved['timestamp_utc'])],
+                         [(e['id'], e['timestamp_utc']) for e in response['to_update']],
+                         "the expense, which isn't at its key anymore, is found by its id")
+        self.assertEqual([], response['to_remove'])
+        self.assertEqual(set(request) - {e['id'] for e in items}, set(response['unknown']))
+
+    def _test_sync(self, items, lookup=SyncLookup.query, expect_additions=True):
         """
         sanity checking for performing the sync operation.
         updates, removes and adds an item to the underlying db.
@@ -77,19 +117,25 @@ class TestSync(DbTestBase):
         new_expense = self._make_expense()
         # now verify that sync() returns correct result
         request = generate_sync_request(items)
-        sync_result = self.facade.sync(request, self.firebase_uid)
+        sync_result = self.facade.sync(request, self.firebase_uid, lookup=lookup)
         self._valid_sync_response(sync_result)
-        self.assertEqual(len(sync_result['to_add']), 1)
-        self.assertEqual(new_expense['id'], sync_result['to_add'][0]['id'])
+        if expect_additions:
+            self.assertEqual(len(sync_result['to_add']), 1)
+            self.assertEqual(new_expense['id'], sync_result['to_add'][0]['id'])
+        else:
+            self.assertEqual([], sync_result['to_add'])
         self.assertEqual(len(sync_result['to_update']), 1)
         self.assertEqual(to_update['id'], sync_result['to_update'][0]['id'])
-        self.assertEqual(len(sync_result['to_remove']), 1)
-        self.assertEqual(expense_to_delete['id'], sync_result['to_remove'][0])
+        # batch_get can't tell a removed expense from one it couldn't find
+        removed_key = 'unknown' if lookup is SyncLookup.batch_get else 'to_remove'
+        self.assertEqual([expense_to_delete['id']], sync_result[removed_key])
+        self.assertEqual([], sync_result['unknown' if removed_key == 'to_remove' else 'to_remove'])
 
     def _valid_sync_response(self, sync_result):
         self.assertIn("to_add", sync_result.keys())
         self.assertIn("to_remove", sync_result.keys())
         self.assertIn("to_update", sync_result.keys())
+        self.assertIn("unknown", sync_result.keys())
         self.assertTrue(all(Validator.validate_expense_simple(e) for e in sync_result['to_add']))
         self.assertTrue(all(Validator.validate_expense_simple(e) for e in sync_result['to_update']))
         self.assertTrue(all(Validator.validate_property(exp_id, 'id') for exp_id in sync_result['to_remove']))
@@ -137,3 +183,107 @@ class TestSync(DbTestBase):
             },
             ReturnValues="ALL_OLD"
         )
+
+
+class TestSyncChanges(DbTestBase):
+
+    def _persist(self, exp):
+        exp = exp.copy()
+        exp['id'] = None
+        return self.facade.persist(exp, self.firebase_uid)
+
+    def test_returns_only_changes_after_high_water_mark(self):
+        first, second, third = [self._persist(exp) for exp in sample_expenses[:3]]
+
+        changes = self.facade.sync_changes(since=0, user_uid=self.firebase_uid)
+        self.assertEqual(3, changes['high_water_mark'])
+        self.assertFalse(changes['has_more'])
+        self.assertEqual({first['id'], second['id'], third['id']}, {e['id'] for e in changes['to_add']})
+        self.assertTrue(all(Validator.validate_expense_simple(e) for e in changes['to_add']))
+
+        updated = first.copy()
+        updated['name'] = 'changed'
+        self.facade.update(updated, first, self.firebase_uid)
+        self.facade.remove(second, self.firebase_uid)
+
+        changes_after = self.facade.sync_changes(since=changes['high_water_mark'], user_uid=self.firebase_uid)
+        self.assertEqual(5, changes_after['high_water_mark'])
+        self.assertEqual([], changes_after['to_add'])
+        self.assertEqual(['changed'], [e['name'] for e in changes_after['to_update']])
+        self.assertEqual([second['id']], changes_after['to_remove'])
+
+        nothing_new = self.facade.sync_changes(since=changes_after['high_water_mark'], user_uid=self.firebase_uid)
+        self.assertEqual(changes_after['high_water_mark'], nothing_new['high_water_mark'])
+        self.assertEqual(([], [], []), (nothing_new['to_add'], nothing_new['to_update'], nothing_new['to_remove']))
+
+    def test_changes_to_the_same_expense_are_collapsed(self):
+        persisted = self._persist(sample_expenses[0])
+        updated = persisted.copy()
+        updated['amount'] = 1
+        self.facade.update(updated, persisted, self.firebase_uid)
+
+        changes = self.facade.sync_changes(since=0, user_uid=self.firebase_uid)
+        self.assertEqual([1], [e['amount'] for e in changes['to_add']], "Created after the mark - it's an addition")
+        self.assertEqual([], changes['to_update'])
+
+        self.facade.remove(updated, self.firebase_uid)
+        changes = self.facade.sync_changes(since=0, user_uid=self.firebase_uid)
+        self.assertEqual(([], [], []), (changes['to_add'], changes['to_update'], changes['to_remove']),
+                         "Created and removed after the mark - the client never had it")
+
+    def test_limited_response_size(self):
+        for exp in sample_expenses[:3]:
+            self._persist(exp)
+        original_size = self.facade.max_sync_changes_size
+        self.facade.max_sync_changes_size = 2
+        try:
+            changes = self.facade.sync_changes(since=0, user_uid=self.firebase_uid)
+            self.assertTrue(changes['has_more'])
+            self.assertEqual(2, len(changes['to_add']))
+
+            rest = self.facade.sync_changes(since=changes['high_water_mark'], user_uid=self.firebase_uid)
+            self.assertFalse(rest['has_more'])
+            self.assertEqual(1, len(rest['to_add']))
+        finally:
+            self.facade.max_sync_changes_size = original_size
+
+    def test_no_entry_without_the_change(self):
+        persisted = self._persist(sample_expenses[0])
+        with self.assertRaises(ItemWithSameRangeKeyExists):
+            self._persist(sample_expenses[0])
+        self._persist(sample_expenses[1])
+
+        # the sequence number of the failed persist is a gap. the reader waits for it, until it's old enough
+        changes = self.facade.sync_changes(since=0, user_uid=self.firebase_uid)
+        self.assertEqual([persisted['id']], [e['id'] for e in changes['to_add']])
+        self.assertEqual((1, False, GAP_RETRY_AFTER),
+                         (changes['high_water_mark'], changes['has_more'], changes['retry_after']))
+
+        with patch('app.db_facade.changelog.GAP_GRACE_SECONDS', 0):
+            changes = self.facade.sync_changes(since=changes['high_water_mark'], user_uid=self.firebase_uid)
+        self.assertEqual((3, None), (changes['high_water_mark'], changes['retry_after']))
+        self.assertEqual(1, len(changes['to_add']))
+
+    def test_entries_follow_the_order_of_the_changes(self):
+        persisted = self._persist(sample_expenses[0])
+        updated = persisted.copy()
+        updated['amount'] = 1
+        allocate = self.facade.changelog.allocate
+
+        def allocate_after_concurrent_update(*args, **kwargs):
+            # after the expense was read, another device changes it - and gets its sequence number first
+            if mocked.call_count == 1:
+                with patch.object(self.facade.changelog, 'allocate', allocate):
+                    concurrent = {**persisted, 'name': 'concurrent', 'timestamp_utc_updated': '2100-01-01T00:00:00Z'}
+                    self.facade.update(concurrent, persisted, self.firebase_uid)
+            return allocate(*args, **kwargs)
+
+        with patch.object(self.facade.changelog, 'allocate', side_effect=allocate_after_concurrent_update) as mocked:
+            self.facade.update(updated, persisted, self.firebase_uid)
+        self.assertEqual(2, mocked.call_count, "the update is retried, once the expense was read again")
+
+        at_rest = self.facade.get_list(property_value=None, user_uid=self.firebase_uid)
+        self.assertEqual([('concurrent', 1)], [(e['name'], e['amount']) for e in at_rest])
+        with patch('app.db_facade.changelog.GAP_GRACE_SECONDS', 0):
+            changes = self.facade.sync_changes(since=1, user_uid=self.firebase_uid)
+        self.assertEqual(at_rest, changes['to_update'], "the last entry has the expense as it is at rest")
@@ -0,0 +1,75 @@
+import time
+from datetime import datetime as dt, timezone as tz, timedelta as td
+
+from app.db_facade.changelog import ChangeLog
+from app.helpers.time import ensure_ts_str_ends_with_z
+from app.helpers.time_budget import TimeBudget, TimeBudgetExhausted, set_current_budget
+from app.models.sample_expenses import sample_expenses
+from tests.test_db_facade.test_db_base import DbTestBase
+
+
+class PagedTable(object):
+    """
+    stand-in for the change log table. each query returns a single entry and a LastEvaluatedKey
+    """
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.queries = 0
+
+    def query(self, **kwargs):
+        self.queries += 1
+        entry = {'seq': self.queries, 'recorded_at': 0}
+        response = {'Items': [entry]}
+        if self.queries < self.pages:
+            response['LastEvaluatedKey'] = entry
+        return response
+
+
+class TestTimeBudget(DbTestBase):
+
+    def tearDown(self):
+        set_current_budget(None)
+        super(TestTimeBudget, self).tearDown()
+
+    def _spent_budget(self):
+        return TimeBudget(0)
+
+    def test_nothing_is_written_without_time(self):
+        exp = sample_expenses[0].copy()
+        exp['id'] = None
+        set_current_budget(self._spent_budget())
+        with self.assertRaises(TimeBudgetExhausted):
+            self.facade.persist(exp, self.firebase_uid)
+
+        set_current_budget(None)
+        self.assertEqual(0, self.expenses_table.scan()['Count'])
+
+    def test_reads_stop(self):
+        now = dt.now(tz.utc)
+        set_current_budget(self._spent_budget())
+        with self.assertRaises(TimeBudgetExhausted):
+            self.facade.statistics(from_dt=ensure_ts_str_ends_with_z((now - td(hours=1)).isoformat()),
+                                   to_dt=ensure_ts_str_ends_with_z(now.isoformat()),
+                                   user_uid=self.firebase_uid)
+        with self.assertRaises(TimeBudgetExhausted):
+            self.facade.get_list(property_value=None, user_uid=self.firebase_uid)
+        with self.assertRaises(TimeBudgetExhausted):
+            list(self.facade._iter_query_pages({}))
+
+    def test_unlimited_outside_of_requests(self):
+        self.assertEqual([], self.facade.get_list(property_value=None, user_uid=self.firebase_uid))
+
+    def test_change_log_returns_partial_results(self):
+        table = PagedTable(pages=5)
+        budget = TimeBudget(60)
+        log = ChangeLog(table)
+
+        entries, high_water_mark, has_more, _ = log.changes_since('uid', 0, max_changes=100, time_budget=budget)
+        self.assertEqual((5, 5, False), (len(entries), high_water_mark, has_more))
+
+        table.queries = 0
+        budget = TimeBudget(0.05)
+        time.sleep(0.05)
+        entries, high_water_mark, has_more, _ = log.changes_since('uid', 0, max_changes=100, time_budget=budget)
+        self.assertEqual((1, 1, True), (len(entries), high_water_mark, has_more))
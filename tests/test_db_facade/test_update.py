@@ -1,7 +1,7 @@
 from app.helpers.time import utc_now_str
-from tests.test_db_facade.test_db_base import DbTestBase
+from tests.test_db_facade.test_db_base import DbTestBase, WithoutTransactionalWritesMixin
 
-from app.db_facade.facade import NoExpenseWithThisId, sanitize_expense
+from app.db_facade.facade import NoExpenseWithThisId, ItemWithSameRangeKeyExists, sanitize_expense
 from app.models.expense_validation import Validator
 from app.models.sample_expenses import sample_expenses
 
@@ -114,3 +114,114 @@ class TestUpdate(DbTestBase):
         assert updated_newest_from_db['id'] == to_update['id']
 
         self.assertEqual("", updated_newest_from_db['name'])
+
+
+class TestTwoPhaseUpdate(DbTestBase):
+
+    def _rollups(self):
+        return sorted((day, currency, float(total), count) for day, currency, total, count in
+                      self.facade.rollups.read(self.firebase_uid, '2000-01-01', '2100-01-01'))
+
+    def _persist(self, **changes):
+        return self.facade.persist({**sample_expenses[0], 'id': None, **changes}, self.firebase_uid)
+
+    def test_moves_the_expense_atomically(self):
+        persisted = self._persist(amount=10)
+        updated = {**persisted, 'timestamp_utc': '2018-02-01T10:00:00.000Z', 'amount': 5}
+        self.facade.update(updated, persisted, self.firebase_uid)
+
+        items = self.expenses_table.scan()['Items']
+        self.assertEqual([(updated['id'], updated['timestamp_utc'])], [(i['id'], i['timestamp_utc']) for i in items])
+        self.assertEqual([('2018-02-01', persisted['currency'], 5.0, 1)],
+                         [r for r in self._rollups() if r[3]])
+
+    def test_stale_previous_state(self):
+        """
+        the client's previous state has a different amount than the expense at rest. the rollups must use the latter
+        """
+        persisted = self._persist(amount=10)
+        stale = {**persisted, 'amount': 7}
+        updated = {**persisted, 'timestamp_utc': '2018-02-01T10:00:00.000Z'}
+        self.facade.update(updated, stale, self.firebase_uid)
+        self.assertEqual([('2018-02-01', persisted['currency'], 10.0, 1)], [r for r in self._rollups() if r[3]])
+
+    def test_cancellation_reasons(self):
+        first = self._persist()
+        second = self._persist(timestamp_utc='2018-02-01T10:00:00.000Z')
+
+        moved_onto_second = {**first, 'timestamp_utc': second['timestamp_utc']}
+        self.assertRaises(ItemWithSameRangeKeyExists, self.facade.update, moved_onto_second, first, self.firebase_uid)
+
+        other_id = {**first, 'id': 'boom', 'timestamp_utc': '2018-03-01T10:00:00.000Z'}
+        self.assertRaises(NoExpenseWithThisId, self.facade.update, other_id, {**first, 'id': 'boom'},
+                          self.firebase_uid)
+
+        not_at_rest = {**first, 'timestamp_utc': '2017-01-01T10:00:00.000Z'}
+        self.assertRaises(NoExpenseWithThisId, self.facade.update, {**not_at_rest, 'timestamp_utc': utc_now_str()},
+                          not_at_rest, self.firebase_uid)
+        self.assertEqual(2, self.expenses_table.scan()['Count'])
+
+
+class TestPartialUpdate(DbTestBase):
+
+    def _persist(self):
+        return self.facade.persist({**sample_expenses[0], 'id': None, 'name': 'name', 'tags': ['a']},
+                                   self.firebase_uid)
+
+    def _at_rest(self, expense):
+        return self.expenses_table.get_item(Key={'user_uid': self.firebase_uid,
+                                                 'timestamp_utc': expense['timestamp_utc']},
+                                            ConsistentRead=True)['Item']
+
+    def test_only_changed_properties_are_written(self):
+        persisted = self._persist()
+        # changed at rest, after the client has read the expense
+        self.expenses_table.update_item(Key={'user_uid': self.firebase_uid,
+                                             'timestamp_utc': persisted['timestamp_utc']},
+                                        UpdateExpression="SET currency = :c", ExpressionAttributeValues={":c": "BGN"})
+
+        updated = self.facade.update({**persisted, 'name': '', 'amount': 3}, persisted, self.firebase_uid)
+        at_rest = self._at_rest(persisted)
+        self.assertNotIn('name', at_rest)
+        self.assertEqual(3, at_rest['amount'])
+        self.assertEqual('BGN', at_rest['currency'])
+        self.assertEqual(['a'], at_rest['tags'])
+        self.assertEqual({**persisted, 'name': '', 'amount': 3, 'currency': 'BGN',
+                          'timestamp_utc_updated': at_rest['timestamp_utc_updated']}, updated)
+
+    def test_patch(self):
+        persisted = self._persist()
+        patched = self.facade.patch(persisted['id'], persisted['timestamp_utc'], persisted['timestamp_utc_updated'],
+                                    {'tags': [], 'amount': 1.5}, self.firebase_uid)
+        self.assertTrue(Validator.validate_expense_simple(patched))
+        self.assertEqual({**persisted, 'tags': [], 'amount': 1.5,
+                          'timestamp_utc_updated': patched['timestamp_utc_updated']}, patched)
+        self.assertNotIn('tags', self._at_rest(persisted))
+        if self.facade.rollups:
+            self.assertEqual([1.5], [float(total) for _, _, total, _ in
+                                     self.facade.rollups.read(self.firebase_uid, '2000-01-01', '2100-01-01')])
+
+    def test_patch_conflicts(self):
+        from app.db_facade.facade import ExpenseChangedConcurrently
+        persisted = self._persist()
+        self.facade.patch(persisted['id'], persisted['timestamp_utc'], persisted['timestamp_utc_updated'],
+                          {'name': 'first'}, self.firebase_uid)
+
+        with self.assertRaises(ExpenseChangedConcurrently):
+            self.facade.patch(persisted['id'], persisted['timestamp_utc'], persisted['timestamp_utc_updated'],
+                              {'name': 'second'}, self.firebase_uid)
+        with self.assertRaises(NoExpenseWithThisId):
+            self.facade.patch('boom', persisted['timestamp_utc'], persisted['timestamp_utc_updated'],
+                              {'name': 'second'}, self.firebase_uid)
+        with self.assertRaises(ValueError):
+            self.facade.patch(persisted['id'], persisted['timestamp_utc'], persisted['timestamp_utc_updated'],
+                              {'id': 'other'}, self.firebase_uid)
+        self.assertEqual('first', self._at_rest(persisted)['name'])
+
+
+class TestUpdateWithoutTransactions(WithoutTransactionalWritesMixin, TestUpdate):
+    pass
+
+
+class TestPartialUpdateWithoutTransactions(WithoutTransactionalWritesMixin, TestPartialUpdate):
+    pass
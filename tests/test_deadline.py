@@ -0,0 +1,136 @@
+import signal
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from botocore.exceptions import ClientError, ReadTimeoutError
+
+from app.helpers.time_budget import TimeBudget, TimeBudgetExhausted, retries_within_budget, set_current_budget
+from app.helpers.utils import deadline, TimedOutExc
+
+
+@deadline(0.05, "too slow")
+def slow():
+    time.sleep(1)
+
+
+@deadline(1)
+def fast(x):
+    return x
+
+
+@deadline(1)
+def failing():
+    raise KeyError("boom")
+
+
+class TestDeadline(unittest.TestCase):
+
+    def test_main_thread(self):
+        started = time.monotonic()
+        with self.assertRaisesRegex(TimedOutExc, "too slow"):
+            slow()
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual(1, fast(1))
+
+    def test_timer_cancelled_and_handler_restored(self):
+        previous = signal.getsignal(signal.SIGALRM)
+        with self.assertRaises(KeyError):
+            failing()
+        self.assertEqual((0.0, 0.0), signal.getitimer(signal.ITIMER_REAL))
+        self.assertIs(previous, signal.getsignal(signal.SIGALRM))
+
+    def test_other_thread(self):
+        outcome = []
+
+        def run():
+            try:
+                slow()
+            except TimedOutExc:
+                outcome.append('timed out')
+            outcome.append(fast(2))
+            try:
+                failing()
+            except KeyError:
+                outcome.append('raised')
+
+        worker = threading.Thread(target=run)
+        worker.start()
+        worker.join(5)
+        self.assertEqual(['timed out', 2, 'raised'], outcome)
+
+
+class TestTimeBudget(unittest.TestCase):
+
+    def setUp(self):
+        self.now = [100.0]
+        self.clock = lambda: self.now[0]
+
+    def test_remaining(self):
+        budget = TimeBudget(3, clock=self.clock)
+        self.now[0] += 1.25
+        self.assertAlmostEqual(1.75, budget.remaining())
+        budget.ensure(1)
+        with self.assertRaises(TimeBudgetExhausted):
+            budget.ensure(2)
+        self.now[0] += 2
+        self.assertEqual(0, budget.remaining())
+        self.assertTrue(budget.expired())
+
+    def test_from_lambda_context(self):
+        context = SimpleNamespace(get_remaining_time_in_millis=lambda: 2500)
+        self.assertAlmostEqual(2.4, TimeBudget.from_lambda_context(context, clock=self.clock).remaining())
+
+    def test_boto_config(self):
+        config = TimeBudget(3, clock=self.clock).boto_config()
+        self.assertEqual(0.5, config.read_timeout)
+        self.assertEqual(2, config.retries['max_attempts'])
+
+        # the attempts, each up to connect + read timeout, must fit in the budget
+        config = TimeBudget(3, clock=self.clock).boto_config(connect_timeout=1, read_timeout=1)
+        self.assertEqual(0, config.retries['max_attempts'])
+
+        budget = TimeBudget(3, clock=self.clock)
+        self.now[0] += 2.5  # 0.5s left - a single attempt, which can't take longer
+        config = budget.boto_config()
+        self.assertEqual(0.25, config.read_timeout)
+        self.assertEqual(0.25, config.connect_timeout)
+        self.assertEqual(0, config.retries['max_attempts'])
+
+    def test_boto_config_unsupported_options(self):
+        from botocore.config import Config
+
+        # as with a botocore version, which knows neither tcp_keepalive nor the retry modes
+        options = {name: value for name, value in Config.OPTION_DEFAULTS.items() if name != 'tcp_keepalive'}
+        with patch.object(Config, 'OPTION_DEFAULTS', options), \
+                patch('app.helpers.time_budget._retry_modes_supported', return_value=False):
+            config = TimeBudget(3, clock=self.clock).boto_config(retry_mode='standard', tcp_keepalive=True,
+                                                                 max_pool_connections=5)
+        self.assertEqual({'max_attempts': 2}, config.retries)
+        self.assertEqual(5, config.max_pool_connections)
+
+    def test_retries_within_budget(self):
+        needs_retry = retries_within_budget(attempt_timeout=1)
+        self.assertIsNone(needs_retry(attempts=1), "outside of a request, botocore decides")
+
+        throttled = (SimpleNamespace(status_code=400),
+                     {'Error': {'Code': 'ProvisionedThroughputExceededException', 'Message': 'throttled'}})
+        ok = (SimpleNamespace(status_code=200), {})
+        operation = SimpleNamespace(name='Query')
+        budget = TimeBudget(3, clock=self.clock)
+        set_current_budget(budget)
+        try:
+            self.assertIsNone(needs_retry(attempts=1, response=throttled, operation=operation))
+            self.now[0] += 2.5
+            # another attempt wouldn't fit. botocore retries on any result but None, so the error is raised instead
+            with self.assertRaises(ClientError) as raised:
+                needs_retry(attempts=2, response=throttled, operation=operation)
+            self.assertEqual('ProvisionedThroughputExceededException', raised.exception.response['Error']['Code'])
+            timeout = ReadTimeoutError(endpoint_url='http://localhost')
+            with self.assertRaises(ReadTimeoutError):
+                needs_retry(attempts=2, caught_exception=timeout, operation=operation)
+            self.assertIsNone(needs_retry(attempts=2, response=ok, operation=operation))
+        finally:
+            set_current_budget(None)
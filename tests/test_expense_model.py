@@ -42,3 +42,69 @@ class TestExpenseModel(BaseTest):
         self.assertFalse(is_valid)
         self.assertIn('timestamp_utc', errs)
         self.assertIn('not a valid timestamp', errs)
+
+    def test_same_verdict_and_message_as_jsonschema(self):
+        from jsonschema import validate, ValidationError
+        from app.models.json_schema import expense_schema
+
+        def variant(**changes):
+            exp = valid_expense.copy()
+            exp.update(changes)
+            return exp
+
+        extra = variant(other=1)
+        missing_name = variant()
+        missing_name.pop('name')
+        candidates = [
+            valid_expense, variant(id=None), variant(amount=1.5), variant(amount=True), variant(amount="1"),
+            variant(name=None), variant(tags=["a", "a"]), variant(tags=["a"] * 11), variant(tags=[1]),
+            variant(tags=("a",)), variant(currency="eur"), variant(currency="EURO"), variant(timestamp_utc=None),
+            variant(timestamp_utc_updated="2017-10-29T09:09:21.853071"), extra, missing_name, [], None
+        ]
+        for exp in candidates:
+            is_valid, err_msg = Validator.validate_expense(exp)
+            try:
+                validate(exp, schema=expense_schema)
+                self.assertTrue(is_valid, exp)
+                self.assertEqual("", err_msg)
+            except ValidationError as err:
+                self.assertFalse(is_valid, exp)
+                self.assertTrue(err_msg.endswith(err.message), "%s - %s" % (exp, err_msg))
+
+    def test_validate_property(self):
+        cases = [
+            ('timestamp_utc', valid_expense['timestamp_utc'], True),
+            ('timestamp_utc', str(datetime.now()), False),
+            ('timestamp_utc_created', None, False),
+            ('id', None, True),
+            ('id', 1, False),
+            ('amount', 1.5, True),
+            ('amount', True, False),
+            ('currency', 'EUR', True),
+            ('currency', 'eur', False),
+            ('tags', ['a', 'b'], True),
+            ('tags', ['a', 'a'], False),
+        ]
+        for property_name, value, expected in cases:
+            self.assertEqual(expected, Validator.validate_property(value, property_name), (property_name, value))
+
+    def test_validate_many(self):
+        def variant(**changes):
+            exp = valid_expense.copy()
+            exp.update(changes)
+            return exp
+
+        missing_name = variant()
+        missing_name.pop('name')
+        expenses = [valid_expense, variant(tags=["a", "a"]), variant(id=None), variant(amount="1"), missing_name,
+                    variant(timestamp_utc_created=str(datetime.now())), None, variant(other=1), valid_expense,
+                    variant(tags=[["a"], ["a"]])]
+
+        expected = []
+        for i, exp in enumerate(expenses):
+            is_valid, err_msg = Validator.validate_expense(exp)
+            if not is_valid:
+                expected.append((i, err_msg))
+        self.assertEqual([1, 3, 4, 5, 6, 7, 9], [i for i, _ in expected])
+        self.assertEqual(expected, Validator.validate_many(iter(expenses)))
+        self.assertEqual([], Validator.validate_many([]))
@@ -12,6 +12,8 @@ from tests.common_methods import sample_expenses
 from tests.test_expenses_api import db_facade_path
 
 from app.expenses_api.views import MAX_BATCH_SIZE, db_facade
+from app.db_facade.facade import InvalidContinuationToken
+from flask import current_app
 from app.expenses_api.api_error_msgs import ApiError
 
 endpoint = 'expenses_api.get_expenses_list'
@@ -42,7 +44,7 @@ class TestGETExpensesList(BaseTest, BaseTestWithHTTPMethodsMixin, NoAuthenticati
         self.valid_request_args = valid_request_args
 
     def test_valid_request_returns_valid_response(self, mocked_db):
-        mocked_db.get_list.return_value = reversed_expenses[1:]
+        mocked_db.get_list_page.return_value = (reversed_expenses[1:], None)
         batch_size = len(reversed_expenses) - 1
 
         request_params = valid_request_args.copy()
@@ -98,7 +100,7 @@ class TestGETExpensesList(BaseTest, BaseTestWithHTTPMethodsMixin, NoAuthenticati
             }
         ]
         for args in invalid_args:
-            mocked_db.get_list.return_value = []
+            mocked_db.get_list_page.return_value = ([], None)
             raw_resp = self.get(url=endpoint, url_args={'start_id': start_from, 'batch_size': batch_size})
 
             self.assertEqual(raw_resp.status_code, 400, "args should have been rejected" + str(args))
@@ -106,8 +108,8 @@ class TestGETExpensesList(BaseTest, BaseTestWithHTTPMethodsMixin, NoAuthenticati
             self.assertIn("error", json_resp,
                           "error key missing from non-200 response")
             self.assertIn(ApiError.INVALID_QUERY_PARAMS, json_resp['error'])
-            self.assertFalse(mocked_db.get_list.called, "Shouldn't have been called")
-            mocked_db.get_list.reset_mock()
+            self.assertFalse(mocked_db.get_list_page.called, "Shouldn't have been called")
+            mocked_db.get_list_page.reset_mock()
 
     def test_with_too_big_batch_size(self, mocked_db):
         batch_size = 100 + MAX_BATCH_SIZE
@@ -122,13 +124,13 @@ class TestGETExpensesList(BaseTest, BaseTestWithHTTPMethodsMixin, NoAuthenticati
         self.assertIn("error", response_json, "error key missing from response")
         self.assertIn(ApiError.BATCH_SIZE_EXCEEDED, response_json['error'])
 
-        self.assertFalse(mocked_db.get_list.called)
+        self.assertFalse(mocked_db.get_list_page.called)
 
 
 @patch(db_facade_path, autospec=True)
 class TestGetExpensesListInteractionWithDbFacade(BaseTest, BaseTestWithHTTPMethodsMixin, NoAuthenticationMarkerMixin):
     def test_call_on_good_request(self, mocked_db: type(db_facade)):
-        mocked_db.get_list.return_value = []
+        mocked_db.get_list_page.return_value = ([], None)
         property_value = utc_now_str()
         property_name = 'timestamp_utc'
         id = 'asd'
@@ -141,16 +143,17 @@ class TestGetExpensesListInteractionWithDbFacade(BaseTest, BaseTestWithHTTPMetho
         }
         resp = self.get(url=endpoint, url_args=request_args)
 
-        self.assertEqual(1, mocked_db.get_list.call_count, 'The get list should have been called once')
+        self.assertEqual(1, mocked_db.get_list_page.call_count, 'The get list should have been called once')
 
-        call_args, actual_kwargs = mocked_db.get_list.call_args
+        call_args, actual_kwargs = mocked_db.get_list_page.call_args
         self.assertEqual(0, len(call_args))
         expected_kwargs = {
             'property_value': property_value,
             'property_name': property_name,
             "ordering_direction": OrderingDirection.desc,
             'batch_size': batch_size,
-            'user_uid': self.firebase_uid
+            'user_uid': self.firebase_uid,
+            'continuation_token': None
         }
         self.assertEqual(len(expected_kwargs), len(actual_kwargs))
 
@@ -159,3 +162,25 @@ class TestGetExpensesListInteractionWithDbFacade(BaseTest, BaseTestWithHTTPMetho
 
         self.assertEqual(200, resp.status_code)
         self.assertEqual('[]', resp.get_data(as_text=True))
+
+    def test_continuation_token_round_trip(self, mocked_db: type(db_facade)):
+        header_name = current_app.config['CONTINUATION_TOKEN_HEADER_NAME']
+        mocked_db.get_list_page.return_value = (reversed_expenses[:2], 'next page token')
+
+        resp = self.get(url=endpoint, url_args={'batch_size': 2})
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual('next page token', resp.headers[header_name])
+
+        mocked_db.get_list_page.return_value = ([], None)
+        resp = self.get(url=endpoint, url_args={'batch_size': 2, 'continuation_token': 'next page token'})
+        self.assertEqual(200, resp.status_code)
+        self.assertNotIn(header_name, resp.headers, "No header is expected on the last page")
+        _, actual_kwargs = mocked_db.get_list_page.call_args
+        self.assertEqual('next page token', actual_kwargs['continuation_token'])
+
+    def test_invalid_continuation_token(self, mocked_db: type(db_facade)):
+        mocked_db.get_list_page.side_effect = InvalidContinuationToken()
+
+        resp = self.get(url=endpoint, url_args={'continuation_token': 'tampered'})
+        self.assertEqual(400, resp.status_code)
+        self.assertIn(ApiError.INVALID_CONTINUATION_TOKEN, loads(resp.get_data(as_text=True))['error'])
@@ -3,6 +3,7 @@ from tests.test_expenses_api import db_facade_path
 from json import loads
 from unittest.mock import patch
 
+from app.db_facade.facade import ItemWithSameRangeKeyExists, DynamodbThroughputExhausted
 from app.expenses_api.api_error_msgs import ApiError
 from tests.base_test import BaseTest, BaseTestWithHTTPMethodsMixin, NoAuthenticationMarkerMixin
 from tests.common_methods import SINGLE_EXPENSE, Validator
@@ -41,6 +42,14 @@ class TestPersist(BaseTest, BaseTestWithHTTPMethodsMixin, NoAuthenticationMarker
         self.assertEqual(400, raw_resp.status_code)
         self.assertIn(ApiError.ID_PROPERTY_FORBIDDEN, raw_resp.get_data(as_text=True))
 
+    def test_facade_errors(self, mocked_db):
+        for exc, status_code, msg in [(ItemWithSameRangeKeyExists(), 409, ApiError.EXPENSE_WITH_SAME_TIMESTAMP_EXISTS),
+                                      (DynamodbThroughputExhausted(), 503, ApiError.OUT_OF_THROUGHPUT)]:
+            mocked_db.persist.side_effect = exc
+            raw_resp = self.post(url=endpoint, data=valid_payload)
+            self.assertEqual(status_code, raw_resp.status_code)
+            self.assertIn(msg, raw_resp.get_data(as_text=True))
+
     def test_fail_on_invalid_expense(self, _):
         raw_resp = self.post(url=endpoint, data={"id": 'a'})
 
@@ -60,3 +69,34 @@ class TestPersistUsesDbFacadeCorrectly(BaseTest, BaseTestWithHTTPMethodsMixin, N
         self.assertTrue(mocked_db.persist.called, "persist should have been called")
         args, kwargs = mocked_db.persist.call_args
         self.assertDictEqual(kwargs, {"expense": to_persist, "user_uid": self.firebase_uid})
+
+
+@patch(db_facade_path, autospec=True)
+class TestPersistMany(BaseTest, BaseTestWithHTTPMethodsMixin, NoAuthenticationMarkerMixin):
+    endpoint = 'expenses_api.persist_many'
+
+    def test_per_expense_results(self, mocked_db):
+        from app.db_facade.facade import ItemWithSameRangeKeyExists
+        persisted = SINGLE_EXPENSE.copy()
+        mocked_db.persist_many.return_value = [persisted, ItemWithSameRangeKeyExists()]
+
+        invalid = {**valid_payload, "amount": "1"}
+        payload = [valid_payload, invalid, SINGLE_EXPENSE, {**valid_payload, "name": "other"}]
+        raw_resp = self.post(url=self.endpoint, data=payload)
+        self.assertEqual(200, raw_resp.status_code)
+
+        results = loads(raw_resp.get_data(as_text=True))
+        self.assertEqual([200, 400, 400, 409], [r['status'] for r in results])
+        self.assertEqual(persisted, results[0]['expense'])
+        self.assertIn(ApiError.INVALID_EXPENSE, results[1]['error'])
+        self.assertEqual(ApiError.ID_PROPERTY_FORBIDDEN, results[2]['error'])
+        self.assertEqual(ApiError.EXPENSE_WITH_SAME_TIMESTAMP_EXISTS, results[3]['error'])
+
+        args, kwargs = mocked_db.persist_many.call_args
+        self.assertEqual([payload[0], payload[3]], kwargs['expenses'])
+
+    def test_invalid_payload(self, mocked_db):
+        for payload in [[], {}, [valid_payload] * (self.app.config['MAX_PERSIST_MANY_SIZE'] + 1)]:
+            raw_resp = self.post(url=self.endpoint, data=payload)
+            self.assertEqual(400, raw_resp.status_code)
+        self.assertFalse(mocked_db.persist_many.called)
@@ -1,7 +1,7 @@
 from tests.base_test import BaseTest, BaseTestWithHTTPMethodsMixin, NoAuthenticationMarkerMixin
 
 from unittest.mock import patch
-from app.db_facade.facade import NoExpenseWithThisId
+from app.db_facade.facade import NoExpenseWithThisId, DynamodbThroughputExhausted
 from app.expenses_api.views import db_facade
 from app.expenses_api.api_error_msgs import ApiError
 from app.models.sample_expenses import sample_expenses
@@ -37,6 +37,12 @@ class TestRemove(BaseTest, BaseTestWithHTTPMethodsMixin, NoAuthenticationMarkerM
 
         self.assertIn(ApiError.NO_EXPENSE_WITH_THIS_ID, raw_resp.get_data(as_text=True))
 
+    def test_503_if_out_of_throughput(self, mocked_db):
+        mocked_db.remove.side_effect = DynamodbThroughputExhausted()
+        raw_resp = self.post(url=endpoint, data=valid_payload)
+        self.assertEqual(503, raw_resp.status_code)
+        self.assertIn(ApiError.OUT_OF_THROUGHPUT, raw_resp.get_data(as_text=True))
+
     def test_400_on_invalid_expense(self, mocked_db):
         mocked_db.remove.side_effect = RuntimeError("Shouldn't be called")
 
@@ -63,3 +69,27 @@ class TestRemoveAndDbFacade(BaseTest, BaseTestWithHTTPMethodsMixin, NoAuthentica
             'expense': exp,
             'user_uid': self.firebase_uid
         }, call_kwargs)
+
+
+@patch(db_facade_path, autospec=True)
+class TestRemoveMany(BaseTest, BaseTestWithHTTPMethodsMixin, NoAuthenticationMarkerMixin):
+    endpoint = 'expenses_api.remove_many'
+
+    def test_normal_usage(self, mocked_db):
+        result = {"removed": [SINGLE_EXPENSE['id']], "missing": [], "unprocessed": []}
+        mocked_db.remove_many.return_value = result
+        payload = [{'id': SINGLE_EXPENSE['id'], 'timestamp_utc': SINGLE_EXPENSE['timestamp_utc']}]
+
+        raw_resp = self.post(url=self.endpoint, data=payload)
+        self.assertEqual(200, raw_resp.status_code)
+        self.assertEqual(result, raw_resp.get_json())
+        args, kwargs = mocked_db.remove_many.call_args
+        self.assertEqual({"expenses": payload, "user_uid": self.firebase_uid}, kwargs)
+
+    def test_invalid_payload(self, mocked_db):
+        valid = {'id': SINGLE_EXPENSE['id'], 'timestamp_utc': SINGLE_EXPENSE['timestamp_utc']}
+        for payload in [[], {}, [{**valid, 'id': None}], [{'id': 'a'}], [{**valid, 'timestamp_utc': 'now'}],
+                        [valid] * (self.app.config['MAX_REMOVE_MANY_SIZE'] + 1)]:
+            raw_resp = self.post(url=self.endpoint, data=payload)
+            self.assertEqual(400, raw_resp.status_code, payload)
+        self.assertFalse(mocked_db.remove_many.called)
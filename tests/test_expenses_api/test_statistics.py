@@ -42,3 +42,84 @@ class TestStatistics(BaseTest, BaseTestWithHTTPMethodsMixin, NoAuthenticationMar
         self.assertEqual(raw_resp.status_code, 400)
         self.assertIn(ApiError.MAXIMUM_TIME_WINDOW_EXCEEDED, raw_resp.get_data(as_text=True))
         self.assertFalse(mocked_db.statistics.called)
+
+    def test_page_budget_exhausted(self, mocked_db):
+        from app.db_facade.facade import QueryPageBudgetExhausted
+        mocked_db.statistics.side_effect = QueryPageBudgetExhausted()
+
+        raw_resp = self.get(url=endpoint, url_for_args=valid_url_args)
+
+        self.assertEqual(503, raw_resp.status_code)
+        self.assertIn(ApiError.TOO_MANY_EXPENSES_IN_WINDOW, raw_resp.get_data(as_text=True))
+
+    def test_aggregates(self, mocked_db):
+        mocked_db.statistics.return_value = {"BGN": {"total": 100, "count": 2}}
+
+        raw_resp = self.get(url=endpoint, url_for_args=valid_url_args, url_args={'aggregates': 'total,count'})
+        self.assertEqual(200, raw_resp.status_code)
+        _, kwargs = mocked_db.statistics.call_args
+        self.assertEqual(['total', 'count'], kwargs['aggregates'])
+
+        mocked_db.statistics.reset_mock()
+        raw_resp = self.get(url=endpoint, url_for_args=valid_url_args, url_args={'aggregates': 'total,median'})
+        self.assertEqual(400, raw_resp.status_code)
+        self.assertIn(ApiError.INVALID_AGGREGATES, raw_resp.get_data(as_text=True))
+        self.assertFalse(mocked_db.statistics.called)
+
+    def test_bucket(self, mocked_db):
+        mocked_result = [{"start": "2018-01-01", "statistics": {"BGN": 100}}]
+        mocked_db.statistics.return_value = mocked_result
+
+        raw_resp = self.get(url=endpoint, url_for_args=valid_url_args, url_args={'bucket': 'month'})
+        self.assertEqual(200, raw_resp.status_code)
+        self.assertEqual(mocked_result, json.loads(raw_resp.get_data(as_text=True)))
+        _, kwargs = mocked_db.statistics.call_args
+        self.assertEqual('month', kwargs['bucket'])
+
+        mocked_db.statistics.reset_mock()
+        raw_resp = self.get(url=endpoint, url_for_args=valid_url_args, url_args={'bucket': 'year'})
+        self.assertEqual(400, raw_resp.status_code)
+        self.assertIn(ApiError.INVALID_BUCKET, raw_resp.get_data(as_text=True))
+        self.assertFalse(mocked_db.statistics.called)
+
+    def test_home_currency(self, mocked_db):
+        from app.helpers.fx_rates import NoFxRate
+        mocked_db.statistics.return_value = {"by_currency": {"BGN": 100}, "home_currency": {"currency": "EUR"}}
+
+        raw_resp = self.get(url=endpoint, url_for_args=valid_url_args, url_args={'home_currency': 'EUR'})
+        self.assertEqual(200, raw_resp.status_code)
+        _, kwargs = mocked_db.statistics.call_args
+        self.assertEqual('EUR', kwargs['home_currency'])
+
+        mocked_db.statistics.side_effect = NoFxRate('XAU')
+        raw_resp = self.get(url=endpoint, url_for_args=valid_url_args, url_args={'home_currency': 'XAU'})
+        self.assertEqual(400, raw_resp.status_code)
+        self.assertIn(ApiError.INVALID_HOME_CURRENCY, raw_resp.get_data(as_text=True))
+
+    def test_out_of_time(self, mocked_db):
+        from app.helpers.time_budget import TimeBudgetExhausted
+        mocked_db.statistics.side_effect = TimeBudgetExhausted()
+
+        raw_resp = self.get(url=endpoint, url_for_args=valid_url_args)
+        self.assertEqual(503, raw_resp.status_code)
+        self.assertEqual(str(self.app.config['TIME_BUDGET_RETRY_AFTER']), raw_resp.headers['Retry-After'])
+        self.assertIn(ApiError.OUT_OF_TIME, raw_resp.get_data(as_text=True))
+
+    def test_budget_of_the_request(self, mocked_db):
+        from types import SimpleNamespace
+        from flask import url_for
+        from app.helpers.time_budget import current_budget
+        budgets = []
+        mocked_db.statistics.side_effect = lambda **kwargs: budgets.append(current_budget().remaining()) or {}
+
+        self.get(url=endpoint, url_for_args=valid_url_args)
+        self.assertLessEqual(budgets[-1], self.app.config['MAX_EXECUTION_TIME'])
+        self.assertGreater(budgets[-1], self.app.config['MAX_EXECUTION_TIME'] - 1)
+
+        # the lambda has less time left than MAX_EXECUTION_TIME
+        context = SimpleNamespace(get_remaining_time_in_millis=lambda: 1000)
+        self.client.get(url_for(endpoint, **valid_url_args, _external=True),
+                        headers=[(self.app.config['CUSTOM_AUTH_HEADER_NAME'], self.firebase_uid)],
+                        environ_overrides={'lambda.context': context})
+        self.assertLess(budgets[-1], 1)
+        self.assertIsNone(current_budget())
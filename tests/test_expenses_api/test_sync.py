@@ -7,6 +7,8 @@ from unittest.mock import patch, PropertyMock
 from app.db_facade.facade import db_facade as non_mocked_facade
 
 from app.db_facade.facade import DynamodbThroughputExhausted
+from app.db_facade.misc import SyncLookup
+from app.expenses_api.api_error_msgs import ApiError
 from app.helpers.time import utc_now_str
 from app.models.expense_validation import Validator
 from app.models.sample_expenses import sample_expenses
@@ -63,15 +65,28 @@ class TestSync(BaseTest, BaseTestWithHTTPMethodsMixin, NoAuthenticationMarkerMix
 
         requests = [
             (RuntimeError(), 500),
-            (DynamodbThroughputExhausted(), 413)
+            (DynamodbThroughputExhausted(), 503)
         ]
         for (err, expected_code) in requests:
             mocked_db.sync.side_effect = err
             raw_resp = self.post(url=endpoint, data=valid_payload)
             self.assertEqual(expected_code, raw_resp.status_code)
 
+    def test_batch_get_lookup(self, mocked_db):
+        type(mocked_db).max_sync_verify_request_size = PropertyMock(
+            return_value=non_mocked_facade.max_sync_verify_request_size)
+        mocked_db.sync.return_value = {'to_remove': [], 'to_add': [], 'to_update': []}
+
+        payload = generate_sync_request(generate_expenses(non_mocked_facade.max_sync_request_size + 1))
+        raw_resp = self.post(url=endpoint, data=payload, url_args={'lookup': 'batch_get'})
+        self.assertEqual(200, raw_resp.status_code)
+        _, kwargs = mocked_db.sync.call_args
+        self.assertIs(SyncLookup.batch_get, kwargs['lookup'])
+
+        raw_resp = self.post(url=endpoint, data=payload, url_args={'lookup': 'invalid'})
+        self.assertEqual(400, raw_resp.status_code)
+
     def test_exceeded_max_request_size(self, mocked_db):
-        from app.expenses_api.api_error_msgs import ApiError
         # https://docs.python.org/3/library/unittest.mock.html#unittest.mock.PropertyMock
         type(mocked_db).max_sync_request_size = PropertyMock(return_value=non_mocked_facade.max_sync_request_size)
 
@@ -82,3 +97,42 @@ class TestSync(BaseTest, BaseTestWithHTTPMethodsMixin, NoAuthenticationMarkerMix
 
         response = self.post(url=endpoint, data=payload)
         self.assertIn(ApiError.BATCH_SIZE_EXCEEDED % max_size, response.get_data(as_text=True))
+
+
+@patch(db_facade_path, autospec=True)
+class TestSyncChanges(BaseTest, BaseTestWithHTTPMethodsMixin, NoAuthenticationMarkerMixin):
+
+    def test_normal_usage(self, mocked_db):
+        mocked_db.sync_changes.return_value = {
+            'to_remove': ['some uuid'],
+            'to_add': [SINGLE_EXPENSE],
+            'to_update': [],
+            'high_water_mark': 10,
+            'has_more': False,
+            'retry_after': None
+        }
+        raw_resp = self.post(url=endpoint, data=None, url_args={'since': 5})
+        self.assertEqual(200, raw_resp.status_code)
+        self.assertEqual(10, loads(raw_resp.get_data(as_text=True))['high_water_mark'])
+        self.assertNotIn('Retry-After', raw_resp.headers)
+        mocked_db.sync_changes.assert_called_once_with(since=5, user_uid=self.firebase_uid)
+        self.assertFalse(mocked_db.sync.called)
+
+    def test_retry_after(self, mocked_db):
+        mocked_db.sync_changes.return_value = {'to_remove': [], 'to_add': [], 'to_update': [], 'high_water_mark': 5,
+                                               'has_more': False, 'retry_after': 1}
+        raw_resp = self.post(url=endpoint, data=None, url_args={'since': 5})
+        self.assertEqual(200, raw_resp.status_code)
+        self.assertEqual('1', raw_resp.headers['Retry-After'])
+
+    def test_invalid_high_water_mark(self, mocked_db):
+        for since in ['-1', 'abc', '', '\u00b2', '1.5']:
+            raw_resp = self.post(url=endpoint, data=None, url_args={'since': since})
+            self.assertEqual(400, raw_resp.status_code)
+        self.assertFalse(mocked_db.sync_changes.called)
+
+    def test_503_if_out_of_throughput(self, mocked_db):
+        mocked_db.sync_changes.side_effect = DynamodbThroughputExhausted()
+        raw_resp = self.post(url=endpoint, data=None, url_args={'since': 5})
+        self.assertEqual(503, raw_resp.status_code)
+        self.assertIn(ApiError.OUT_OF_THROUGHPUT, raw_resp.get_data(as_text=True))
@@ -3,7 +3,7 @@ from tests.base_test import BaseTestWithHTTPMethodsMixin, BaseTest, NoAuthentica
 from json import loads
 from unittest.mock import patch
 
-from app.db_facade.facade import NoExpenseWithThisId
+from app.db_facade.facade import NoExpenseWithThisId, ItemWithSameRangeKeyExists, DynamodbThroughputExhausted
 from app.expenses_api.api_error_msgs import ApiError
 from app.models.expense_validation import Validator
 from tests.common_methods import SINGLE_EXPENSE
@@ -51,6 +51,20 @@ class TestUpdate(BaseTestWithHTTPMethodsMixin, BaseTest, NoAuthenticationMarkerM
         self.assertEqual(404, raw_resp.status_code, "Should have returned a 404 for a non-managed expense")
         self.assertIn(ApiError.NO_EXPENSE_WITH_THIS_ID, raw_resp.get_data(as_text=True))
 
+    def test_409_if_the_timestamp_is_taken(self, mocked_facade):
+        mocked_facade.update.side_effect = ItemWithSameRangeKeyExists()
+
+        raw_resp = self.put(url=endpoint, data=valid_payload)
+        self.assertEqual(409, raw_resp.status_code)
+        self.assertIn(ApiError.EXPENSE_WITH_SAME_TIMESTAMP_EXISTS, raw_resp.get_data(as_text=True))
+
+    def test_503_if_out_of_throughput(self, mocked_facade):
+        mocked_facade.update.side_effect = DynamodbThroughputExhausted()
+
+        raw_resp = self.put(url=endpoint, data=valid_payload)
+        self.assertEqual(503, raw_resp.status_code)
+        self.assertIn(ApiError.OUT_OF_THROUGHPUT, raw_resp.get_data(as_text=True))
+
     def test_400_if_ids_dont_match(self, _):
         data = {
             'updated': {**SINGLE_EXPENSE},
@@ -60,3 +74,44 @@ class TestUpdate(BaseTestWithHTTPMethodsMixin, BaseTest, NoAuthenticationMarkerM
         raw_resp = self.put(url=endpoint, data=data)
         self.assertEqual(400, raw_resp.status_code)
         self.assertIn(ApiError.IDS_OF_EXPENSES_DONT_MATCH, raw_resp.get_data(as_text=True))
+
+
+@patch(db_facade_path, autospec=True)
+class TestPatch(BaseTestWithHTTPMethodsMixin, BaseTest, NoAuthenticationMarkerMixin):
+    endpoint = 'expenses_api.patch'
+    valid_payload = {"id": SINGLE_EXPENSE['id'], "timestamp_utc": SINGLE_EXPENSE['timestamp_utc'],
+                     "timestamp_utc_updated": SINGLE_EXPENSE['timestamp_utc_updated'],
+                     "changes": {"name": "new name", "tags": []}}
+
+    def patch(self, data):
+        return self.full_response(method='PATCH', url=self.endpoint, data=data)
+
+    def test_normal_usage(self, mocked_facade):
+        mocked_facade.patch.return_value = SINGLE_EXPENSE
+        raw_resp = self.patch(self.valid_payload)
+        self.assertEqual(200, raw_resp.status_code)
+        self.assertEqual(SINGLE_EXPENSE, loads(raw_resp.get_data(as_text=True)))
+
+        args, kwargs = mocked_facade.patch.call_args
+        self.assertEqual({"expense_id": SINGLE_EXPENSE['id'], "timestamp_utc": SINGLE_EXPENSE['timestamp_utc'],
+                          "expected_timestamp_utc_updated": SINGLE_EXPENSE['timestamp_utc_updated'],
+                          "changes": {"name": "new name", "tags": []}, "user_uid": self.firebase_uid}, kwargs)
+
+    def test_errors(self, mocked_facade):
+        from app.db_facade.facade import ExpenseChangedConcurrently
+        for exc, status_code, msg in [(NoExpenseWithThisId(), 404, ApiError.NO_EXPENSE_WITH_THIS_ID),
+                                      (ExpenseChangedConcurrently(), 409, ApiError.EXPENSE_CHANGED_CONCURRENTLY),
+                                      (DynamodbThroughputExhausted(), 503, ApiError.OUT_OF_THROUGHPUT)]:
+            mocked_facade.patch.side_effect = exc
+            raw_resp = self.patch(self.valid_payload)
+            self.assertEqual(status_code, raw_resp.status_code)
+            self.assertIn(msg, raw_resp.get_data(as_text=True))
+
+    def test_invalid_payload(self, mocked_facade):
+        for payload in [{}, {**self.valid_payload, "id": None}, {**self.valid_payload, "timestamp_utc_updated": "now"},
+                        {**self.valid_payload, "changes": {}}, {**self.valid_payload, "changes": {"amount": "1"}},
+                        {**self.valid_payload, "changes": {"timestamp_utc": SINGLE_EXPENSE['timestamp_utc']}},
+                        {**self.valid_payload, "changes": {"timestamp_utc_updated": SINGLE_EXPENSE['timestamp_utc']}}]:
+            raw_resp = self.patch(payload)
+            self.assertEqual(400, raw_resp.status_code, payload)
+        self.assertFalse(mocked_facade.patch.called)
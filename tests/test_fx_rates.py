@@ -0,0 +1,67 @@
+import json
+import os
+import tempfile
+import unittest
+from decimal import Decimal
+
+from app.db_facade.aggregation import CurrencyAccumulator
+from app.helpers.fx_rates import FxRateTable, NoFxRate, get_rate_table, invalidate_rate_table, DEFAULT_RATES_FILE
+
+
+class TestFxRateTable(unittest.TestCase):
+
+    def setUp(self):
+        self.table = FxRateTable(version="1", base="EUR", rates={"EUR": 1, "USD": "1.25", "BGN": "1.9558"})
+
+    def test_normalise(self):
+        total, unconverted = self.table.normalise({"EUR": Decimal(10), "USD": Decimal("12.5")}, "EUR")
+        self.assertEqual(Decimal(20), total)
+        self.assertEqual([], unconverted)
+
+        total, _ = self.table.normalise({"EUR": Decimal(1)}, "BGN")
+        self.assertEqual(Decimal("1.9558"), total)
+
+    def test_currencies_without_rate(self):
+        total, unconverted = self.table.normalise({"EUR": Decimal(1), "JPY": Decimal(100)}, "EUR")
+        self.assertEqual(Decimal(1), total)
+        self.assertEqual(["JPY"], unconverted)
+
+        with self.assertRaises(NoFxRate):
+            self.table.normalise({"EUR": Decimal(1)}, "JPY")
+
+    def test_unknown_currency_in_file(self):
+        with self.assertRaises(ValueError):
+            FxRateTable(version="1", base="EUR", rates={"XXX": 1})
+
+    def test_accumulator_normalised_total(self):
+        acc = CurrencyAccumulator()
+        acc.add("USD", Decimal(5))
+        acc.add("EUR", Decimal(1))
+        self.assertEqual({"currency": "EUR", "total": 5, "fx_rates_version": "1", "unconverted": []},
+                         acc.normalised_total(self.table, "EUR"))
+
+
+class TestRateTableCache(unittest.TestCase):
+
+    def _write(self, path, version, mtime):
+        with open(path, 'w') as f:
+            json.dump({"version": version, "base": "EUR", "rates": {"EUR": "1"}}, f)
+        os.utime(path, (mtime, mtime))
+
+    def test_deployed_file_is_bundled(self):
+        self.assertTrue(get_rate_table(DEFAULT_RATES_FILE).has_rate("EUR"))
+
+    def test_reloaded_when_file_changes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'rates.json')
+            self._write(path, "1", mtime=1000)
+            first = get_rate_table(path)
+            self.assertIs(first, get_rate_table(path))
+
+            self._write(path, "2", mtime=2000)
+            self.assertEqual("2", get_rate_table(path).version)
+
+            self._write(path, "3", mtime=2000)  # same mtime - only an explicit invalidation reloads it
+            self.assertEqual("2", get_rate_table(path).version)
+            invalidate_rate_table()
+            self.assertEqual("3", get_rate_table(path).version)
@@ -0,0 +1,71 @@
+import gzip
+import json
+import unittest
+from decimal import Decimal
+
+from flask import current_app
+
+from app.api_utils import serializer
+from app.api_utils.response import make_json_response
+from tests.base_test import BaseTest
+from tests.common_methods import SINGLE_EXPENSE
+
+
+class TestSerializer(unittest.TestCase):
+
+    def test_decimals(self):
+        obj = {"amount": Decimal("12.50"), "count": Decimal("10"), "big": Decimal("1E+1"), "name": "ö"}
+        expected = {"amount": 12.5, "count": 10, "big": 10, "name": "ö"}
+        for dumps in (serializer.dumps, serializer._stdlib_dumps):
+            body = dumps(obj)
+            self.assertIsInstance(body, bytes)
+            self.assertEqual(expected, json.loads(body.decode()))
+            self.assertNotIn(b'10.0', body)
+
+    def test_unsupported_type(self):
+        with self.assertRaises(TypeError):
+            serializer.dumps({"a": object()})
+
+
+class TestJsonResponse(BaseTest):
+
+    def setUp(self):
+        super(TestJsonResponse, self).setUp()
+        current_app.config['COMPRESS_RESPONSES'] = True
+        self.page = [dict(SINGLE_EXPENSE, amount=Decimal(i)) for i in range(25)]
+
+    def tearDown(self):
+        current_app.config['COMPRESS_RESPONSES'] = False
+        super(TestJsonResponse, self).tearDown()
+
+    def test_already_serialised(self):
+        with current_app.test_request_context():
+            response = make_json_response('{"a": 1}')
+        self.assertEqual('{"a": 1}', response.get_data(as_text=True))
+
+        with self.assertRaises(ValueError):
+            make_json_response(1)
+
+    def test_gzip(self):
+        with current_app.test_request_context(headers={'Accept-Encoding': 'gzip'}):
+            response = make_json_response(self.page)
+        self.assertEqual('gzip', response.headers['Content-Encoding'])
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertEqual(list(range(25)), [e['amount'] for e in json.loads(gzip.decompress(response.get_data()))])
+
+    def test_not_compressed(self):
+        # the client doesn't accept gzip
+        with current_app.test_request_context():
+            response = make_json_response(self.page)
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertEqual(25, len(json.loads(response.get_data(as_text=True))))
+
+        # too small
+        with current_app.test_request_context(headers={'Accept-Encoding': 'gzip'}):
+            response = make_json_response(self.page[:1])
+        self.assertNotIn('Content-Encoding', response.headers)
+
+        current_app.config['COMPRESS_RESPONSES'] = False
+        with current_app.test_request_context(headers={'Accept-Encoding': 'gzip'}):
+            response = make_json_response(self.page)
+        self.assertNotIn('Content-Encoding', response.headers)